@@ -0,0 +1,408 @@
+# backtest.py — Backtest offline strategi SR bounce (aturan sr_auto_trade) di atas histori M1
+# Level support/resistance, zona trigger dan pencarian exit TPSM/TPSB dihitung vektor
+# dengan NumPy; hanya mesin state bounce (was_outside -> masuk lagi, armed, candle lock,
+# SR_MIN_GAP, batas 4 posisi, kunci arah) yang berjalan titik demi titik. Setiap bar M1
+# diputar sebagai 4 titik harga: open -> ekstrem terdekat -> ekstrem lain -> close.
+# Order terisi di harga trigger (tanpa latency klik/retry), exit di titik pertama yang
+# memenuhi target baris TPSM (< 3 posisi) atau TPSB (>= 3 posisi) dari click_xy,
+# trailing stop (>= 2 posisi) atau target/limit/timeout sesi (lalu cooldown 15 detik).
+#
+# Contoh:
+#   python backtest.py --csv XAUUSD_M1.csv --tp 0.05 --sl -0.10
+#   python backtest.py --symbol XAUUSDc --bars 100000 --lookback 30 --near-pct 12
+#   python backtest.py --csv XAUUSD_M1.csv --trades trades.csv    # daftar trade per baris
+
+import csv, json, time, argparse
+from datetime import datetime, timezone
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+import control
+
+PATH_OFFSETS = np.array([0, 15, 30, 45])  # Detik dalam bar M1 untuk tiap titik jalur harga
+MAX_POSITIONS = 4                          # Sama dengan batas di sr_auto_trade
+RATES_DTYPE = [("time", "<i8"), ("open", "<f8"), ("high", "<f8"), ("low", "<f8"), ("close", "<f8")]
+TIME_FORMATS = ("%Y.%m.%d %H:%M:%S", "%Y.%m.%d %H:%M", "%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d %H:%M")
+
+# ---------- Data ----------
+def _parse_time(text):
+    text = text.strip()
+    if text.isdigit():
+        return int(text)
+    for fmt in TIME_FORMATS:
+        try:
+            return int(datetime.strptime(text, fmt).replace(tzinfo=timezone.utc).timestamp())
+        except ValueError:
+            pass
+    raise ValueError(f"unrecognized time {text!r}")
+
+def load_csv(path):
+    """M1 bars from a CSV: time,open,high,low,close[,...] with epoch seconds or a
+    date string, or a MetaTrader export with separate date and time columns."""
+    rows = []
+    with open(path, newline="", encoding="utf-8") as f:
+        dialect = csv.Sniffer().sniff(f.read(4096), delimiters=",;\t")
+        f.seek(0)
+        for rec in csv.reader(f, dialect):
+            if len(rec) < 5 or not rec[0].strip()[:1].isdigit():
+                continue # header / baris kosong
+            if ":" in rec[1] and ":" not in rec[0]:
+                rows.append((_parse_time(rec[0] + " " + rec[1]), *map(float, rec[2:6])))
+            else:
+                rows.append((_parse_time(rec[0]), *map(float, rec[1:5])))
+    rates = np.array(rows, dtype=RATES_DTYPE)
+    return rates[np.argsort(rates["time"], kind="stable")]
+
+def fetch_mt5(symbol, bars):
+    """Last `bars` M1 bars and the contract size of `symbol` from the terminal."""
+    control.mt5_init()
+    rates = control._copy_rates(symbol, "M1", bars)
+    if rates is None or len(rates) == 0:
+        raise SystemExit(f"[BACKTEST] no M1 history for {symbol}")
+    info = control.mt5.symbol_info(symbol)
+    contract = float(getattr(info, "trade_contract_size", 0.0) or 100.0)
+    out = np.empty(len(rates), dtype=RATES_DTYPE)
+    for name, _ in RATES_DTYPE:
+        out[name] = rates[name]
+    return out, contract
+
+# ---------- Vectorized passes ----------
+def price_path(rates):
+    """(N, 4) bid path per bar: open, low, high, close for an up bar; open, high, low, close for a down bar."""
+    o, h, l, c = rates["open"], rates["high"], rates["low"], rates["close"]
+    up = c >= o
+    return np.stack([o, np.where(up, l, h), np.where(up, h, l), c], axis=1)
+
+def sr_zones(rates, path, lookback, near_pct):
+    """Per path point: (below bottom, above top, thresholds valid), using the same
+    window as compute_sr_thresholds: the last lookback-1 closed bars plus the
+    forming bar's low/high so far."""
+    n = len(rates)
+    w = lookback - 1
+    closed_min = np.full(n, np.inf)
+    closed_max = np.full(n, -np.inf)
+    if w > 0 and n > w:
+        # baris r dari window = bar r..r+w-1 -> bar tertutup untuk bar b = baris b-w
+        closed_min[w:] = sliding_window_view(rates["low"], w).min(axis=1)[:n - w]
+        closed_max[w:] = sliding_window_view(rates["high"], w).max(axis=1)[:n - w]
+    support = np.minimum(closed_min[:, None], np.minimum.accumulate(path, axis=1))
+    resistance = np.maximum(closed_max[:, None], np.maximum.accumulate(path, axis=1))
+    rng = np.maximum(1e-6, resistance - support)
+    pct = float(near_pct) / 100.0
+    below = path <= support + rng * pct
+    above = path >= resistance - rng * pct
+    valid = np.repeat(np.arange(n) >= lookback - 1, path.shape[1])
+    return below.ravel(), above.ravel(), valid
+
+def _first_hit(mid, start, entry, direction, neg, pos):
+    """First path index >= start where the position's pl_pct reaches its row
+    target (rounded to 3 decimals, like auto_tpsm_tick); len(mid) if never."""
+    n = len(mid)
+    if not (pos > 0 or neg < 0):
+        return n
+    i, chunk = start, 64
+    while i < n:
+        seg = mid[i:i + chunk]
+        pl = np.round((seg - entry) / entry * 100.0 * direction, 3)
+        hit = np.zeros(len(seg), dtype=bool)
+        if pos > 0:
+            hit |= pl >= pos
+        if neg < 0:
+            hit |= pl <= neg
+        if hit.any():
+            return i + int(hit.argmax())
+        i += chunk
+        chunk *= 4 # posisi yang lama terbuka: jendela tumbuh supaya pencarian tetap O(N)
+    return n
+
+def exit_rows(setup, tp=None, sl=None):
+    """(tpsm rows, tpsb rows) as (target_neg_pct, target_pos_pct) in click_xy order;
+    --tp/--sl replace them with the same target on every row."""
+    if tp is not None or sl is not None:
+        row = (float(sl or 0.0), float(tp or 0.0))
+        return [row] * MAX_POSITIONS, [row] * MAX_POSITIONS
+    def rows(func):
+        return [(float(s.get("target_neg_pct", 0.0)), float(s.get("target_pos_pct", 0.0)))
+                for s in setup.get("click_xy", []) if s.get("func") == func]
+    return rows("auto_tpsm"), rows("auto_tpsb")
+
+def _trail_scan(profit, start, stop, peak, value):
+    """Walk trailing_stop_tick over [start, stop) for one position: the peak
+    restarts whenever profit is <= 0. Returns (exit index or None, peak at stop)."""
+    i, chunk = start, 64
+    while i < stop:
+        j = min(stop, i + chunk)
+        pr = profit(i, j)
+        nonpos = pr <= 0
+        v = np.where(nonpos, 0.0, pr)
+        g = np.cumsum(nonpos)
+        k = float(v.max()) + 1.0 # offset per grup reset -> running max per grup dalam satu pass
+        run = np.maximum.accumulate(v + g * k) - g * k
+        run = np.where(g == 0, np.maximum(run, peak), run)
+        hit = ~nonpos & (run > value) & (pr < run - value)
+        if hit.any():
+            return i + int(hit.argmax()), peak
+        peak = float(run[-1])
+        i, chunk = j, chunk * 4
+    return None, peak
+
+# ---------- Bounce state machine ----------
+def simulate(rates, lookback, near_pct, tpsm_rows, tpsb_rows, buy=True, sell=True,
+             spread=0.0, lot=0.01, contract=100.0, session=None, trailing=0.0,
+             path=None, zones=None):
+    """Replay sr_auto_trade's bounce rules plus the engine's exits over `rates`.
+    Exits: TPSM/TPSB rows, trailing_stop_tick with `trailing` (active while >= 2
+    positions are open, like auto_manage_trailing_stop; 0 = off) and session_tick
+    with `session` = SETUP["session"]-style dict (None = off), which closes all and
+    cools down 15 s. `path`/`zones` may be precomputed (price_path/sr_zones) when
+    many configurations share them. Returns the list of closed trades; positions
+    still open at the end are closed at the last price with reason "end"."""
+    if path is None:
+        path = price_path(rates)
+    below_a, above_a, valid_a = zones if zones is not None else sr_zones(rates, path, lookback, near_pct)
+    bid = path.ravel()
+    ask = bid + spread
+    mid = bid + spread / 2.0                          # auto_tpsm_tick memakai (bid+ask)/2
+    t_arr = (rates["time"][:, None] + PATH_OFFSETS).ravel()
+    times = t_arr.tolist()
+    candle = np.repeat(rates["time"], path.shape[1]).tolist()
+    below, above, valid, bid_l = below_a.tolist(), above_a.tolist(), valid_a.tolist(), bid.tolist()
+    n = len(bid_l)
+    gap = control.SR_MIN_GAP
+    value = lot * contract
+    trailing = float(trailing or 0.0)
+    if session:
+        s_target, s_limit = float(session["profit_target"]), float(session["loss_limit"])
+        s_duration = float(session["max_duration_sec"])
+
+    armed_b = armed_s = True
+    was_b = was_s = False
+    last_b = last_s = 0.0
+    lc_b = lc_s = 0           # last_trigger_candle_ts per sisi
+    lock = None               # arah_posisi_terkunci
+    cool_until = 0.0          # cooldown setelah sesi berakhir
+    sess_active, sess_start, sess_exit = False, 0.0, n
+    positions = []            # urutan tiket
+    trades = []
+    next_event = n
+
+    def profit_fn(pos):
+        # profit akun: BUY ditutup di bid, SELL di ask
+        if pos["dir"] > 0:
+            return lambda i, j: (bid[i:j] - pos["entry"]) * value
+        return lambda i, j: (pos["entry"] - ask[i:j]) * value
+
+    def close(pos, i, reason):
+        px = bid_l[i] if pos["dir"] > 0 else bid_l[i] + spread
+        trades.append({
+            "side": pos["side"], "open_time": times[pos["idx"]], "close_time": times[i],
+            "entry": pos["entry"], "exit": px,
+            "pl_pct": round((px - pos["entry"]) / pos["entry"] * 100.0 * pos["dir"], 3),
+            "profit": (px - pos["entry"]) * pos["dir"] * value,
+            "positions": len(positions), "reason": reason,
+        })
+        positions.remove(pos)
+
+    def session_exit(start):
+        """First index >= start where session_tick fires for the current positions."""
+        stop = min(n, int(t_arr.searchsorted(int(sess_start + s_duration)))) # timeout
+        if not positions:
+            return start if (s_target <= 0 or s_limit >= 0) else stop
+        # Semua posisi satu arah: float P/L linear terhadap harga
+        k = sum(q["dir"] for q in positions)
+        base = sum(q["dir"] * q["entry"] for q in positions)
+        px = bid if positions[0]["dir"] > 0 else ask
+        i, chunk = start, 64
+        while i < stop:
+            j = min(stop, i + chunk)
+            pl = (k * px[i:j] - base) * value
+            hit = (pl >= s_target) | (pl <= s_limit)
+            if hit.any():
+                return i + int(hit.argmax())
+            i, chunk = j, chunk * 4
+        return stop
+
+    def reschedule(start):
+        # Posisi satu arah (kunci arah) -> urutan profit = urutan harga entry, tetap antar event
+        rows = tpsb_rows if len(positions) >= 3 else tpsm_rows
+        ranked = sorted(positions, key=lambda q: -q["entry"] * q["dir"])
+        for rank, pos in enumerate(ranked):
+            target = rows[rank] if rank < len(rows) else (0.0, 0.0)
+            if target != pos["target"]:
+                # Target sama -> hit pertama setelah `start` tidak berubah, tidak perlu dicari ulang
+                pos["target"] = target
+                pos["exit"] = _first_hit(mid, start, pos["entry"], pos["dir"], *target)
+        horizon = min([sess_exit if sess_active else n] + [q["exit"] for q in positions])
+        trail_on = trailing > 0 and len(positions) >= 2
+        events = [horizon]
+        for pos in positions:
+            if trail_on != pos["trail_on"]:
+                if pos["trail_on"]: # dimatikan: peak dibekukan di titik ini
+                    if pos["trail_until"] <= start:
+                        pos["peak"] = _trail_scan(profit_fn(pos), pos["trail_until"], start, pos["trail_peak"], trailing)[1]
+                    else:
+                        pos["peak"] = _trail_scan(profit_fn(pos), pos["trail_from"], start, pos["peak"], trailing)[1]
+                pos["trail_on"], pos["trail_from"], pos["trail_until"] = trail_on, start, start
+                pos["trail_peak"], pos["trail_exit"] = pos["peak"], n
+            if trail_on and pos["trail_exit"] == n and pos["trail_until"] <= horizon:
+                # Scan trailing hanya sampai event berikutnya yang sudah pasti, lanjut dari situ nanti
+                stop = min(n, horizon + 1)
+                hit, pos["trail_peak"] = _trail_scan(profit_fn(pos), pos["trail_until"], stop, pos["trail_peak"], trailing)
+                pos["trail_until"] = stop
+                if hit is not None:
+                    pos["trail_exit"] = hit
+            events.append(pos["trail_exit"])
+        return min(events)
+
+    for p in range(n):
+        # check_and_reset_trade_direction_lock: siklus baru saat tidak ada posisi
+        if not positions and lock is not None:
+            lock = None
+            lc_b = lc_s = 0
+
+        opened = None
+        if len(positions) < MAX_POSITIONS:
+            if not valid[p]:
+                armed_b = armed_s = True
+                was_b = was_s = False
+            else:
+                t = times[p]
+                bl, ab = below[p], above[p]
+                cooling = t < cool_until
+                if not (bl or ab) and not cooling:
+                    if not armed_b and t - last_b >= gap:
+                        armed_b = True
+                    if not armed_s and t - last_s >= gap:
+                        armed_s = True
+                c = candle[p]
+                if not cooling and c != lc_b and c != lc_s: # candle lock
+                    if was_b and not bl:
+                        if buy and armed_b and t - last_b >= gap:
+                            if lock and lock != "BUY":
+                                last_b = t
+                            else:
+                                lock = "BUY"
+                                opened = {"side": "BUY", "dir": 1, "entry": bid_l[p] + spread}
+                                armed_b, last_b, lc_b = False, t, c
+                    elif was_s and not ab:
+                        if sell and armed_s and t - last_s >= gap:
+                            if lock and lock != "SELL":
+                                last_s = t
+                            else:
+                                lock = "SELL"
+                                opened = {"side": "SELL", "dir": -1, "entry": bid_l[p]}
+                                armed_s, last_s, lc_s = False, t, c
+                    was_b, was_s = bl, ab
+
+        # Exit stage untuk posisi yang sudah terlihat di titik ini: TPSM/TPSB -> trailing -> sesi
+        if p == next_event or opened:
+            reason = "tpsb" if len(positions) >= 3 else "tpsm"
+            for pos in [q for q in positions if q["exit"] == p]:
+                close(pos, p, reason)
+            for pos in [q for q in positions if q["trail_exit"] == p]:
+                close(pos, p, "trailing")
+            if sess_active and sess_exit == p:
+                for pos in list(positions):
+                    close(pos, p, "session")
+                sess_active = False
+                cool_until = times[p] + 15 # end_session() -> set_cooldown(15)
+            if opened:
+                # Posisi baru terlihat engine mulai titik berikutnya
+                opened.update({"idx": p, "target": None, "exit": n, "trail_on": False, "trail_exit": n,
+                               "trail_from": p + 1, "trail_until": p + 1, "peak": 0.0, "trail_peak": 0.0})
+                positions.append(opened)
+                if session and not sess_active:
+                    sess_active, sess_start = True, times[p] # begin_session_if_needed
+            if session and sess_active:
+                sess_exit = session_exit(p + 1)
+            next_event = reschedule(p + 1)
+
+    for pos in list(positions):
+        close(pos, n - 1, "end")
+    return trades
+
+def summarize(trades):
+    profits = np.array([t["profit"] for t in trades]) if trades else np.zeros(0)
+    equity = np.cumsum(profits)
+    drawdown = float((np.maximum.accumulate(np.concatenate([[0.0], equity])) - np.concatenate([[0.0], equity])).max()) if len(profits) else 0.0
+    gross_win = float(profits[profits > 0].sum())
+    gross_loss = float(-profits[profits < 0].sum())
+    holds = [(t["close_time"] - t["open_time"]) / 60.0 for t in trades]
+    return {
+        "trades": len(trades),
+        "wins": int((profits > 0).sum()),
+        "win_rate": round(float((profits > 0).mean()) * 100.0, 2) if len(profits) else 0.0,
+        "net_profit": round(float(profits.sum()), 2),
+        "profit_factor": round(gross_win / gross_loss, 3) if gross_loss > 0 else None,
+        "max_drawdown": round(drawdown, 2),
+        "avg_hold_min": round(float(np.mean(holds)), 2) if holds else 0.0,
+        "buys": sum(1 for t in trades if t["side"] == "BUY"),
+        "sells": sum(1 for t in trades if t["side"] == "SELL"),
+        "exits": {r: sum(1 for t in trades if t["reason"] == r) for r in sorted({t["reason"] for t in trades})},
+    }
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Backtest the SR bounce strategy over M1 history")
+    src = ap.add_mutually_exclusive_group()
+    src.add_argument("--csv", help="M1 history file (time,open,high,low,close)")
+    src.add_argument("--symbol", help="fetch history from the MT5 terminal (default: active symbol)")
+    ap.add_argument("--bars", type=int, default=100000, help="bars to fetch with --symbol")
+    ap.add_argument("--lookback", type=int, default=None, help="default: SETUP sr.candle_lookback")
+    ap.add_argument("--near-pct", type=float, default=None, help="default: SETUP sr.near_pct")
+    ap.add_argument("--tp", type=float, default=None, help="target_pos_pct for every row (overrides click_xy)")
+    ap.add_argument("--sl", type=float, default=None, help="target_neg_pct for every row, negative")
+    ap.add_argument("--side", choices=("setup", "buy", "sell", "both"), default="setup")
+    ap.add_argument("--trailing", type=float, default=None, help="trailing_stop_value (default: SETUP, 0 = off)")
+    ap.add_argument("--no-session", action="store_true", help="do not simulate session_tick (SETUP session targets)")
+    ap.add_argument("--spread", type=float, default=0.0, help="ask - bid in price units")
+    ap.add_argument("--lot", type=float, default=control.SETUP.get("engine_lot", 0.01))
+    ap.add_argument("--contract", type=float, default=None, help="contract size (default: terminal or 100)")
+    ap.add_argument("--trades", help="write every trade to this CSV")
+    ap.add_argument("--json", action="store_true", help="print the summary as JSON")
+    args = ap.parse_args(argv)
+
+    setup = control.SETUP
+    contract = 100.0
+    if args.csv:
+        rates = load_csv(args.csv)
+    else:
+        rates, contract = fetch_mt5(args.symbol or setup["symbol"], args.bars)
+    if args.contract is not None:
+        contract = args.contract
+    lookback = args.lookback or int(setup["sr"]["candle_lookback"])
+    near_pct = args.near_pct if args.near_pct is not None else float(setup["sr"]["near_pct"])
+    tpsm_rows, tpsb_rows = exit_rows(setup, args.tp, args.sl)
+    if not any(pos > 0 or neg < 0 for neg, pos in tpsm_rows + tpsb_rows):
+        print("[BACKTEST] no TPSM/TPSB targets (click_xy or --tp/--sl): positions never exit", flush=True)
+    buy = setup.get("sr_buy_enabled", True) if args.side == "setup" else args.side in ("buy", "both")
+    sell = setup.get("sr_sell_enabled", False) if args.side == "setup" else args.side in ("sell", "both")
+
+    t0 = time.perf_counter()
+    trailing = args.trailing if args.trailing is not None else float(setup.get("trailing_stop_value", 0.0))
+    session = None if args.no_session else setup["session"]
+    trades = simulate(rates, lookback, near_pct, tpsm_rows, tpsb_rows, buy=buy, sell=sell,
+                      spread=args.spread, lot=args.lot, contract=contract, session=session, trailing=trailing)
+    took = time.perf_counter() - t0
+    summary = summarize(trades)
+    summary.update({"bars": len(rates), "lookback": lookback, "near_pct": near_pct, "seconds": round(took, 3)})
+
+    if args.trades:
+        with open(args.trades, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=list(trades[0]) if trades else ["side"])
+            writer.writeheader()
+            writer.writerows(trades)
+    if args.json:
+        print(json.dumps(summary))
+        return
+    span = ""
+    if len(rates):
+        fmt = lambda ts: datetime.fromtimestamp(int(ts), timezone.utc).strftime("%Y-%m-%d")
+        span = f" {fmt(rates['time'][0])} .. {fmt(rates['time'][-1])}"
+    print(f"\n== SR bounce backtest: {len(rates)} M1 bars{span} (lookback {lookback}, near {near_pct}%) ==")
+    for key in ("trades", "buys", "sells", "wins", "win_rate", "net_profit", "profit_factor", "max_drawdown", "avg_hold_min", "exits"):
+        print(f"{key:16s} {summary[key]}")
+    print(f"\n[BACKTEST] {took:.2f} s ({len(rates) / max(took, 1e-9):,.0f} bars/s)")
+
+if __name__ == "__main__":
+    main()
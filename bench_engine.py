@@ -0,0 +1,144 @@
+# bench_engine.py — Benchmark satu siklus engine_loop per stage (terminal simulasi)
+# Menjalankan siklus asli control.engine_cycle() terhadap mt5sim untuk kombinasi jumlah posisi
+# terbuka x jumlah simbol, lalu melaporkan p50/p99 per stage. Hasil disimpan per
+# APP_VERSION di bench_results.json (folder data user, di luar repo; lihat --out)
+# sehingga regresi antar versi terlihat dan riwayatnya bertahan setelah reboot.
+#
+# Contoh:
+#   python bench_engine.py                       # semua skenario, latency 0.2 ms
+#   python bench_engine.py --positions 0 10 --symbols 1 --cycles 300 --latency-ms 1
+#   python bench_engine.py --engine-symbols 1 3 5      # N simbol ditradingkan sekaligus
+
+import os, sys, io, json, time, argparse, tempfile, contextlib
+
+os.environ["MT5_BACKEND"] = "sim"   # harus diset sebelum import control
+os.environ.setdefault("MT5_SIM_LATENCY_MS", "0.2")
+
+import numpy as np
+import mt5sim
+import control
+
+DEFAULT_POSITIONS = [0, 4, 10, 100]
+DEFAULT_SYMBOLS = [1, 5, 20]
+DEFAULT_ENGINE_SYMBOLS = [1]
+REGRESSION_PCT = 20.0  # p50 naik lebih dari ini (vs versi sebelumnya) -> ditandai
+
+def _prepare(n_positions, n_symbols, n_engine=1):
+    """Reset the simulated account and SETUP for one scenario; returns the engine symbols."""
+    mt5sim.sim_reset(balance=1_000_000.0)
+    control.SYM_STATE.clear()
+    sym = control.SETUP["symbol"]
+    others = [s for s in mt5sim._CATALOG if s != sym]
+    control.SETUP["symbols"] = [sym] + others[:max(0, n_symbols - 1)]
+    control.SETUP["engine_symbols"] = others[:max(0, n_engine - 1)]
+    syms = control.engine_symbols()
+    # Semua fitur aktif, tapi target/koordinat dibuat tidak pernah terpicu supaya
+    # setiap stage mengerjakan jalur penuhnya tanpa klik/close sungguhan.
+    control.SETUP.update({
+        "auto_mode": True, "sr_buy_enabled": True, "sr_sell_enabled": True,
+        "cross_buy_enabled": True, "cross_sell_enabled": True, "abe_auto": True,
+        "trailing_stop_value": 1e12,
+        "click_xy": [{"title": f"Row {i+1}", "func": f, "x": 0, "y": 0,
+                      "target_neg_pct": -1e9, "target_pos_pct": 1e9}
+                     for i, f in enumerate(["auto_tpsm", "auto_tpsb"] * 50)],
+    })
+    control.SETUP["session"].update({"profit_target": 1e12, "loss_limit": -1e12,
+                                     "max_duration_sec": 10**9, "min_positions_for_be": 10**9})
+    # Posisi dibagi rata ke semua simbol engine
+    for i in range(n_positions):
+        control.order_send_with_fallback(syms[i % len(syms)], "BUY" if i % 2 == 0 else "SELL", 0.01, reason="Auto SR BUY")
+    for s in syms:
+        with control.symbol_context(s):
+            control.STATE["session_active"] = n_positions > 0
+            control.STATE["session_start_ts"] = time.time()
+    return syms
+
+def _stage_sums():
+    """Lifetime total seconds per engine stage, from control's own stage.* histograms."""
+    with control.METRICS_LOCK:
+        return {k[len("stage."):]: h["sum"] for k, h in control.METRICS["hist"].items()
+                if k.startswith("stage.")}
+
+def run_scenario(n_positions, n_symbols, cycles, warmup=5, n_engine=1):
+    _prepare(n_positions, n_symbols, n_engine)
+    samples = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i in range(warmup + cycles):
+            mt5sim.sim_advance(1.0)  # satu siklus engine = 1 detik pasar
+            for buf in control.CANDLE_BUFFERS.values():
+                buf["fetched_at"] = 0.0 # tepat satu refresh candle per siklus, seperti engine_loop
+            # Siklus penuh yang sama dengan engine_loop; waktu per stage (dijumlah atas
+            # semua simbol engine) diambil dari selisih histogram stage.* milik control
+            before = _stage_sums()
+            t_cycle = time.perf_counter()
+            control.engine_cycle()
+            t0 = time.perf_counter()
+            control.quotes_refresh() # quote_worker, 1x per detik
+            took = {name: v - before.get(name, 0.0) for name, v in _stage_sums().items()}
+            took["quotes_refresh"] = time.perf_counter() - t0
+            took["cycle"] = time.perf_counter() - t_cycle
+            if i >= warmup:
+                for name, v in took.items():
+                    samples.setdefault(name, []).append(v)
+    return {name: {"p50_ms": round(float(np.percentile(v, 50)) * 1000, 4),
+                   "p99_ms": round(float(np.percentile(v, 99)) * 1000, 4)}
+            for name, v in samples.items()}
+
+def _default_out():
+    """Per-user data file for the version history: survives reboots, stays out of the source tree."""
+    base = (os.environ.get("LOCALAPPDATA") or os.environ.get("XDG_DATA_HOME")
+            or os.path.join(os.path.expanduser("~"), ".local", "share"))
+    return os.path.join(base, "indodam", "bench_results.json")
+
+def _previous_version(results, version):
+    others = [v for v in results if v != version]
+    return others[-1] if others else None
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Benchmark per-stage latency of one engine cycle")
+    ap.add_argument("--positions", type=int, nargs="+", default=DEFAULT_POSITIONS)
+    ap.add_argument("--symbols", type=int, nargs="+", default=DEFAULT_SYMBOLS)
+    ap.add_argument("--engine-symbols", type=int, nargs="+", default=DEFAULT_ENGINE_SYMBOLS,
+                    help="number of symbols traded concurrently by the engine")
+    ap.add_argument("--cycles", type=int, default=100)
+    ap.add_argument("--latency-ms", type=float, default=None, help="override MT5_SIM_LATENCY_MS")
+    ap.add_argument("--out", default=_default_out(), help="results file (default: %(default)s)")
+    ap.add_argument("--no-save", action="store_true")
+    args = ap.parse_args(argv)
+
+    # Jangan menimpa setup.json milik instance live
+    control.PERSIST_FILE = os.path.join(tempfile.gettempdir(), "indodam_bench_setup.json")
+    if args.latency_ms is not None:
+        mt5sim.sim_set_latency(args.latency_ms)
+    with contextlib.redirect_stdout(io.StringIO()):
+        control.mt5_init()
+
+    results = {}
+    if os.path.exists(args.out):
+        with open(args.out, "r", encoding="utf-8") as f:
+            results = json.load(f)
+    prev = results.get(_previous_version(results, control.APP_VERSION), {})
+    current = {}
+    scenarios = [(p, s, e) for p in args.positions for s in args.symbols for e in args.engine_symbols]
+    for npos, nsym, neng in scenarios:
+        key = f"pos={npos},sym={nsym}" + (f",engine={neng}" if neng > 1 else "")
+        current[key] = run_scenario(npos, nsym, args.cycles, n_engine=neng)
+        print(f"\n== {key} (v{control.APP_VERSION}, latency {mt5sim._S['latency']*1000:.2f} ms/call) ==")
+        print(f"{'stage':38s} {'p50 ms':>10s} {'p99 ms':>10s}  vs prev p50")
+        for stage, r in current[key].items():
+            old = prev.get(key, {}).get(stage)
+            note = ""
+            if old and old["p50_ms"] > 0:
+                delta = (r["p50_ms"] - old["p50_ms"]) / old["p50_ms"] * 100.0
+                note = f"{delta:+7.1f}%" + ("  <-- REGRESSION" if delta > REGRESSION_PCT else "")
+            print(f"{stage:38s} {r['p50_ms']:10.3f} {r['p99_ms']:10.3f}  {note}")
+
+    if not args.no_save:
+        results[control.APP_VERSION] = current
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n[BENCH] saved -> {args.out}")
+
+if __name__ == "__main__":
+    main()
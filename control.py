@@ -1,30 +1,313 @@
 # control.py â€” THB Indodam (REAL MT5 + Persist JSON + Thread-Safe)
 # Port 5000, UI: index.html di folder yang sama
 # Fitur: TPSM/TPSB/ABE, Auto M1 (SR-Gate 10%), Session target/timeout, Cooldown
-# Endpoints: /, /api/status, /api/candles, /api/diag, /api/symbol/select,
-#            /api/strategy/(toggle|tpsm|tpsb|abe), /api/action/(buy|sell|add|close|breakeven)
-
-import os, json, time, threading, ctypes, traceback
+# Endpoints: /, /api/status[?since=version], /api/stream (SSE), /api/candles[?since=bar_time], /api/diag, /api/diag/lock, /api/metrics, /api/symbol/select,
+#            /api/strategy/(toggle|tpsm|tpsb|abe), /api/action/(buy|sell|add|close|breakeven),
+#            /api/workers, /api/copier (MT5_WORKERS=1: satu proses per akun)
+
+import os, sys, json, time, threading, ctypes, traceback, functools, itertools, queue, contextlib
+import atexit, multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from collections.abc import MutableMapping
 from datetime import datetime, timezone, timedelta
 from threading import Thread, Event, RLock
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, request, jsonify, send_from_directory
 
 # MetaTrader5 can be unavailable on some hosts (e.g., server without MT5).
 # Make import safe so the web app still runs and returns offline status
+# MT5_BACKEND=sim swaps in the pure-Python simulated terminal (mt5sim.py) so the
+# real code paths can be run and profiled on hosts without a terminal.
 try:
-    import MetaTrader5 as mt5  # type: ignore
+    if os.environ.get("MT5_BACKEND", "").lower() == "sim":
+        import mt5sim as mt5
+        print("[MT5] using simulated terminal (mt5sim)", flush=True)
+    else:
+        import MetaTrader5 as mt5  # type: ignore
 except Exception as e:  # ImportError or other runtime loading errors
     print("[MT5] import failed:", e, flush=True)
     mt5 = None  # sentinel; all MT5 calls must guard against this
+try:
+    import numpy as np  # dependency of MetaTrader5; only needed once candles flow
+except Exception as e:
+    print("[NUMPY] import failed:", e, flush=True)
+    np = None
 
 BASE_DIR    = os.path.abspath(os.path.dirname(__file__))
 PERSIST_FILE= os.path.join(BASE_DIR, "setup.json")
 
 app = Flask(__name__)
 stop_flag = Event()
-MTX = RLock()                 # <â€” Kunci semua akses MT5
+
+# ========== Metrics (rolling histogram per stage / panggilan MT5) ========== 
+METRICS_WINDOW = 2048   # Sampel terakhir yang disimpan per histogram
+METRICS_LOCK = threading.Lock()
+METRICS = {
+    "hist": {},          # name -> {"samples": deque, "count": int, "sum": float, "max": float}
+    "counters": {"engine_cycles": 0, "cycle_overruns": 0},
+    "started": time.time(),
+}
+
+def metric_observe(name, seconds):
+    """Record one duration (seconds) into the rolling histogram `name`."""
+    with METRICS_LOCK:
+        h = METRICS["hist"].get(name)
+        if h is None:
+            h = METRICS["hist"][name] = {"samples": deque(maxlen=METRICS_WINDOW), "count": 0, "sum": 0.0, "max": 0.0}
+        h["samples"].append(seconds)
+        h["count"] += 1
+        h["sum"] += seconds
+        if seconds > h["max"]:
+            h["max"] = seconds
+
+def metric_inc(name, n=1):
+    with METRICS_LOCK:
+        METRICS["counters"][name] = METRICS["counters"].get(name, 0) + n
+
+def timed(name):
+    """Decorator: time every call of the wrapped function into histogram `name`."""
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                metric_observe(name, time.perf_counter() - t0)
+        return wrapper
+    return deco
+
+def metrics_summary():
+    """Quantiles over the rolling window plus lifetime count/sum per histogram."""
+    with METRICS_LOCK:
+        hists = {k: (sorted(h["samples"]), h["count"], h["sum"], h["max"]) for k, h in METRICS["hist"].items()}
+        counters = dict(METRICS["counters"])
+    out = {}
+    for name, (samples, count, total, mx) in sorted(hists.items()):
+        n = len(samples)
+        q = lambda p: samples[min(n - 1, int(p * n))] if n else 0.0
+        out[name] = {"count": count, "sum": total, "max": mx, "window": n,
+                     "mean": (sum(samples) / n) if n else 0.0,
+                     "p50": q(0.50), "p90": q(0.90), "p99": q(0.99)}
+    return {"uptime_sec": time.time() - METRICS["started"], "counters": counters, "timers": out}
+
+class _ProfiledRLock:
+    """RLock drop-in that profiles contention: wait (acquire) and hold time per
+    call site and per thread. Only the outermost acquire of a thread is
+    measured; re-entrant acquires pass straight through.
+    """
+    def __init__(self):
+        self._lock = RLock()
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self.sites = {}    # "func:line" -> stats
+        self.threads = {}  # thread name -> stats
+        self.holder = None # (thread name, site, since) selama kunci dipegang
+
+    @staticmethod
+    def _new_stats():
+        return {"acquires": 0, "wait_sum": 0.0, "wait_max": 0.0, "hold_sum": 0.0, "hold_max": 0.0}
+
+    def _acquire(self, site, owner, blocking=True, timeout=-1):
+        depth = getattr(self._local, "depth", 0)
+        if depth:
+            ok = self._lock.acquire(blocking, timeout)
+            if ok:
+                self._local.depth = depth + 1
+            return ok
+        t0 = time.perf_counter()
+        ok = self._lock.acquire(blocking, timeout)
+        t1 = time.perf_counter()
+        metric_observe("mtx.wait", t1 - t0)
+        if ok:
+            self._local.depth = 1
+            self._local.site = site
+            self._local.owner = owner
+            self._local.wait = t1 - t0
+            self._local.t_acq = t1
+            self.holder = (owner, site, time.time())
+        return ok
+
+    @staticmethod
+    def _site(frame):
+        return f"{frame.f_code.co_name}:{frame.f_lineno}"
+
+    def acquire(self, blocking=True, timeout=-1):
+        return self._acquire(self._site(sys._getframe(1)), threading.current_thread().name, blocking, timeout)
+
+    def acquire_as(self, site, owner):
+        """Acquire on behalf of another call site/thread (used by the MT5 I/O actor)."""
+        return self._acquire(site, owner)
+
+    def release(self):
+        depth = self._local.depth - 1
+        self._local.depth = depth
+        if depth == 0:
+            hold = time.perf_counter() - self._local.t_acq
+            wait, site, tname = self._local.wait, self._local.site, self._local.owner
+            self.holder = None
+            self._lock.release()
+            metric_observe("mtx.hold", hold)
+            with self._stats_lock:
+                for table, key in ((self.sites, site), (self.threads, tname)):
+                    st = table.get(key)
+                    if st is None:
+                        st = table[key] = self._new_stats()
+                    st["acquires"] += 1
+                    st["wait_sum"] += wait
+                    st["hold_sum"] += hold
+                    if wait > st["wait_max"]: st["wait_max"] = wait
+                    if hold > st["hold_max"]: st["hold_max"] = hold
+        else:
+            self._lock.release()
+
+    def __enter__(self):
+        self._acquire(self._site(sys._getframe(1)), threading.current_thread().name)
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    def report(self, top=15):
+        """Worst holders by total hold time, plus per-thread breakdown."""
+        with self._stats_lock:
+            sites = {k: dict(v) for k, v in self.sites.items()}
+            threads = {k: dict(v) for k, v in self.threads.items()}
+        def _fmt(stats):
+            n = max(1, stats["acquires"])
+            stats["wait_avg"] = stats["wait_sum"] / n
+            stats["hold_avg"] = stats["hold_sum"] / n
+            return stats
+        ranked = sorted(sites.items(), key=lambda kv: kv[1]["hold_sum"], reverse=True)
+        total_hold = sum(v["hold_sum"] for v in sites.values())
+        total_wait = sum(v["wait_sum"] for v in sites.values())
+        holder = self.holder
+        return {
+            "total_hold_sec": total_hold,
+            "total_wait_sec": total_wait,
+            "current_holder": ({"thread": holder[0], "site": holder[1], "held_sec": time.time() - holder[2]}
+                               if holder else None),
+            "worst_holders": [dict(site=k, **_fmt(v)) for k, v in ranked[:top]],
+            "worst_waiters": [dict(site=k, **_fmt(v)) for k, v in
+                              sorted(sites.items(), key=lambda kv: kv[1]["wait_sum"], reverse=True)[:top]],
+            "threads": {k: _fmt(v) for k, v in sorted(threads.items())},
+        }
+
+    def reset(self):
+        with self._stats_lock:
+            self.sites.clear()
+            self.threads.clear()
+
+MTX = _ProfiledRLock()        # <â€” Kunci semua akses MT5 (diprofil, lihat /api/diag/lock)
 STATUS_FAILS = {"count": 0}   # <â€” Menahan OFFLINE jika 1x error sejenak
 
+# ========== MT5 I/O actor (satu thread pemilik semua panggilan MT5) ========== 
+# Semua panggilan MT5 dikirim ke thread "mt5-io" lewat antrian berprioritas:
+# order/close dulu, lalu baca engine, terakhir baca dashboard. Baca identik yang
+# masih antri digabung (coalesce), jadi burst polling UI tidak menunda order close.
+PRIO_TRADE, PRIO_ENGINE, PRIO_UI = 0, 1, 2
+PRIO_NAMES = {PRIO_TRADE: "trade", PRIO_ENGINE: "engine", PRIO_UI: "ui"}
+MT5_IO = {
+    "queue": queue.PriorityQueue(),  # (prio, seq, job)
+    "pending": {},                   # coalesce key -> job yang belum mulai dieksekusi
+    "lock": threading.Lock(),
+    "seq": itertools.count(),        # FIFO di dalam satu prioritas
+    "thread": None,
+}
+_IO_CTX = threading.local()          # prioritas default per thread pemanggil
+
+class _IoJob:
+    __slots__ = ("fn", "args", "kw", "prio", "key", "site", "owner", "enq", "done", "result", "exc")
+
+    def __init__(self, fn, args, kw, prio, key, site, owner):
+        self.fn, self.args, self.kw, self.prio, self.key = fn, args, kw, prio, key
+        self.site, self.owner = site, owner
+        self.enq = time.perf_counter()
+        self.done = Event()
+        self.result = self.exc = None
+
+class _IoPriorityScope:
+    __slots__ = ("prev",)
+
+    def __init__(self, prev):
+        self.prev = prev
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        _IO_CTX.prio = self.prev
+        return False
+
+def io_priority(prio):
+    """Set the default MT5 call priority for the current thread. Also usable as
+    `with io_priority(prio):` to restore the previous priority afterwards."""
+    prev = getattr(_IO_CTX, "prio", PRIO_ENGINE)
+    _IO_CTX.prio = prio
+    return _IoPriorityScope(prev)
+
+def mt5_call(fn, *args, prio=None, **kw):
+    """Run fn(*args, **kw) under MTX on the MT5 I/O thread and return its result.
+    `prio` defaults to the calling thread's priority (see io_priority). Reads below
+    PRIO_TRADE with the same fn/args share one pending job. Runs inline when the
+    actor is not started or when already on it; exceptions propagate to the caller.
+    """
+    if prio is None:
+        prio = getattr(_IO_CTX, "prio", PRIO_ENGINE)
+    site = MTX._site(sys._getframe(1))
+    owner = threading.current_thread().name
+    th = MT5_IO["thread"]
+    if th is None or th is threading.current_thread():
+        MTX.acquire_as(site, owner)
+        try:
+            return fn(*args, **kw)
+        finally:
+            MTX.release()
+    key = None
+    if prio != PRIO_TRADE:
+        try:
+            key = (fn, args, tuple(sorted(kw.items())))
+            hash(key)
+        except TypeError:
+            key = None
+    with MT5_IO["lock"]:
+        job = MT5_IO["pending"].get(key) if key is not None else None
+        coalesced = job is not None and job.prio <= prio
+        if not coalesced:
+            job = _IoJob(fn, args, kw, prio, key, site, owner)
+            if key is not None:
+                MT5_IO["pending"][key] = job
+            MT5_IO["queue"].put((prio, next(MT5_IO["seq"]), job))
+    if coalesced:
+        metric_inc("io_coalesced")
+    job.done.wait()
+    if job.exc is not None:
+        raise job.exc
+    return job.result
+
+def _mt5_io_loop():
+    q = MT5_IO["queue"]
+    while True:
+        _, _, job = q.get()
+        with MT5_IO["lock"]:
+            if job.key is not None and MT5_IO["pending"].get(job.key) is job:
+                del MT5_IO["pending"][job.key]
+        metric_observe(f"io.queue.{PRIO_NAMES[job.prio]}", time.perf_counter() - job.enq)
+        MTX.acquire_as(job.site, job.owner)
+        try:
+            job.result = job.fn(*job.args, **job.kw)
+        except Exception as e:
+            job.exc = e
+        finally:
+            MTX.release()
+            job.done.set()
+
+def mt5_io_start():
+    """Start the MT5 I/O actor; until then mt5_call runs inline under MTX."""
+    if MT5_IO["thread"] is None:
+        MT5_IO["thread"] = Thread(target=_mt5_io_loop, name="mt5-io", daemon=True)
+        MT5_IO["thread"].start()
+
 # ========== DEFAULT ENV ========== 
 DEFAULTS = {
     "MT5_PATH":     r"C:\\Program Files\\MetaTrader 5\\terminal64.exe",
@@ -52,6 +335,12 @@ SETUP = {
     "auto_tpsb_enabled": False, # Default OFF on restart
     "trailing_stop_enabled": False,
     "trailing_stop_value": 2000.0,
+    "engine_mode": "poll", # "poll" = siklus 1 detik; "tick" = stage harga jalan setiap tick baru
+    "engine_symbols": [],  # Simbol tambahan yang ikut ditradingkan engine selain "symbol"
+    "engine_lot": 0.01,    # Lot order API untuk simbol tambahan (tanpa auto-click)
+    # Trade copier (mode worker): posisi akun master disalin ke akun follower.
+    # followers: login -> {"mode": "multiplier"|"fixed"|"equity", "value": 1.0, "symbol_map": {}}
+    "copier": {"enabled": False, "master": CFG("MT5_LOGIN"), "followers": {}},
     # XY coordinates for desktop auto-click (10 slots)
     "click_xy": [
         {"title": f"Close Trade {i+1:02d}", "func": "close_row", "x": 0, "y": 0, "target_neg_pct": 0.0, "target_pos_pct": 0.0}
@@ -115,12 +404,67 @@ def persist_load():
     except Exception as e:
         print("[PERSIST] load EXC:", e, flush=True)
 
+# Write-behind: persist_save() hanya menandai SETUP kotor; persist_writer menggabungkan
+# perubahan beruntun dalam PERSIST_DEBOUNCE_SEC lalu menulis di thread-nya sendiri
+# (temp file + fsync + rename), jadi siklus engine tidak pernah menunggu disk dan
+# crash tidak bisa meninggalkan setup.json setengah tertulis.
+PERSIST_DEBOUNCE_SEC = 0.5
+PERSIST_RETRY_SEC = 2.0     # Jeda sebelum mencoba lagi setelah tulis gagal
+PERSIST = {"dirty": Event(), "lock": threading.Lock(), "thread": None}
+
+@timed("persist.write")
+def _persist_write():
+    for _ in range(3):
+        try:
+            body = json.dumps(SETUP, ensure_ascii=False, indent=2)
+            break
+        except RuntimeError: # SETUP diubah thread lain saat diserialisasi: ulangi
+            time.sleep(0.01)
+    else:
+        raise RuntimeError("SETUP kept changing during serialization")
+    tmp = PERSIST_FILE + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(body)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, PERSIST_FILE)
+
+def persist_flush(only_dirty=False):
+    """Write SETUP to disk now (only if a save is pending when only_dirty).
+    Returns False when the write failed; the save then stays pending."""
+    if only_dirty and not PERSIST["dirty"].is_set():
+        return True
+    with PERSIST["lock"]:
+        PERSIST["dirty"].clear() # perubahan selama menulis menandai dirty lagi
+        try:
+            _persist_write()
+        except Exception as e:
+            # mis. PermissionError dari os.replace di Windows (file sedang dibuka): coba lagi nanti
+            print("[PERSIST] save EXC:", e, flush=True)
+            PERSIST["dirty"].set()
+            return False
+    return True
+
 def persist_save():
-    try:
-        with open(PERSIST_FILE, "w", encoding="utf-8") as f:
-            json.dump(SETUP, f, ensure_ascii=False, indent=2)
-    except Exception as e:
-        print("[PERSIST] save EXC:", e, flush=True)
+    if PERSIST["thread"] is None:
+        persist_flush() # writer belum jalan (script/bench tanpa boot): tulis langsung
+        return
+    PERSIST["dirty"].set()
+
+def persist_writer():
+    while not stop_flag.is_set():
+        if not PERSIST["dirty"].wait(1.0):
+            continue
+        time.sleep(PERSIST_DEBOUNCE_SEC) # kumpulkan toggle beruntun jadi satu tulis
+        if not persist_flush(only_dirty=True):
+            stop_flag.wait(PERSIST_RETRY_SEC)
+
+def persist_start():
+    if PERSIST["thread"] is None:
+        PERSIST["thread"] = Thread(target=persist_writer, name="persist", daemon=True)
+        PERSIST["thread"].start()
+
+atexit.register(persist_flush, only_dirty=True)
 
 persist_load()
 
@@ -128,45 +472,312 @@ persist_load()
 RETRY_DELAY_SEC = 4  # Waktu (detik) sebelum mencoba klik ulang
 MAX_RETRIES = 3      # Jumlah maksimal percobaan ulang
 
-STATE = {
-    "locked": False,
-    "timer": "00:00",
-    "cooldown": False, "cooldown_until": 0.0,
-    "last_entry_ts": 0.0,
-    "last_m1_minute": None,
-    "cross_last_check_minute": None,
-    "last_m5_toggle_ts": None, # Ditambahkan untuk logika auto-toggle M5
-    "session_active": False, "session_start_ts": 0.0,
-    "session_be_hit": False, "session_peak_pl": 0.0,
-    "session_close_triggered": False,
-    "last_system_message": None,
-    "pending_open": None, # {side, ts, retries, x, y, reason}
-    "failed_open": False,
-    # --- Retry System State ---
-    "pending_close": {},  # Format: { ticket: {ts, retries, x, y, reason} }
-    "failed_close": set(),  # Format: { ticket1, ticket2 }
-    "pl_trailing_peaks": {}, # { ticket: peak_pl_in_account_currency },
-    "arah_posisi_terkunci": None, # None | "BUY" | "SELL",
-    "last_cross_direction": None, # None | "UP" | "DOWN",
-    "m5_locked_direction": None, # None | "BUY" | "SELL"
-    "sr_original_near_pct": None # Untuk menyimpan nilai near_pct asli saat mode Jarak Lebar aktif
-}
-
 APP_VERSION = "1.4.2" # Version check for debugging
 
-SR_TRIGGER = {
-    "buy":  {"armed": True, "last_ts": 0.0, "pending": False, "last_trigger_candle_ts": 0.0, "last_trigger_level": 0.0},
-    "sell": {"armed": True, "last_ts": 0.0, "pending": False, "last_trigger_candle_ts": 0.0, "last_trigger_level": 0.0}
-}
-SR_STATE = {
-    "support": 0.0, "resistance": 0.0, "mid": 0.0,
-    "top": 0.0, "bottom": 0.0
-}
+ACCOUNT_WORKER = {"login": None}  # diisi di proses worker akun (mode MT5_WORKERS=1)
+
+# ========== Per-symbol engine state ========== 
+# Engine bisa mentradingkan beberapa simbol sekaligus (lihat engine_symbols()). Semua
+# field engine disimpan per simbol di SYM_STATE; STATE/SR_TRIGGER/SR_STATE/TRIGGERED_TICKETS
+# tetap dipakai seperti biasa tetapi menunjuk ke state simbol konteks: simbol yang sedang
+# diproses engine (symbol_context), atau SETUP["symbol"] di luar engine (UI/API).
+SHARED_STATE_KEYS = ("locked", "last_system_message") # berlaku untuk seluruh akun / UI
+
+def _new_symbol_state():
+    return {
+        "state": {
+            "timer": "00:00",
+            "cooldown": False, "cooldown_until": 0.0,
+            "last_entry_ts": 0.0,
+            "last_m1_minute": None,
+            "cross_last_check_minute": None,
+            "last_m5_toggle_ts": None, # Ditambahkan untuk logika auto-toggle M5
+            "session_active": False, "session_start_ts": 0.0,
+            "session_be_hit": False, "session_peak_pl": 0.0,
+            "session_close_triggered": False,
+            "pending_open": None, # {side, ts, retries, x, y, reason}
+            "failed_open": False,
+            # --- Retry System State ---
+            "pending_close": {},  # Format: { ticket: {ts, retries, x, y, reason} }
+            "failed_close": set(),  # Format: { ticket1, ticket2 }
+            "pl_trailing_peaks": {}, # { ticket: peak_pl_in_account_currency },
+            "arah_posisi_terkunci": None, # None | "BUY" | "SELL",
+            "last_cross_direction": None, # None | "UP" | "DOWN",
+            "m5_locked_direction": None, # None | "BUY" | "SELL"
+            "sr_original_near_pct": None # Untuk menyimpan nilai near_pct asli saat mode Jarak Lebar aktif
+        },
+        "sr_trigger": {
+            "buy":  {"armed": True, "last_ts": 0.0, "pending": False, "last_trigger_candle_ts": 0.0, "last_trigger_level": 0.0},
+            "sell": {"armed": True, "last_ts": 0.0, "pending": False, "last_trigger_candle_ts": 0.0, "last_trigger_level": 0.0}
+        },
+        "sr_state": {
+            "support": 0.0, "resistance": 0.0, "mid": 0.0,
+            "top": 0.0, "bottom": 0.0
+        },
+        # State untuk mencegah trigger berulang pada posisi yang sama
+        "triggered_tickets": set(),
+        # Toggle mode milik simbol ini (lihat symbol_modes); None = belum di-seed
+        "modes": None,
+    }
+
+SYM_STATE = {}                 # simbol -> _new_symbol_state()
+_SYM_CTX = threading.local()   # simbol konteks per thread
+
+def current_symbol():
+    return getattr(_SYM_CTX, "sym", None) or SETUP["symbol"]
+
+def sym_state(sym=None):
+    sym = sym or current_symbol()
+    st = SYM_STATE.get(sym)
+    if st is None:
+        st = SYM_STATE.setdefault(sym, _new_symbol_state())
+    return st
+
+@contextlib.contextmanager
+def symbol_context(sym):
+    """Point STATE/SR_TRIGGER/SR_STATE/TRIGGERED_TICKETS at `sym` for this thread."""
+    prev = getattr(_SYM_CTX, "sym", None)
+    _SYM_CTX.sym = sym
+    try:
+        yield sym_state(sym)
+    finally:
+        _SYM_CTX.sym = prev
+
+class _SymbolScopedDict(MutableMapping):
+    """Dict view onto part of the context symbol's state; `shared` keys live in one global dict."""
+    def __init__(self, part, shared=None):
+        self._part = part
+        self._shared = shared or {}
+
+    def _target(self, key):
+        return self._shared if key in SHARED_STATE_KEYS and self._part == "state" else sym_state()[self._part]
+
+    def __getitem__(self, key): return self._target(key)[key]
+    def __setitem__(self, key, value): self._target(key)[key] = value
+    def __delitem__(self, key): del self._target(key)[key]
+    def __iter__(self): return iter({**self._shared, **sym_state()[self._part]})
+    def __len__(self): return len(self._shared) + len(sym_state()[self._part])
+
+class _SymbolScopedSet:
+    """Set view onto the context symbol's set `part`; methods delegate to the real set."""
+    def __init__(self, part):
+        self._part = part
+    def __contains__(self, item): return item in sym_state()[self._part]
+    def __iter__(self): return iter(sym_state()[self._part])
+    def __len__(self): return len(sym_state()[self._part])
+    def __getattr__(self, name): return getattr(sym_state()[self._part], name)
+
+# Pesan sistem: setiap pesan baru diberi seq naik (mulai epoch ms, monoton lintas restart) dan ts.
+# Tidak pernah "dikonsumsi": ikut dokumen status sampai SYSTEM_MESSAGE_TTL_SEC, UI menampilkan per seq.
+SYSTEM_MESSAGE_TTL_SEC = 30.0
+_SYSTEM_MESSAGE_SEQ = itertools.count(int(time.time() * 1000))
+
+class _SharedState(dict):
+    """Shared STATE keys; stamps seq/ts on every new system message."""
+    def __setitem__(self, key, value):
+        if key == "last_system_message" and value:
+            value = dict(value, seq=next(_SYSTEM_MESSAGE_SEQ), ts=time.time())
+        super().__setitem__(key, value)
+
+STATE = _SymbolScopedDict("state", shared=_SharedState(locked=False, last_system_message=None))
+SR_TRIGGER = _SymbolScopedDict("sr_trigger")
+SR_STATE = _SymbolScopedDict("sr_state")
+TRIGGERED_TICKETS = _SymbolScopedSet("triggered_tickets")
 SR_MIN_GAP = 5.0
 SR_PRICE_BUFFER_PCT = 0.0015
 
-# State untuk mencegah trigger berulang pada posisi yang sama
-TRIGGERED_TICKETS = set()
+# Toggle yang diubah stage mode engine (jumlah posisi, kunci M5) dan dibaca stage TP/trailing/SR.
+# Simbol aktif memakai SETUP (toggle dashboard + persist); simbol engine lain punya salinan sendiri.
+SYMBOL_MODE_KEYS = ("tpsm_auto", "auto_tpsb_enabled", "trailing_stop_enabled", "sr_buy_enabled", "sr_sell_enabled")
+
+def symbol_modes(sym=None):
+    """Mode toggles for `sym`: SETUP for the active symbol, else its own copy seeded from SETUP."""
+    sym = sym or current_symbol()
+    if sym == SETUP["symbol"]:
+        return SETUP
+    st = sym_state(sym)
+    if st["modes"] is None:
+        st["modes"] = {k: SETUP.get(k) for k in SYMBOL_MODE_KEYS}
+    return st["modes"]
+
+def engine_symbols():
+    """Symbols the engine trades: the active chart symbol first, then SETUP["engine_symbols"]."""
+    syms = [SETUP["symbol"]]
+    for sym in SETUP.get("engine_symbols") or []:
+        if sym and sym not in syms:
+            syms.append(sym)
+    return syms
+
+def _symbol_uses_clicks(sym):
+    # Auto-click XY hanya mengenai chart simbol aktif di terminal; simbol lain lewat order API.
+    # Mode worker: layar dipakai bersama terminal semua akun -> klik bisa kena akun lain, selalu API
+    if ACCOUNT_WORKER["login"] is not None:
+        return False
+    return sym == SETUP["symbol"]
+
+# ========== Runtime state journal ========== 
+# State engine yang penting untuk restart (sesi, peak trailing, antrian close, lock arah,
+# arming SR) dicatat sebagai diff JSON-lines ke <setup>.journal setiap siklus. Saat boot
+# journal diputar ulang dan dicocokkan dengan posisi live, lalu dipadatkan jadi satu
+# snapshot per simbol. Baris terakhir yang terpotong (crash) dilewati saat replay.
+JOURNAL_STATE_KEYS = (
+    "session_active", "session_start_ts", "session_peak_pl", "session_be_hit", "session_close_triggered",
+    "cooldown", "cooldown_until", "last_entry_ts", "pending_open", "failed_open",
+    "pending_close", "failed_close", "pl_trailing_peaks",
+    "arah_posisi_terkunci", "m5_locked_direction", "last_cross_direction", "sr_original_near_pct",
+)
+JOURNAL_TICKET_KEYED = ("pending_close", "pl_trailing_peaks") # dict dengan key tiket (int)
+JOURNAL_COMPACT_LINES = 2000  # Padatkan setelah sebanyak ini baris diff
+JOURNAL_FSYNC_SEC = 1.0
+JOURNAL = {"queue": queue.Queue(), "thread": None, "last": {}, "image": {}, "lines": 0}
+
+def _journal_file():
+    return os.path.splitext(PERSIST_FILE)[0] + ".journal"
+
+def _journal_encode(value):
+    if isinstance(value, set):
+        value = sorted(value)
+    elif isinstance(value, dict):
+        value = {str(k): v for k, v in value.items()}
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=str)
+
+def _journal_fields(st):
+    """Flattened journaled fields of one symbol state -> JSON string per field."""
+    out = {"state." + k: _journal_encode(st["state"][k]) for k in JOURNAL_STATE_KEYS}
+    out["sr_trigger"] = _journal_encode(st["sr_trigger"])
+    out["triggered_tickets"] = _journal_encode(st["triggered_tickets"])
+    return out
+
+def _journal_line(sym, fields):
+    body = ",".join(f"{json.dumps(k)}:{v}" for k, v in fields.items())
+    return f'{{"ts":{time.time():.3f},"sym":{json.dumps(sym)},"set":{{{body}}}}}\n'
+
+def journal_capture():
+    """Queue the journaled fields that changed since the last capture (engine thread)."""
+    if JOURNAL["thread"] is None:
+        return
+    for sym, st in list(SYM_STATE.items()):
+        fields = _journal_fields(st)
+        last = JOURNAL["last"].setdefault(sym, {})
+        changed = {k: v for k, v in fields.items() if last.get(k) != v}
+        if changed:
+            last.update(changed)
+            JOURNAL["queue"].put((sym, changed))
+
+def _journal_compact():
+    path = _journal_file()
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        for sym, fields in JOURNAL["image"].items():
+            f.write(_journal_line(sym, fields))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    JOURNAL["lines"] = 0
+
+def journal_writer():
+    f = open(_journal_file(), "a", encoding="utf-8")
+    synced = time.time()
+    while True:
+        try:
+            item = JOURNAL["queue"].get(timeout=JOURNAL_FSYNC_SEC)
+        except queue.Empty:
+            item = None
+        if item is not None:
+            sym, changed = item
+            JOURNAL["image"].setdefault(sym, {}).update(changed)
+            f.write(_journal_line(sym, changed))
+            JOURNAL["lines"] += 1
+        if JOURNAL["queue"].empty():
+            f.flush()
+            if time.time() - synced >= JOURNAL_FSYNC_SEC:
+                os.fsync(f.fileno())
+                synced = time.time()
+            if JOURNAL["lines"] >= JOURNAL_COMPACT_LINES:
+                f.close()
+                _journal_compact()
+                f = open(_journal_file(), "a", encoding="utf-8")
+        if item is None and stop_flag.is_set():
+            break
+    f.close()
+
+def _journal_decode(key, raw):
+    value = json.loads(raw)
+    name = key.partition(".")[2] or key
+    if name in ("failed_close", "triggered_tickets"):
+        return set(value)
+    if name in JOURNAL_TICKET_KEYED:
+        return {int(k): v for k, v in value.items()}
+    return value
+
+def journal_replay():
+    """Rebuild SYM_STATE from the journal and reconcile it with the live positions.
+    Returns the number of symbols restored."""
+    path = _journal_file()
+    if not os.path.exists(path):
+        return 0
+    image = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue # baris terpotong saat crash
+            image.setdefault(rec["sym"], {}).update({k: json.dumps(v, separators=(",", ":")) for k, v in rec["set"].items()})
+    positions = mt5_call(mt5.positions_get, prio=PRIO_TRADE) if mt5 else None
+    live = {}
+    for p in positions or []:
+        live.setdefault(p.symbol, set()).add(p.ticket)
+    for sym, fields in image.items():
+        st = sym_state(sym)
+        for key, raw in fields.items():
+            try:
+                value = _journal_decode(key, raw)
+            except (ValueError, TypeError):
+                continue
+            part, _, name = key.partition(".")
+            if name:
+                st[part][name] = value
+            elif part == "sr_trigger":
+                st["sr_trigger"].update(value)
+            else:
+                st[part] = value
+        if positions is None:
+            continue # posisi tidak terbaca: jangan buang apa pun
+        # Cocokkan dengan posisi live: tiket yang sudah tutup dibuang, sesi tanpa posisi diakhiri
+        tickets = live.get(sym, set())
+        s = st["state"]
+        s["pending_close"] = {t: d for t, d in s["pending_close"].items() if t in tickets}
+        s["failed_close"] &= tickets
+        s["pl_trailing_peaks"] = {t: v for t, v in s["pl_trailing_peaks"].items() if t in tickets}
+        st["triggered_tickets"] &= tickets
+        s["pending_open"], s["failed_open"] = None, False # verifikasi klik open tidak bisa dilanjutkan
+        for side in st["sr_trigger"].values():
+            side["pending"] = False
+        if s["cooldown"] and s["cooldown_until"] <= time.time():
+            s["cooldown"] = False
+        if s["session_active"] and not tickets:
+            with symbol_context(sym):
+                end_session_no_cooldown()
+    print(f"[JOURNAL] restored {len(image)} symbol(s) from {path}", flush=True)
+    return len(image)
+
+def journal_start():
+    """Replay the journal, compact it to the reconciled state and start the writer."""
+    if JOURNAL["thread"] is not None:
+        return
+    try:
+        journal_replay()
+    except Exception as e:
+        print("[JOURNAL] replay EXC:", e, flush=True)
+    JOURNAL["last"] = {sym: _journal_fields(st) for sym, st in SYM_STATE.items()}
+    JOURNAL["image"] = {sym: dict(fields) for sym, fields in JOURNAL["last"].items()}
+    try:
+        _journal_compact()
+    except Exception as e:
+        print("[JOURNAL] compact EXC:", e, flush=True)
+    JOURNAL["thread"] = Thread(target=journal_writer, name="journal", daemon=True)
+    JOURNAL["thread"].start()
 
 CLOSE_REASON = {}
 
@@ -180,8 +791,7 @@ def _filling_sequence_for_symbol(sym):
     if mt5 is None:
         return modes
     try:
-        with MTX:
-            si = mt5.symbol_info(sym)
+        si = mt5_call(mt5.symbol_info, sym, prio=PRIO_TRADE)
         IOC = getattr(mt5, 'ORDER_FILLING_IOC', None)
         FOK = getattr(mt5, 'ORDER_FILLING_FOK', None)
         fm = getattr(si, 'filling_mode', None) if si else None
@@ -231,26 +841,25 @@ def classify_open_exec(comment: str) -> str:
         return 'Manual'
     return 'Unknown'
 
-# ========== MT5 helper (semua dibungkus MTX) ========== 
+# ========== MT5 helper (semua lewat mt5_call / MTX) ========== 
 def mt5_init():
     if mt5 is None:
         print("[MT5] unavailable (import failed)", flush=True)
         return False
     term = CFG("MT5_PATH")
-    with MTX:
-        try:
-            ok = mt5.initialize(term) if term and os.path.exists(term) else mt5.initialize()
-        except Exception as e:
-            print("[MT5] init EXC:", e, flush=True); return False
-        if not ok:
-            print("[MT5] init FAIL:", mt5.last_error(), flush=True); return False
+    try:
+        ok = (mt5_call(mt5.initialize, term, prio=PRIO_TRADE) if term and os.path.exists(term)
+              else mt5_call(mt5.initialize, prio=PRIO_TRADE))
+    except Exception as e:
+        print("[MT5] init EXC:", e, flush=True); return False
+    if not ok:
+        print("[MT5] init FAIL:", mt5.last_error(), flush=True); return False
     return maybe_login()
 
 def maybe_login():
     if mt5 is None:
         return False
-    with MTX:
-        ai = mt5.account_info()
+    ai = mt5_call(mt5.account_info, prio=PRIO_TRADE)
     if ai is not None:
         print(f"[MT5] already logged-in: {ai.login}/{ai.server}", flush=True)
         return True
@@ -258,82 +867,83 @@ def maybe_login():
     login, pwd, server = creds.get("login"), creds.get("password"), creds.get("server")
     if not (login and pwd and server):
         print("[MT5] no credentials for active account", flush=True); return False
-    with MTX:
-        try:
-            ok = mt5.login(int(login), password=str(pwd), server=str(server))
-        except Exception as e:
-            print("[MT5] login EXC:", e, flush=True); ok = False
+    try:
+        ok = mt5_call(mt5.login, int(login), password=str(pwd), server=str(server), prio=PRIO_TRADE)
+    except Exception as e:
+        print("[MT5] login EXC:", e, flush=True); ok = False
     print("[MT5] login:", "OK" if ok else f"FAIL {mt5.last_error()}", flush=True)
     return ok
 def mt5_restart():
     if mt5 is None:
         return False
-    with MTX:
-        try:
-            mt5.shutdown()
-        except Exception as e:
-            print("[MT5] shutdown EXC:", e, flush=True)
+    try:
+        mt5_call(mt5.shutdown, prio=PRIO_TRADE)
+    except Exception as e:
+        print("[MT5] shutdown EXC:", e, flush=True)
     time.sleep(0.5)
     print("[MT5] restart triggered", flush=True)
     return mt5_init()
 
-def symbol_ensure(symbol):
+def symbol_resolve(symbol):
+    """Make `symbol` visible in Market Watch and return the name to use: itself, or
+    the first broker variant matching `symbol*` (e.g. XAUUSD -> XAUUSDc). None when
+    nothing matches. Does not touch SETUP."""
     if mt5 is None:
-        return False
-    with MTX:
+        return None
+    try: si = mt5_call(mt5.symbol_info, symbol)
+    except: si = None
+    if si and si.visible: return symbol
+    if si and not si.visible:
         try:
-            si = mt5.symbol_info(symbol)
+            mt5_call(mt5.symbol_select, symbol, True)
+            si = mt5_call(mt5.symbol_info, symbol)
         except: si = None
-    if si and si.visible: return True
-    if si and not si.visible:
-        with MTX:
-            try:
-                mt5.symbol_select(symbol, True)
-                si = mt5.symbol_info(symbol)
-            except: si = None
-        if si and si.visible: return True
+        if si and si.visible: return symbol
     # fallback wildcard
     base = symbol.rstrip(".")
-    with MTX:
-        try:
-            cands = mt5.symbols_get(f"{base}*") or []
-        except:
-            cands = []
+    try:
+        cands = mt5_call(mt5.symbols_get, f"{base}*") or []
+    except:
+        cands = []
     for c in cands:
-        with MTX:
-            ok = (c.visible or mt5.symbol_select(c.name, True))
-        if ok:
-            print(f"[SYMBOL] fallback -> {c.name}", flush=True)
-            SETUP["symbol"] = c.name
-            persist_save()
-            return True
-    print(f"[SYMBOL] not visible: {symbol}", flush=True); return False
+        if c.visible or mt5_call(mt5.symbol_select, c.name, True):
+            return c.name
+    return None
+
+def symbol_ensure(symbol):
+    name = symbol_resolve(symbol)
+    if name is None:
+        print(f"[SYMBOL] not visible: {symbol}", flush=True); return False
+    if name != symbol and symbol == SETUP["symbol"]:
+        # Hanya simbol utama yang disimpan ulang; simbol lain cukup di-resolve pemanggil
+        print(f"[SYMBOL] fallback -> {name}", flush=True)
+        SETUP["symbol"] = name
+        persist_save()
+    return True
 
+@timed("mt5.tick")
 def tick(sym):
     if mt5 is None:
         return None
-    with MTX:
-        try:
-            return mt5.symbol_info_tick(sym)
-        except:
-            return None
+    try:
+        return mt5_call(mt5.symbol_info_tick, sym)
+    except:
+        return None
 
+@timed("mt5.positions")
 def positions(sym=None):
     if mt5 is None:
         return []
-    with MTX:
-        try:
-            pos_tuple = mt5.positions_get(symbol=sym) if sym else mt5.positions_get()
-            if pos_tuple is None:
-                return [] # No positions found is a valid success case
-            return list(pos_tuple)
-        except Exception as e:
-            print(f"[positions] Gagal mengambil data posisi: {e}", flush=True)
-            return [] # Return empty list on error for consistency
+    try:
+        pos_tuple = mt5_call(mt5.positions_get, symbol=sym) if sym else mt5_call(mt5.positions_get)
+        if pos_tuple is None:
+            return [] # No positions found is a valid success case
+        return list(pos_tuple)
+    except Exception as e:
+        print(f"[positions] Gagal mengambil data posisi: {e}", flush=True)
+        return [] # Return empty list on error for consistency
 
-def candles(sym, tf, count):
-    if mt5 is None:
-        return []
+def _tf_const(tf):
     tf_map = {
         "M1": getattr(mt5, "TIMEFRAME_M1", 1),
         "M5": getattr(mt5, "TIMEFRAME_M5", 5),
@@ -341,28 +951,213 @@ def candles(sym, tf, count):
         "M30": getattr(mt5, "TIMEFRAME_M30", 30),
         "H1": getattr(mt5, "TIMEFRAME_H1", 60),
     }
-    timeframe = tf_map.get(tf, tf_map["M1"])
-    with MTX:
-        try:
-            rates = mt5.copy_rates_from_pos(sym, timeframe, 0, count)
-        except:
-            rates = None
-    out = []
-    if rates is not None:
-        for r in rates:
-            out.append({"time": int(r['time']), "open": float(r['open']),
-                        "high": float(r['high']), "low": float(r['low']),
-                        "close": float(r['close'])})
-    return out
+    return tf_map.get(tf, tf_map["M1"])
+
+def _copy_rates(sym, tf, count):
+    try:
+        return mt5_call(mt5.copy_rates_from_pos, sym, _tf_const(tf), 0, count)
+    except:
+        return None
+
+# ---------- Candle ring buffer ----------
+# Per (simbol, timeframe) disimpan array rates MT5 yang tidak pernah ditulis lagi setelah
+# dibagikan: refresh yang menambah bar atau mengubah bar berjalan membangun array baru
+# (maks `cap` bar terakhir + bar baru, satu memcpy kecil per refresh) lalu menukar
+# referensinya. View yang sudah dipegang engine atau thread Flask (/api/candles) tetap
+# konsisten tanpa copy di sisi pembaca, pembaca berikutnya melihat array baru.
+# Fetch MT5 selalu di luar CANDLE_LOCK; kunci hanya dipakai untuk menukar entri buffer,
+# jadi refresh dashboard (PRIO_UI) tidak menahan baca candle engine.
+TF_SECONDS = {"M1": 60, "M5": 300, "M15": 900, "M30": 1800, "H1": 3600}
+CANDLE_BUF_CAPACITY = 600  # Bar minimum yang disimpan per (simbol, timeframe)
+CANDLE_REFRESH_SEC = 0.25  # Dalam satu siklus engine buffer cukup di-refresh sekali
+CANDLE_BUFFERS = {}        # (sym, tf) -> {"data", "cap", "fetched_at"}; data diganti bersama entrinya
+CANDLE_LOCK = RLock()
+
+def _candle_buffer_swap(sym, tf, base, data, cap):
+    """Publish `data` as the new buffer entry unless another thread replaced `base` first."""
+    buf = {"data": data, "cap": cap, "fetched_at": time.time()}
+    with CANDLE_LOCK:
+        cur = CANDLE_BUFFERS.get((sym, tf))
+        if cur is not base and cur is not None:
+            return cur # refresh lain sudah menukar lebih dulu: pakai miliknya
+        CANDLE_BUFFERS[(sym, tf)] = buf
+    return buf
+
+def _candle_buffer_seed(sym, tf, cap, base=None):
+    rates = _copy_rates(sym, tf, cap)
+    if rates is None or len(rates) == 0:
+        return None
+    data = np.array(rates, copy=True)
+    data.flags.writeable = False
+    return _candle_buffer_swap(sym, tf, base, data, cap)
+
+def _candle_buffer_update(sym, tf, buf):
+    """Pull only the forming bar plus any bars closed since the last refresh."""
+    data = buf["data"]
+    n = len(data)
+    last_time = int(data[n-1]['time'])
+    new = _copy_rates(sym, tf, 2)
+    if new is None or len(new) == 0:
+        return buf
+    if int(new[0]['time']) > last_time:
+        # Ada bar yang terlewat (engine sempat berhenti): ambil sisanya sekaligus
+        missed = (int(new[-1]['time']) - last_time) // TF_SECONDS.get(tf, 60) + 1
+        if missed >= buf["cap"]:
+            return _candle_buffer_seed(sym, tf, buf["cap"], buf) or buf
+        new = _copy_rates(sym, tf, missed + 1)
+        if new is None or len(new) == 0:
+            return buf
+    new = new[new['time'] >= last_time]
+    buf["fetched_at"] = time.time()
+    if len(new) == 0 or (len(new) == 1 and new[0].tobytes() == data[n-1].tobytes()):
+        return buf # tidak ada yang berubah: array lama tetap dipakai
+    # forming bar lama diganti versi barunya, bar tertutup baru menyusul di belakang
+    keep = data[max(0, n - buf["cap"]):n - 1 if int(new[0]['time']) == last_time else n]
+    fresh = np.concatenate([keep, new.astype(data.dtype, copy=False)])
+    fresh.flags.writeable = False
+    return _candle_buffer_swap(sym, tf, buf, fresh, buf["cap"])
+
+def candle_buffer(sym, tf, count):
+    """Last `count` bars of (sym, tf) as a zero-copy, read-only view of the
+    buffer (forming bar last). Refreshes never write into an array that was
+    already handed out, so the view stays consistent in any thread.
+    """
+    if mt5 is None or np is None:
+        return []
+    with CANDLE_LOCK:
+        buf = CANDLE_BUFFERS.get((sym, tf))
+    if buf is None or count > buf["cap"]:
+        buf = _candle_buffer_seed(sym, tf, max(count, CANDLE_BUF_CAPACITY), buf)
+    elif time.time() - buf["fetched_at"] >= CANDLE_REFRESH_SEC:
+        buf = _candle_buffer_update(sym, tf, buf)
+    if buf is None:
+        return []
+    data = buf["data"]
+    return data[max(0, len(data) - count):]
+
+@timed("mt5.candles")
+def candles_np(sym, tf, count):
+    """Last `count` bars as the MT5 structured array (time/open/high/low/close...).
+    Windows that fit the ring buffer are served from it; larger requests
+    (e.g. a long chart) are fetched directly without growing the buffer.
+    """
+    if mt5 is None or np is None:
+        return []
+    if count <= CANDLE_BUF_CAPACITY:
+        return candle_buffer(sym, tf, count)
+    rates = _copy_rates(sym, tf, count)
+    return rates if rates is not None else []
+
+def candles(sym, tf, count, since=None, rates=None):
+    """JSON boundary: list of {time, open, high, low, close} dicts.
+    With `since` (bar open time, epoch sec) only bars at or after it are returned,
+    i.e. the client's last (possibly still forming) bar plus any newer ones.
+    Pass `rates` (from candles_np) to build from an array already fetched.
+    """
+    if rates is None:
+        rates = candles_np(sym, tf, count)
+    if since is not None and len(rates):
+        rates = rates[int(np.searchsorted(rates['time'], since)):]
+    if len(rates) == 0:
+        return []
+    cols = (rates['time'].astype(np.int64).tolist(), rates['open'].tolist(),
+            rates['high'].tolist(), rates['low'].tolist(), rates['close'].tolist())
+    return [{"time": t, "open": o, "high": h, "low": l, "close": c} for t, o, h, l, c in zip(*cols)]
+
+def candles_etag(sym, tf, count, since=None, rates=None):
+    """Validator for a /api/candles response: changes whenever the window slides
+    or the forming bar ticks, without serializing the bars."""
+    if rates is None:
+        rates = candles_np(sym, tf, count)
+    if len(rates) == 0:
+        return f"{sym}-{tf}-empty"
+    first, last = rates[0], rates[-1]
+    return (f"{sym}-{tf}-{count}-{since}-{len(rates)}-{int(first['time'])}-{int(last['time'])}-"
+            f"{float(last['open'])!r}-{float(last['high'])!r}-{float(last['low'])!r}-{float(last['close'])!r}")
+
+# ---------- Indicator (incremental, state per simbol/timeframe) ----------
+# EMA/SMA dilipat satu kali per bar yang tutup (O(1) per indikator); bar berjalan hanya
+# dipakai untuk nilai "curr" tanpa mengubah state. Semua indikator satu (simbol, tf)
+# maju bersama, jadi menambah periode/timeframe tidak menambah scan ulang candle.
+INDICATORS = {}  # (sym, tf) -> {"closed_ts": open time bar tertutup terakhir, "ind": {(kind, period): state}}
+INDICATOR_LOCK = threading.Lock()  # state INDICATORS/SR_TRACKERS; candle dibaca sebelum kunci diambil
+
+def _ind_new(kind, period):
+    if kind == "ema":
+        # Diseed dengan SMA dari `period` close pertama, lalu rekursif
+        return {"kind": kind, "period": period, "k": 2.0 / (period + 1), "n": 0, "seed": 0.0, "value": None}
+    if kind == "sma":
+        return {"kind": kind, "period": period, "window": deque(maxlen=period), "sum": 0.0}
+    raise ValueError(f"unknown indicator {kind!r}")
+
+def _ind_fold(st, close):
+    """Advance one indicator by one closed bar."""
+    if st["kind"] == "ema":
+        if st["value"] is None:
+            st["n"] += 1
+            st["seed"] += close
+            if st["n"] == st["period"]:
+                st["value"] = st["seed"] / st["period"]
+        else:
+            st["value"] += st["k"] * (close - st["value"])
+    else:
+        w = st["window"]
+        if len(w) == st["period"]:
+            st["sum"] -= w[0]
+        w.append(close)
+        st["sum"] += close
+
+def _ind_values(st, forming):
+    """(prev, curr): value through the last closed bar, and with the forming bar folded in."""
+    p = st["period"]
+    if st["kind"] == "ema":
+        prev = st["value"]
+        if prev is None:
+            return None, ((st["seed"] + forming) / p if st["n"] == p - 1 else None)
+        return prev, prev + st["k"] * (forming - prev)
+    w = st["window"]
+    if len(w) == p:
+        return st["sum"] / p, (st["sum"] - w[0] + forming) / p
+    return None, ((st["sum"] + forming) / p if len(w) == p - 1 else None)
+
+def indicator(sym, tf, kind, period):
+    """(previous, current) value of EMA/SMA(`period`) on (sym, tf): previous is
+    through the last closed bar, current includes the forming bar. (None, None)
+    while there is not enough history."""
+    rates = candles_np(sym, tf, CANDLE_BUF_CAPACITY)
+    if len(rates) < 2:
+        return None, None
+    times = rates['time']
+    with INDICATOR_LOCK:
+        stream = INDICATORS.setdefault((sym, tf), {"closed_ts": None, "ind": {}})
+        last = stream["closed_ts"]
+        i = int(np.searchsorted(times, last)) if last is not None else 0
+        if last is None or i >= len(times) or int(times[i]) != last:
+            # Belum pernah / celah di buffer (reseed, ganti simbol): mulai ulang dari seluruh buffer
+            for key in stream["ind"]:
+                stream["ind"][key] = _ind_new(*key)
+            i = -1
+        key = (kind, period)
+        st = stream["ind"].get(key)
+        if st is None:
+            # Indikator baru: lipat sekali sampai titik yang sama dengan indikator lain
+            st = stream["ind"][key] = _ind_new(kind, period)
+            for c in rates['close'][:i + 1].tolist():
+                _ind_fold(st, c)
+        new = rates['close'][i + 1:-1].tolist() # bar yang tutup sejak panggilan terakhir
+        for c in new:
+            for ind in stream["ind"].values():
+                _ind_fold(ind, c)
+        stream["closed_ts"] = int(times[-2])
+        return _ind_values(st, float(rates['close'][-1]))
 
 def account_snapshot():
     if mt5 is None:
         return None
-    with MTX:
-        try:
-            return mt5.account_info()
-        except:
-            return None
+    try:
+        return mt5_call(mt5.account_info)
+    except:
+        return None
 
 
 def float_pl(sym):
@@ -374,90 +1169,196 @@ def float_pl(sym):
 def open_count(sym): return len(positions(sym))
 def total_lot(sym):  return sum(p.volume for p in positions(sym))
 
-# ========== History helper ========== 
+# ========== Market snapshot (1x per siklus engine) ========== 
+ORDER_SEQ = {"n": 0}  # Naik setiap ada order/klik terkirim -> snapshot lama basi
 
-def get_history_today():
-    if mt5 is None:
-        return [], 0.0
-    now = datetime.now()
-    start_day = now.replace(hour=0, minute=0, second=0, microsecond=0)
-    with MTX:
+@timed("mt5.order_send")
+def _order_send(req):
+    """order_send dengan prioritas tertinggi; menandai snapshot pasar yang ada sebagai basi."""
+    res = mt5_call(mt5.order_send, req, prio=PRIO_TRADE)
+    ORDER_SEQ["n"] += 1
+    return res
+
+
+def _snapshot_read(sym):
+    """The MT5 reads behind market_snapshot, run as one I/O job."""
+    out = {"positions": [], "tick": None, "account": None, "online": False}
+    try:
+        out["positions"] = list(mt5.positions_get(symbol=sym) or [])
+    except Exception as e:
+        print(f"[positions] Gagal mengambil data posisi: {e}", flush=True)
+    try:
+        out["tick"] = mt5.symbol_info_tick(sym)
+    except Exception:
+        pass
+    try:
+        out["account"] = mt5.account_info()
+    except Exception:
+        pass
+    try:
+        ti = mt5.terminal_info()
+        out["online"] = bool(ti) and bool(getattr(ti, "connected", False))
+    except Exception:
+        pass
+    return out
+
+def _snapshot_totals(snap):
+    pos = snap["positions"]
+    snap["open_count"] = len(pos)
+    snap["float_pl"] = sum(float(getattr(p, 'profit', 0.0) or 0.0) for p in pos)
+    snap["total_lot"] = sum(p.volume for p in pos)
+    return snap
+
+def _snapshots_read(symbols):
+    """One positions_get() partitioned by symbol, a tick per symbol, account/terminal once."""
+    parts = {sym: {"positions": [], "tick": None} for sym in symbols}
+    try:
+        for p in mt5.positions_get() or []:
+            part = parts.get(p.symbol)
+            if part is not None:
+                part["positions"].append(p)
+    except Exception as e:
+        print(f"[positions] Gagal mengambil data posisi: {e}", flush=True)
+    for sym in symbols:
         try:
-            deals = mt5.history_deals_get(start_day, now) or []
+            parts[sym]["tick"] = mt5.symbol_info_tick(sym)
         except Exception:
-            deals = []
-    trades = {}
-    total_pl = 0.0
-    for d in deals:
-        ticket = int(getattr(d, 'position_id', getattr(d, 'ticket', 0)) or 0)
-        if ticket == 0:
-            continue
-        deal_time = datetime.fromtimestamp(getattr(d, 'time', 0), tz=timezone.utc)
-        if deal_time.date() != datetime.utcnow().date():
-            continue
-        rec = trades.setdefault(ticket, {
-            'symbol': getattr(d, 'symbol', ''),
-            'side': 'UNKNOWN',
-            'lot': 0.0,
-            'start': 0.0,
-            'close': 0.0,
-            'profit': 0.0,
-            'time_utc': deal_time.strftime('%H:%M:%S'),
-            'exec': 'UNKNOWN',
-        })
-        entry = getattr(d, 'entry', None)
-        volume = float(getattr(d, 'volume', 0.0) or 0.0)
-        if entry == 0:
-            rec['side'] = 'BUY' if getattr(d, 'type', 0) == 0 else 'SELL'
-            rec['start'] = getattr(d, 'price', 0.0)
-            rec['lot'] = max(rec['lot'], volume)
-            # Tag exec_reason from entry comment (SR10/AUTO60/TPSM/TPSB) if present
-            cmt = (getattr(d, 'comment', '') or '').upper()
-            if 'SR10' in cmt:
-                rec['exec'] = 'SR10'
-            elif 'AUTO60' in cmt:
-                rec['exec'] = 'AUTO60'
-            elif 'TPSM' in cmt:
-                rec['exec'] = 'TPSM'
-            elif 'TPSB' in cmt:
-                rec['exec'] = 'TPSB'
-        elif entry == 1:
-            trade_side = 'BUY' if getattr(d, 'type', 0) == 1 else 'SELL'
-            if rec['side'] == 'UNKNOWN':
-                rec['side'] = trade_side
-            rec['close'] = getattr(d, 'price', 0.0)
-            rec['lot'] = max(rec['lot'], volume)
-            profit = float(getattr(d, 'profit', 0.0) or 0.0)
-            rec['profit'] += profit
-            rec['time_utc'] = deal_time.strftime('%H:%M:%S')
-            comment = (getattr(d, 'comment', '') or '').upper()
-            label = comment.split('CLOSE-ALL:')[-1] if 'CLOSE-ALL:' in comment else comment
-            label = (label or '').strip().upper()
-            if label.startswith('SESSION-P'):
-                rec['exec'] = 'SESSION-PROFIT'
-            elif label.startswith('SESSION-L'):
-                rec['exec'] = 'SESSION-LOSS'
-            elif label.startswith('SESSION-T'):
-                rec['exec'] = 'SESSION-TIMEOUT'
-            elif label.startswith('SESS'):
-                rec['exec'] = 'SESSION'
-            elif label.startswith('BREAKEV'):
-                rec['exec'] = 'BREAKEVEN'
-            elif label.startswith('TPSM'):
-                rec['exec'] = 'TPSM'
-            elif label.startswith('TPSB'):
-                rec['exec'] = 'TPSB'
-            elif label.startswith('CROSSR'):
-                rec['exec'] = 'CROSSR'
-            elif label and rec['exec'] == 'UNKNOWN':
-                rec['exec'] = label
-            elif not label and rec['exec'] == 'UNKNOWN':
-                rec['exec'] = 'MANUAL'
-            total_pl += profit
-            if rec['start'] == 0.0:
-                rec['start'] = rec['close']
+            pass
+    account, online = None, False
+    try:
+        account = mt5.account_info()
+    except Exception:
+        pass
+    try:
+        ti = mt5.terminal_info()
+        online = bool(ti) and bool(getattr(ti, "connected", False))
+    except Exception:
+        pass
+    return parts, account, online
+
+def market_snapshots(symbols):
+    """market_snapshot() for every engine symbol from one shared MT5 I/O job."""
+    if len(symbols) == 1:
+        return {symbols[0]: market_snapshot(symbols[0])}
+    base = {"ts": time.time(), "seq": ORDER_SEQ["n"], "account": None, "online": False}
+    parts = {sym: {"positions": [], "tick": None} for sym in symbols}
+    if mt5 is not None:
+        parts, base["account"], base["online"] = mt5_call(_snapshots_read, tuple(symbols))
+    return {sym: _snapshot_totals({"symbol": sym, **base, **parts[sym]}) for sym in symbols}
+
+@timed("mt5.snapshot")
+def market_snapshot(sym):
+    """Capture positions, tick, account and terminal info for `sym` in one MT5 I/O job.
+    Every engine stage reads from this dict instead of calling MT5 on its own.
+    """
+    snap = {"symbol": sym, "ts": time.time(), "seq": ORDER_SEQ["n"],
+            "positions": [], "tick": None, "account": None, "online": False}
+    if mt5 is not None:
+        snap.update(mt5_call(_snapshot_read, sym))
+    return _snapshot_totals(snap)
+
+def snapshot_refresh(snap):
+    """Re-capture the snapshot only if an order was sent after it was taken."""
+    if snap is None or snap["seq"] != ORDER_SEQ["n"]:
+        return market_snapshot(snap["symbol"] if snap else SETUP["symbol"])
+    return snap
+
+# ========== History helper ========== 
+
+# Ledger deal harian: hanya deal sejak cursor (waktu deal terakhir yang dilipat, minus
+# sedikit skew untuk deal yang telat tercatat) yang diambil dan dilipat ke record per
+# posisi, sehingga poll status tidak lagi memindai ulang seluruh deal hari ini.
+LEDGER_CURSOR_SKEW_SEC = 60   # Fetch mulai cursor_ts - skew; tiket yang sudah dilipat dilewati
+LEDGER_RESYNC_SEC = 300       # Rebuild penuh berkala sebagai koreksi
+
+def _ledger_new(day):
+    return {
+        "day": day,             # (tanggal lokal, tanggal UTC) yang sedang dicatat
+        "cursor_ts": 0,         # waktu deal terakhir yang dilipat (detik, domain deal.time)
+        "seen": {},             # tiket deal -> waktu, hanya yang masih di jendela skew
+        "trades": {},           # position_id -> record
+        "realized_pl": 0.0,
+        "history": [],          # list terurut siap kirim, dibangun ulang hanya jika ada deal baru
+        "synced_at": 0.0,
+    }
+
+DEAL_LEDGER = _ledger_new(None)
+
+def _ledger_fold(led, d):
+    """Fold one deal into its per-position record. Returns True if the ledger changed."""
+    trades = led["trades"]
+    ticket = int(getattr(d, 'position_id', getattr(d, 'ticket', 0)) or 0)
+    if ticket == 0:
+        return False
+    deal_time = datetime.fromtimestamp(getattr(d, 'time', 0), tz=timezone.utc)
+    if deal_time.date() != led["day"][1]:
+        return False
+    rec = trades.setdefault(ticket, {
+        'symbol': getattr(d, 'symbol', ''),
+        'side': 'UNKNOWN',
+        'lot': 0.0,
+        'start': 0.0,
+        'close': 0.0,
+        'profit': 0.0,
+        'time_utc': deal_time.strftime('%H:%M:%S'),
+        'exec': 'UNKNOWN',
+    })
+    entry = getattr(d, 'entry', None)
+    volume = float(getattr(d, 'volume', 0.0) or 0.0)
+    if entry == 0:
+        rec['side'] = 'BUY' if getattr(d, 'type', 0) == 0 else 'SELL'
+        rec['start'] = getattr(d, 'price', 0.0)
+        rec['lot'] = max(rec['lot'], volume)
+        # Tag exec_reason from entry comment (SR10/AUTO60/TPSM/TPSB) if present
+        cmt = (getattr(d, 'comment', '') or '').upper()
+        if 'SR10' in cmt:
+            rec['exec'] = 'SR10'
+        elif 'AUTO60' in cmt:
+            rec['exec'] = 'AUTO60'
+        elif 'TPSM' in cmt:
+            rec['exec'] = 'TPSM'
+        elif 'TPSB' in cmt:
+            rec['exec'] = 'TPSB'
+    elif entry == 1:
+        trade_side = 'BUY' if getattr(d, 'type', 0) == 1 else 'SELL'
+        if rec['side'] == 'UNKNOWN':
+            rec['side'] = trade_side
+        rec['close'] = getattr(d, 'price', 0.0)
+        rec['lot'] = max(rec['lot'], volume)
+        profit = float(getattr(d, 'profit', 0.0) or 0.0)
+        rec['profit'] += profit
+        rec['time_utc'] = deal_time.strftime('%H:%M:%S')
+        comment = (getattr(d, 'comment', '') or '').upper()
+        label = comment.split('CLOSE-ALL:')[-1] if 'CLOSE-ALL:' in comment else comment
+        label = (label or '').strip().upper()
+        if label.startswith('SESSION-P'):
+            rec['exec'] = 'SESSION-PROFIT'
+        elif label.startswith('SESSION-L'):
+            rec['exec'] = 'SESSION-LOSS'
+        elif label.startswith('SESSION-T'):
+            rec['exec'] = 'SESSION-TIMEOUT'
+        elif label.startswith('SESS'):
+            rec['exec'] = 'SESSION'
+        elif label.startswith('BREAKEV'):
+            rec['exec'] = 'BREAKEVEN'
+        elif label.startswith('TPSM'):
+            rec['exec'] = 'TPSM'
+        elif label.startswith('TPSB'):
+            rec['exec'] = 'TPSB'
+        elif label.startswith('CROSSR'):
+            rec['exec'] = 'CROSSR'
+        elif label and rec['exec'] == 'UNKNOWN':
+            rec['exec'] = label
+        elif not label and rec['exec'] == 'UNKNOWN':
+            rec['exec'] = 'MANUAL'
+        led["realized_pl"] += profit
+        if rec['start'] == 0.0:
+            rec['start'] = rec['close']
+    return True
+
+def _ledger_rebuild_history(led):
     history = []
-    for rec in trades.values():
+    for rec in led["trades"].values():
         if rec['profit'] == 0.0 and rec['close'] == 0.0:
             continue
         history.append({
@@ -471,7 +1372,59 @@ def get_history_today():
             'exec': rec['exec'] or 'UNKNOWN',
         })
     history.sort(key=lambda r: r['time_utc'], reverse=True)
-    return history[:300], total_pl
+    led["history"] = history[:300]
+
+@timed("mt5.history")
+def ledger_update():
+    """Fetch only deals from the ledger cursor on and fold them in.
+    Rolls over at the day boundary and does a full resync every LEDGER_RESYNC_SEC;
+    a resync builds a fresh ledger that replaces the published one only once its
+    fetch succeeded.
+    """
+    if mt5 is None:
+        return
+    now = datetime.now()
+    day = (now.date(), datetime.utcnow().date())
+    led = DEAL_LEDGER
+    full = led["day"] != day or time.time() - led["synced_at"] >= LEDGER_RESYNC_SEC
+    if full:
+        led = _ledger_new(day)
+    if led["cursor_ts"]:
+        date_from = led["cursor_ts"] - LEDGER_CURSOR_SKEW_SEC
+    else:
+        date_from = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    try:
+        deals = mt5_call(mt5.history_deals_get, date_from, now)
+    except Exception:
+        deals = None
+    if deals is None:
+        return # gagal fetch: ledger (dan histori yang dipublish) tetap, dicoba lagi siklus berikutnya
+    seen = led["seen"]
+    changed = full
+    for d in deals:
+        deal_ticket = int(getattr(d, 'ticket', 0) or 0)
+        if deal_ticket in seen:
+            continue
+        deal_ts = int(getattr(d, 'time', 0) or 0)
+        seen[deal_ticket] = deal_ts
+        if _ledger_fold(led, d):
+            changed = True
+            led["cursor_ts"] = max(led["cursor_ts"], deal_ts)
+    # Tiket di luar jendela skew tidak akan terambil lagi
+    horizon = led["cursor_ts"] - LEDGER_CURSOR_SKEW_SEC
+    for deal_ticket in [t for t, ts in seen.items() if ts < horizon]:
+        del seen[deal_ticket]
+    if changed:
+        _ledger_rebuild_history(led)
+    if full:
+        led["synced_at"] = time.time()
+        DEAL_LEDGER.update(led)
+
+def get_history_today():
+    if mt5 is None:
+        return [], 0.0
+    ledger_update()
+    return DEAL_LEDGER["history"], DEAL_LEDGER["realized_pl"]
 
 def price_in_trigger_zone(price, thresholds):
     """Checks if the price is in the upper or lower trigger zones."""
@@ -481,17 +1434,77 @@ def price_in_trigger_zone(price, thresholds):
     return price >= thresholds['top'] or price <= thresholds['bottom']
 
 # ========== SR-gate / Auto-entry ==========# ========== SR auto-trade ========== 
+# Rolling min(low)/max(high) lewat monotonic deque: bar tertutup masuk sekali (amortized
+# O(1)), bar berjalan digabung saat dibaca. Biaya tidak bergantung pada lookback.
+SR_TRACKERS = {}    # (sym, tf, lookback) -> {"closed_ts", "seq", "lows", "highs"}
+SR_THRESHOLDS = {}  # sym -> ((support, resistance, near_pct), thresholds)
+
+def _sr_push(t, low, high):
+    """Slide one closed bar into the tracker's window of lookback-1 closed bars."""
+    t["seq"] += 1
+    seq, lows, highs = t["seq"], t["lows"], t["highs"]
+    while lows and lows[-1][1] >= low:
+        lows.pop()
+    lows.append((seq, low))
+    while highs and highs[-1][1] <= high:
+        highs.pop()
+    highs.append((seq, high))
+    oldest = seq - (t["lookback"] - 1)
+    while lows and lows[0][0] <= oldest:
+        lows.popleft()
+    while highs and highs[0][0] <= oldest:
+        highs.popleft()
+
+def sr_extremes(sym, tf, lookback):
+    """(support, resistance, forming bar time) over the last `lookback` bars of
+    (sym, tf), forming bar included; None while fewer bars are available."""
+    key = (sym, tf, lookback)
+    # Setelah terisi cukup membaca ekor buffer; seed pertama butuh seluruh lookback.
+    # Candle dibaca di luar INDICATOR_LOCK, kunci hanya untuk state tracker.
+    count = min(lookback, CANDLE_BUF_CAPACITY) if key in SR_TRACKERS else lookback
+    for _ in range(2):
+        rates = candles_np(sym, tf, count)
+        if len(rates) == 0:
+            return None
+        times = rates['time']
+        with INDICATOR_LOCK:
+            t = SR_TRACKERS.get(key)
+            if t is not None:
+                i = int(np.searchsorted(times, t["closed_ts"]))
+                if i >= len(times) or int(times[i]) != t["closed_ts"]:
+                    t = None # celah (reseed buffer, bar terlewat): bangun ulang
+            if t is None:
+                if len(rates) < lookback:
+                    if count >= lookback:
+                        return None
+                    count = lookback # baca ulang seluruh lookback di luar kunci
+                    continue
+                for k in [k for k in SR_TRACKERS if k[:2] == (sym, tf)]:
+                    del SR_TRACKERS[k] # lookback lama tidak dipakai lagi
+                t = SR_TRACKERS[key] = {"lookback": lookback, "closed_ts": None, "seq": 0,
+                                        "lows": deque(), "highs": deque()}
+                i = -1
+            for low, high in zip(rates['low'][i + 1:-1].tolist(), rates['high'][i + 1:-1].tolist()):
+                _sr_push(t, low, high)
+            t["closed_ts"] = int(times[-2]) if len(times) > 1 else int(times[-1]) - 1
+            low, high = float(rates['low'][-1]), float(rates['high'][-1])
+            support = min(t["lows"][0][1], low) if t["lows"] else low
+            resistance = max(t["highs"][0][1], high) if t["highs"] else high
+            return support, resistance, int(times[-1])
+    return None
+
 def compute_sr_thresholds(sym):
     lookback = int(SETUP["sr"]["candle_lookback"])
-    # Ambil lebih banyak data untuk memastikan lookback terpenuhi
-    data = candles(sym, "M1", lookback + 15)
-    if len(data) < lookback:
+    ext = sr_extremes(sym, "M1", lookback)
+    if ext is None:
         return None, None
-    
-    last_candle_ts = data[-1]["time"]
-    window = data[-lookback:]
-    support = min(d["low"] for d in window)
-    resistance = max(d["high"] for d in window)
+    support, resistance, last_candle_ts = ext
+    # Threshold hanya dihitung ulang bila ekstrem atau near_pct berubah
+    cache_key = (support, resistance, float(SETUP["sr"]["near_pct"]))
+    cached = SR_THRESHOLDS.get(sym)
+    if cached and cached[0] == cache_key:
+        return cached[1], last_candle_ts
+
     rng = max(1e-6, resistance - support)
     mid = support + rng * 0.5
     
@@ -511,39 +1524,44 @@ def compute_sr_thresholds(sym):
         "buffer_buy": buffer_buy,
         "buffer_sell": buffer_sell,
     }
+    SR_THRESHOLDS[sym] = (cache_key, thresholds)
     return thresholds, last_candle_ts
 
-def sr_auto_trade(sym):
-    global SR_STATE
+def sr_auto_trade(sym, snap=None):
+    snap = snap or market_snapshot(sym)
 
     # Cek jumlah total posisi terbuka untuk simbol ini
-    open_pos = positions(sym) or []
-    if len(open_pos) >= 4:
+    if snap["open_count"] >= 4:
         return
 
     thresholds, current_candle_ts = compute_sr_thresholds(sym)
     if thresholds is None:
-        SR_STATE = {"support": 0.0, "resistance": 0.0, "mid": 0.0, "top": 0.0, "bottom": 0.0}
+        SR_STATE.update({"support": 0.0, "resistance": 0.0, "mid": 0.0, "top": 0.0, "bottom": 0.0})
         # reset arming so manual can still work safely
         for trig in SR_TRIGGER.values():
             trig["armed"] = True
             trig["pending"] = False
             trig["was_outside"] = False # Reset new state flag
         return
-    SR_STATE = {
+    SR_STATE.update({
         "support": thresholds["support"],
         "resistance": thresholds["resistance"],
         "mid": thresholds["mid"],
         "top": thresholds["top"],
         "bottom": thresholds["bottom"],
-    }
+    })
     # Only proceed with trading if auto mode is ON
     if not SETUP.get("auto_mode"):
         return
-    t = tick(sym)
+    t = snap["tick"]
     # Find coordinates from setup for auto-click
     sr_buy_setup = next((item for item in SETUP.get("click_xy", []) if item.get("func") == "auto_sr_buy"), None)
     sr_sell_setup = next((item for item in SETUP.get("click_xy", []) if item.get("func") == "auto_sr_sell"), None)
+    clicks = _symbol_uses_clicks(sym)
+    if not clicks:
+        # Simbol tambahan dibuka lewat order API, koordinat klik tidak diperlukan
+        sr_buy_setup = sr_buy_setup or {"x": 0, "y": 0}
+        sr_sell_setup = sr_sell_setup or {"x": 0, "y": 0}
 
     price = None
     if t:
@@ -557,7 +1575,7 @@ def sr_auto_trade(sym):
     for side in ("buy", "sell"):
         trig = SR_TRIGGER[side]
         # Hapus status 'pending' jika posisi berhasil terbuka
-        if trig.get("pending") and open_count(sym) > 0:
+        if trig.get("pending") and snap["open_count"] > 0:
             trig["pending"] = False
             print(f"[Auto SR {side.upper()}] Status 'pending' dihapus (posisi terdeteksi).", flush=True)
 
@@ -593,21 +1611,21 @@ def sr_auto_trade(sym):
     # --- BUY TRIGGER (Bounce Up from Support) ---
     # Condition: was outside (below) and now is inside (not below)
     if buy_trig.get("was_outside") and not is_below_bottom:
-        if (sr_buy_setup and SETUP.get("sr_buy_enabled") and buy_trig["armed"] and 
+        if (sr_buy_setup and symbol_modes(sym).get("sr_buy_enabled") and buy_trig["armed"] and 
             (not buy_trig.get("pending")) and (now - buy_trig["last_ts"]) >= SR_MIN_GAP):
 
             if STATE.get("arah_posisi_terkunci") and STATE.get("arah_posisi_terkunci") != "BUY":
                 buy_trig["last_ts"] = now # Update timestamp to prevent rapid checks
             else:
                 x, y = sr_buy_setup.get("x"), sr_buy_setup.get("y")
-                if x and y and x > 0 and y > 0:
+                if (x and y and x > 0 and y > 0) or not clicks:
                     if STATE.get("arah_posisi_terkunci") is None:
                         STATE["arah_posisi_terkunci"] = "BUY"
                         print(f"[ARAH_POSISI] Posisi pertama. Arah trading dikunci ke 'BUY'.", flush=True)
 
                     reason = "Auto SR BUY"
                     print(f"[{reason}] Terpicu (Bounce). Menyiapkan untuk membuka posisi. Harga {price:.2f} > Bottom {thresholds['bottom']:.2f}", flush=True)
-                    initial_pos_count = _get_open_count(sym)
+                    initial_pos_count = snap["open_count"]
                     STATE["pending_open"] = {"side": "BUY", "ts": 0, "retries": 0, "x": x, "y": y, "reason": reason, "initial_pos_count": initial_pos_count}
                     buy_trig.update({ "armed": False, "pending": True, "last_ts": now, "last_trigger_candle_ts": current_candle_ts })
                 else:
@@ -619,21 +1637,21 @@ def sr_auto_trade(sym):
     # --- SELL TRIGGER (Bounce Down from Resistance) ---
     # Condition: was outside (above) and now is inside (not above)
     elif sell_trig.get("was_outside") and not is_above_top:
-        if (sr_sell_setup and SETUP.get("sr_sell_enabled") and sell_trig["armed"] and 
+        if (sr_sell_setup and symbol_modes(sym).get("sr_sell_enabled") and sell_trig["armed"] and 
             (not sell_trig.get("pending")) and (now - sell_trig["last_ts"]) >= SR_MIN_GAP):
             
             if STATE.get("arah_posisi_terkunci") and STATE.get("arah_posisi_terkunci") != "SELL":
                 sell_trig["last_ts"] = now # Update timestamp to prevent rapid checks
             else:
                 x, y = sr_sell_setup.get("x"), sr_sell_setup.get("y")
-                if x and y and x > 0 and y > 0:
+                if (x and y and x > 0 and y > 0) or not clicks:
                     if STATE.get("arah_posisi_terkunci") is None:
                         STATE["arah_posisi_terkunci"] = "SELL"
                         print(f"[ARAH_POSISI] Posisi pertama. Arah trading dikunci ke 'SELL'.", flush=True)
                     
                     reason = "Auto SR SELL"
                     print(f"[{reason}] Terpicu (Bounce). Menyiapkan untuk membuka posisi. Harga {price:.2f} < Top {thresholds['top']:.2f}", flush=True)
-                    initial_pos_count = _get_open_count(sym)
+                    initial_pos_count = snap["open_count"]
                     STATE["pending_open"] = {"side": "SELL", "ts": 0, "retries": 0, "x": x, "y": y, "reason": reason, "initial_pos_count": initial_pos_count}
                     sell_trig.update({ "armed": False, "pending": True, "last_ts": now, "last_trigger_candle_ts": current_candle_ts })
                 else:
@@ -678,8 +1696,7 @@ def order_send_with_fallback(sym, side, lot, reason=None):
             "comment": comment,
             "type_filling": fm,
         }
-        with MTX:
-            res = mt5.order_send(req)
+        res = _order_send(req)
         if res and res.retcode in (mt5.TRADE_RETCODE_DONE, mt5.TRADE_RETCODE_PLACED):
             return (True, f"OK:{res.retcode}")
         last_msg = getattr(res, 'comment', None) or last_msg
@@ -715,8 +1732,7 @@ def close_all(sym, reason="manual"):
                 "price": price, "deviation": 200, "magic": magic_val, "comment": f"close-all:{reason}",
                 "type_filling": fm,
             }
-            with MTX:
-                res = mt5.order_send(req)
+            res = _order_send(req)
             ok = bool(res and res.retcode in (mt5.TRADE_RETCODE_DONE, mt5.TRADE_RETCODE_PLACED))
             if ok:
                 break
@@ -734,6 +1750,9 @@ def close_all(sym, reason="manual"):
 # ========== Auto-Click Helpers (ctypes) ========== 
 def _win_leftclick(x: int, y: int):
     """Send a left-click event to screen coordinates using ctypes."""
+    if ACCOUNT_WORKER["login"] is not None:
+        print(f"[_win_leftclick] ({x},{y}) diabaikan: worker akun {ACCOUNT_WORKER['login']} hanya memakai order API", flush=True)
+        return
     try:
         # Constants for mouse_event
         MOUSEEVENTF_LEFTDOWN = 0x0002
@@ -749,11 +1768,32 @@ def _win_leftclick(x: int, y: int):
         ctypes.windll.user32.mouse_event(MOUSEEVENTF_LEFTDOWN, 0, 0, 0, 0)
         time.sleep(0.05) # short delay between down and up
         ctypes.windll.user32.mouse_event(MOUSEEVENTF_LEFTUP, 0, 0, 0, 0)
+        ORDER_SEQ["n"] += 1 # Klik = order lewat terminal, snapshot perlu di-refresh
     except Exception as e:
         print(f"[_win_leftclick] EXC: {e}", flush=True)
 
-def _click_by_func(func_name: str, reason: str):
-    """Finds a setup by function name and performs a click."""
+def _api_action_by_func(sym, func_name, reason):
+    """API equivalent of a click button, for engine symbols whose chart is not the active one."""
+    if func_name in ("auto_53_buy", "auto_sr_buy"):
+        ok, msg = order_send_with_fallback(sym, "BUY", SETUP.get("engine_lot", 0.01), reason=reason)
+    elif func_name in ("auto_53_sell", "auto_sr_sell"):
+        ok, msg = order_send_with_fallback(sym, "SELL", SETUP.get("engine_lot", 0.01), reason=reason)
+    elif func_name in ("auto_close_all", "auto_bep"):
+        n, fails = close_all(sym, reason)
+        ok, msg = (n > 0 and not fails), f"closed {n}, failed {len(fails)}"
+    else:
+        ok, msg = False, f"no-api-action:{func_name}"
+    print(f"[{reason}] {sym} via API: {msg}", flush=True)
+    if ok:
+        STATE["last_system_message"] = {"text": f"Aksi otomatis {sym}: {reason}", "type": "info"}
+    else:
+        STATE["last_system_message"] = {"text": f"Aksi {reason} ({sym}) gagal: {msg}", "type": "warn"}
+    return ok
+
+def _click_by_func(func_name: str, reason: str, sym=None):
+    """Finds a setup by function name and performs a click (API action for non-active engine symbols)."""
+    if not _symbol_uses_clicks(SETUP["symbol"] if sym is None else sym):
+        return _api_action_by_func(sym or SETUP["symbol"], func_name, reason)
     setup = next((item for item in SETUP.get("click_xy", []) if item.get("func") == func_name), None)
     if setup and setup.get("x") > 0 and setup.get("y") > 0:
         x, y = setup["x"], setup["y"]
@@ -834,15 +1874,17 @@ def set_cooldown(sec):
     STATE["cooldown_until"] = time.time() + sec
 
 def cooldown_tick():
-    """Updates the cooldown timer state. Called by its own dedicated worker."""
-    if STATE["cooldown"]:
-        rem = max(0, STATE["cooldown_until"] - time.time())
-        m,s = int(rem)//60, int(rem)%60
-        STATE["timer"] = f"{m:02d}:{s:02d}"
-        if rem<=0:
-            STATE["cooldown"] = False; STATE["cooldown_until"] = 0
-    else:
-        STATE["timer"] = "00:00"
+    """Updates the cooldown timer state of every engine symbol. Called by its own dedicated worker."""
+    for sym in list(SYM_STATE):
+        with symbol_context(sym):
+            if STATE["cooldown"]:
+                rem = max(0, STATE["cooldown_until"] - time.time())
+                m,s = int(rem)//60, int(rem)%60
+                STATE["timer"] = f"{m:02d}:{s:02d}"
+                if rem<=0:
+                    STATE["cooldown"] = False; STATE["cooldown_until"] = 0
+            else:
+                STATE["timer"] = "00:00"
 
 def cooldown_worker():
     """A separate, lightweight thread to manage cooldown timer state. 
@@ -852,8 +1894,9 @@ def cooldown_worker():
         cooldown_tick()
         time.sleep(0.25) # Check 4 times a second, doesn't need to be faster.
 
-def begin_session_if_needed(sym):
-    if not STATE["session_active"] and open_count(sym)>0:
+def begin_session_if_needed(sym, snap=None):
+    count = snap["open_count"] if snap else open_count(sym)
+    if not STATE["session_active"] and count>0:
         STATE["session_active"] = True
         STATE["session_start_ts"] = time.time()
         STATE["session_be_hit"] = False
@@ -875,22 +1918,23 @@ def end_session_no_cooldown():
     STATE["session_peak_pl"] = 0.0
     STATE["session_close_triggered"] = False
 
-def try_break_event(sym):
+def try_break_event(sym, snap=None):
     if not SETUP["abe_auto"]: return
     # Check if we already hit BE in this session to prevent re-triggering
     if STATE.get("session_be_hit"): return
-    if open_count(sym) < SETUP["session"]["min_positions_for_be"]: return
-    pl = float_pl(sym)
+    snap = snap or market_snapshot(sym)
+    if snap["open_count"] < SETUP["session"]["min_positions_for_be"]: return
+    pl = snap["float_pl"]
     if pl >= SETUP["session"]["be_min_profit"]:
         # Use clicker instead of API
-        if _click_by_func("auto_bep", "Auto BEP"):
+        if _click_by_func("auto_bep", "Auto BEP", sym):
             STATE["session_be_hit"] = True
             end_session(); set_cooldown(10)
 
-def session_tick(sym):
+def session_tick(sym, snap=None):
     if not STATE["session_active"] or STATE.get("session_close_triggered"): return
     elapsed = time.time() - STATE["session_start_ts"]
-    pl = float_pl(sym)
+    pl = (snap or market_snapshot(sym))["float_pl"]
     if pl > STATE["session_peak_pl"]: STATE["session_peak_pl"] = pl
 
     reason = None
@@ -904,10 +1948,10 @@ def session_tick(sym):
     if reason:
         STATE["session_close_triggered"] = True # Tandai bahwa penutupan sesi telah dipicu
         # Use clicker instead of API
-        if _click_by_func("auto_close_all", reason):
+        if _click_by_func("auto_close_all", reason, sym):
             end_session()
 
-def retry_and_verify_close_tick(sym):
+def retry_and_verify_close_tick(sym, snap=None):
     """
     Verify if positions queued for closing were successful.
     If not, retry clicking up to MAX_RETRIES.
@@ -915,7 +1959,8 @@ def retry_and_verify_close_tick(sym):
     if not STATE["pending_close"]:
         return
 
-    open_pos_tickets = {p.ticket for p in positions(sym)}
+    snap = snap or market_snapshot(sym)
+    open_pos_tickets = {p.ticket for p in snap["positions"]}
     now = time.time()
     
     # Iterate over a copy as we might modify the dict
@@ -937,8 +1982,11 @@ def retry_and_verify_close_tick(sym):
         # We check for retries > 0 because the first attempt (retries=0) should happen immediately
         if details["retries"] == 0 or time_since_last_try >= RETRY_DELAY_SEC:
             if details["retries"] < MAX_RETRIES:
-                # Perform click
-                _win_leftclick(details["x"], details["y"])
+                # Perform click (simbol aktif) atau close via API (simbol tambahan)
+                if _symbol_uses_clicks(sym):
+                    _win_leftclick(details["x"], details["y"])
+                else:
+                    close_single_position(ticket, details.get("reason", ""))
                 
                 # Update state
                 details["retries"] += 1
@@ -960,7 +2008,7 @@ def retry_and_verify_close_tick(sym):
                 del STATE["pending_close"][ticket]
                 STATE["failed_close"].add(ticket)
 
-def retry_and_verify_open_tick(sym):
+def retry_and_verify_open_tick(sym, snap=None):
     """
     Verify if a position was opened after an auto-click trigger.
     If not, retry clicking up to MAX_RETRIES.
@@ -973,11 +2021,12 @@ def retry_and_verify_open_tick(sym):
     now = time.time()
 
     # SUCCESS: A new position has been opened
-    if _get_open_count(sym) > details.get("initial_pos_count", -1):
+    snap = snap or market_snapshot(sym)
+    if snap["open_count"] > details.get("initial_pos_count", -1):
         print(f"[{details['reason']}] Open confirmed.", flush=True)
         STATE["last_system_message"] = {"text": f"Posisi {details['side']} berhasil dibuka via {details['reason']}.", "type": "ok"}
         STATE["pending_open"] = None
-        begin_session_if_needed(sym) # Start session after successful open
+        begin_session_if_needed(sym, snap) # Start session after successful open
         return
 
     # FAILURE/RETRY LOGIC
@@ -986,8 +2035,11 @@ def retry_and_verify_open_tick(sym):
     # First attempt is immediate (ts=0), subsequent retries have a delay
     if details["retries"] == 0 or time_since_last_try >= RETRY_DELAY_SEC:
         if details["retries"] < MAX_RETRIES:
-            # Perform click
-            _win_leftclick(details["x"], details["y"])
+            # Perform click (simbol aktif) atau order via API (simbol tambahan)
+            if _symbol_uses_clicks(sym):
+                _win_leftclick(details["x"], details["y"])
+            else:
+                order_send_with_fallback(sym, details["side"], SETUP.get("engine_lot", 0.01), reason=details["reason"])
             
             # Update state
             details["retries"] += 1
@@ -1013,21 +2065,48 @@ def retry_and_verify_open_tick(sym):
                 # Saat gagal, jangan re-arm, biarkan logika re-arm standar yang berjalan
             set_cooldown(10) # Cooldown to prevent immediate re-triggering
 
-def auto_tpsb_tick(sym):
-    """Monitor open positions and queue for closing if P/L percentage target is met."""
-    if not SETUP.get("auto_tpsb_enabled"):
+# Rule engine TP: TPSB dan TPSM dievaluasi dalam satu pass. Baris click_xy diindeks per
+# func hanya saat list-nya diganti (semua update menulis SETUP["click_xy"] baru), pl_pct
+# semua posisi dihitung sekaligus sebagai array; loop Python hanya untuk posisi yang kena.
+TP_MODES = {  # urutan = prioritas (dulu stage auto_tpsb_tick jalan sebelum auto_tpsm_tick)
+    "auto_tpsb": {"flag": "auto_tpsb_enabled", "tag": "AUTO_TPSB", "label": "Auto TPSB"},
+    "auto_tpsm": {"flag": "tpsm_auto", "tag": "AUTO_TPSM", "label": "Auto TPSM"},
+}
+TP_RULES = {"src": None, "rules": {}}
+
+def _tp_rules():
+    """click_xy targets per TP func as arrays, rebuilt only when SETUP["click_xy"] is replaced."""
+    src = SETUP.get("click_xy", [])
+    if TP_RULES["src"] is not src:
+        rules = {}
+        for func in TP_MODES:
+            rows = [s for s in src if s.get("func") == func]
+            rules[func] = {
+                "neg": np.array([float(s.get("target_neg_pct", 0.0)) for s in rows], dtype=float),
+                "pos": np.array([float(s.get("target_pos_pct", 0.0)) for s in rows], dtype=float),
+                "xy": [(int(s.get("x", 0)), int(s.get("y", 0))) for s in rows],
+            }
+        TP_RULES["src"], TP_RULES["rules"] = src, rules
+    return TP_RULES["rules"]
+
+def tp_rule_tick(sym, snap=None, funcs=None):
+    """Queue closes for positions whose price move hits their TPSB/TPSM row target.
+    Positions are ranked by profit (worst first) and matched to the func's click_xy
+    rows in order; `funcs` limits the pass to some of TP_MODES (default: all)."""
+    flags = symbol_modes(sym)
+    modes = [f for f in (funcs or TP_MODES) if flags.get(TP_MODES[f]["flag"])]
+    if not modes:
         return
 
-    current_tick = tick(sym)
+    snap = snap or market_snapshot(sym)
+    current_tick = snap["tick"]
     if not current_tick:
         return
     current_price = current_tick.last if current_tick.last > 0 else (current_tick.bid + current_tick.ask) / 2.0
     if current_price <= 0:
         return
 
-    open_pos = positions(sym)
-    open_pos.sort(key=lambda p: (p.profit or 0.0))
-
+    open_pos = snap["positions"]
     if not open_pos:
         TRIGGERED_TICKETS.clear()
         STATE["pending_close"].clear()
@@ -1038,111 +2117,54 @@ def auto_tpsb_tick(sym):
     TRIGGERED_TICKETS.intersection_update(current_tickets)
     STATE["failed_close"].intersection_update(current_tickets)
 
-    tpsb_setups = [s for s in SETUP.get("click_xy", []) if s.get("func") == "auto_tpsb"]
-
-    for i, pos in enumerate(open_pos):
-        if i >= len(tpsb_setups):
-            break
-        
-        if pos.ticket in TRIGGERED_TICKETS or pos.ticket in STATE["pending_close"] or pos.ticket in STATE["failed_close"]:
+    n = len(open_pos)
+    # Urutan profit stabil, sama dengan sorted() sebelumnya; list snapshot tidak diubah
+    order = np.argsort(np.fromiter(((p.profit or 0.0) for p in open_pos), dtype=float, count=n), kind="stable")
+    entry = np.fromiter((float(getattr(p, 'price_open', 0.0)) for p in open_pos), dtype=float, count=n)[order]
+    pos_type = np.fromiter((getattr(p, 'type', -1) for p in open_pos), dtype=np.int64, count=n)[order]
+    sign = np.where(pos_type == 0, 1.0, np.where(pos_type == 1, -1.0, 0.0))
+    valid = (entry != 0) & (sign != 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pl_pct = np.round(sign * (current_price - entry) / entry * 100.0, 3)
+
+    rules = _tp_rules()
+    uses_clicks = _symbol_uses_clicks(sym)
+    for func in modes:
+        rule, mode = rules[func], TP_MODES[func]
+        k = min(n, len(rule["xy"]))
+        if k == 0:
             continue
-
-        setup = tpsb_setups[i]
-        entry_price = float(getattr(pos, 'price_open', 0.0))
-        pos_type = getattr(pos, 'type', -1)
-
-        if entry_price == 0 or pos_type == -1: continue
-
-        pl_pct = 0.0
-        if pos_type == 0: pl_pct = ((current_price - entry_price) / entry_price) * 100.0
-        elif pos_type == 1: pl_pct = ((entry_price - current_price) / entry_price) * 100.0
-        pl_pct = round(pl_pct, 3)
-
-        neg_target_pct = float(setup.get("target_neg_pct", 0.0))
-        pos_target_pct = float(setup.get("target_pos_pct", 0.0))
-
-        should_trigger = (pos_target_pct > 0 and pl_pct >= pos_target_pct) or \
-                         (neg_target_pct < 0 and pl_pct <= neg_target_pct)
-
-        if should_trigger:
-            x, y = int(setup.get("x", 0)), int(setup.get("y", 0))
-            if x > 0 and y > 0:
-                print(f"[AUTO_TPSB] Queued for close ticket {pos.ticket} at ({x},{y}). Price Move: {pl_pct:.4f}%", flush=True)
-                STATE["pending_close"][pos.ticket] = {
+        pl, neg, pos = pl_pct[:k], rule["neg"][:k], rule["pos"][:k]
+        hit = valid[:k] & (((pos > 0) & (pl >= pos)) | ((neg < 0) & (pl <= neg)))
+        for i in np.flatnonzero(hit).tolist():
+            ticket = open_pos[order[i]].ticket
+            if ticket in TRIGGERED_TICKETS or ticket in STATE["pending_close"] or ticket in STATE["failed_close"]:
+                continue
+            x, y = rule["xy"][i]
+            if (x > 0 and y > 0) or not uses_clicks:
+                print(f"[{mode['tag']}] Queued for close ticket {ticket} at ({x},{y}). Price Move: {pl[i]:.4f}%", flush=True)
+                STATE["pending_close"][ticket] = {
                     "ts": time.time(), "retries": 0, "x": x, "y": y,
-                    "reason": f"Auto TPSB baris #{i+1}"
+                    "reason": f"{mode['label']} baris #{i+1}"
                 }
             else:
-                msg = f"Auto TPSB baris #{i+1} target tercapai, tapi koordinat tidak valid (X:{x}, Y:{y})."
-                print(f"[AUTO_TPSB] {msg}", flush=True)
+                msg = f"{mode['label']} baris #{i+1} target tercapai, tapi koordinat tidak valid (X:{x}, Y:{y})."
+                print(f"[{mode['tag']}] {msg}", flush=True)
                 STATE["last_system_message"] = {"text": msg, "type": "warn"}
 
-def auto_tpsm_tick(sym):
-    """Monitor open positions and queue for closing if P/L percentage target is met for TPSM."""
-    if not SETUP.get("tpsm_auto"):
-        return
-
-    current_tick = tick(sym)
-    if not current_tick: return
-    current_price = current_tick.last if current_tick.last > 0 else (current_tick.bid + current_tick.ask) / 2.0
-    if current_price <= 0: return
+def auto_tpsb_tick(sym, snap=None):
+    """TPSB-only pass of tp_rule_tick."""
+    tp_rule_tick(sym, snap, ("auto_tpsb",))
 
-    open_pos = positions(sym)
-    open_pos.sort(key=lambda p: (p.profit or 0.0))
-
-    if not open_pos:
-        TRIGGERED_TICKETS.clear()
-        STATE["pending_close"].clear()
-        STATE["failed_close"].clear()
-        return
-
-    current_tickets = {p.ticket for p in open_pos}
-    TRIGGERED_TICKETS.intersection_update(current_tickets)
-    STATE["failed_close"].intersection_update(current_tickets)
-
-    tpsm_setups = [s for s in SETUP.get("click_xy", []) if s.get("func") == "auto_tpsm"]
-
-    for i, pos in enumerate(open_pos):
-        if i >= len(tpsm_setups): break
-        
-        if pos.ticket in TRIGGERED_TICKETS or pos.ticket in STATE["pending_close"] or pos.ticket in STATE["failed_close"]:
-            continue
-
-        setup = tpsm_setups[i]
-        entry_price = float(getattr(pos, 'price_open', 0.0))
-        pos_type = getattr(pos, 'type', -1)
-
-        if entry_price == 0 or pos_type == -1: continue
-
-        pl_pct = 0.0
-        if pos_type == 0: pl_pct = ((current_price - entry_price) / entry_price) * 100.0
-        elif pos_type == 1: pl_pct = ((entry_price - current_price) / entry_price) * 100.0
-        pl_pct = round(pl_pct, 3)
-
-        neg_target_pct = float(setup.get("target_neg_pct", 0.0))
-        pos_target_pct = float(setup.get("target_pos_pct", 0.0))
-
-        should_trigger = (pos_target_pct > 0 and pl_pct >= pos_target_pct) or \
-                         (neg_target_pct < 0 and pl_pct <= neg_target_pct)
-
-        if should_trigger:
-            x, y = int(setup.get("x", 0)), int(setup.get("y", 0))
-            if x > 0 and y > 0:
-                print(f"[AUTO_TPSM] Queued for close ticket {pos.ticket} at ({x},{y}). Price Move: {pl_pct:.4f}%", flush=True)
-                STATE["pending_close"].update({pos.ticket: {
-                    "ts": time.time(), "retries": 0, "x": x, "y": y,
-                    "reason": f"Auto TPSM baris #{i+1}"
-                }})
-            else:
-                msg = f"Auto TPSM baris #{i+1} target tercapai, tapi koordinat tidak valid (X:{x}, Y:{y})."
-                print(f"[AUTO_TPSM] {msg}", flush=True)
-                STATE["last_system_message"] = {"text": msg, "type": "warn"}
+def auto_tpsm_tick(sym, snap=None):
+    """TPSM-only pass of tp_rule_tick."""
+    tp_rule_tick(sym, snap, ("auto_tpsm",))
 
 def close_single_position(ticket, reason=""):
     if mt5 is None:
         return False, "mt5-unavailable"
     
-    pos_info = mt5.positions_get(ticket=ticket)
+    pos_info = mt5_call(mt5.positions_get, ticket=ticket, prio=PRIO_TRADE)
     if not pos_info or len(pos_info) == 0:
         return False, f"position-not-found:{ticket}"
     
@@ -1175,8 +2197,7 @@ def close_single_position(ticket, reason=""):
             "comment": reason,
             "type_filling": fm,
         }
-        with MTX:
-            res = mt5.order_send(req)
+        res = _order_send(req)
         
         if res and res.retcode in (mt5.TRADE_RETCODE_DONE, mt5.TRADE_RETCODE_PLACED):
             ok = True
@@ -1190,19 +2211,19 @@ def close_single_position(ticket, reason=""):
         msg = getattr(last_res, 'comment', 'send-failed') if last_res else 'send-failed'
         return False, msg
 
-def trailing_stop_tick(sym):
+def trailing_stop_tick(sym, snap=None):
     """
     Monitors open positions and closes them if their P/L drops by a
     specified amount in the account's currency from their peak P/L.
     """
-    if not SETUP.get("trailing_stop_enabled"):
+    if not symbol_modes(sym).get("trailing_stop_enabled"):
         return
 
     trailing_value = float(SETUP.get("trailing_stop_value", 0))
     if trailing_value <= 0:
         return
 
-    open_pos = positions(sym)
+    open_pos = (snap or market_snapshot(sym))["positions"]
     
     # Cleanup peak tracker for closed positions
     current_tickets = {p.ticket for p in open_pos}
@@ -1242,39 +2263,45 @@ def trailing_stop_tick(sym):
                 if ticket in STATE['pl_trailing_peaks']:
                     del STATE['pl_trailing_peaks'][ticket]
 
-def manage_tpsm_tpsb_mode(sym):
+def manage_tpsm_tpsb_mode(sym, snap=None):
     """Secara dinamis mengelola mode Auto TPSM/TPSB berdasarkan jumlah posisi live."""
-    open_positions = _get_open_count(sym)
+    open_positions = snap["open_count"] if snap else _get_open_count(sym)
+    modes = symbol_modes(sym)
     
     # Kondisi untuk mengaktifkan Auto TPSB: 3 atau lebih posisi terbuka
-    if open_positions >= 3 and not SETUP.get("auto_tpsb_enabled"):
-        print(f"[MODE_SWITCH] {open_positions} posisi terbuka. Mengaktifkan Auto TPSB.", flush=True)
-        SETUP["auto_tpsb_enabled"] = True
-        SETUP["tpsm_auto"] = False
-        persist_save()
+    if open_positions >= 3 and not modes.get("auto_tpsb_enabled"):
+        print(f"[MODE_SWITCH] {sym}: {open_positions} posisi terbuka. Mengaktifkan Auto TPSB.", flush=True)
+        modes["auto_tpsb_enabled"] = True
+        modes["tpsm_auto"] = False
+        if modes is SETUP:
+            persist_save()
         
     # Kondisi untuk kembali ke Auto TPSM: kurang dari 3 posisi terbuka
-    elif open_positions < 3 and not SETUP.get("tpsm_auto"):
-        print(f"[MODE_SWITCH] {open_positions} posisi terbuka. Mengembalikan ke Auto TPSM.", flush=True)
-        SETUP["tpsm_auto"] = True
-        SETUP["auto_tpsb_enabled"] = False
-        persist_save()
+    elif open_positions < 3 and not modes.get("tpsm_auto"):
+        print(f"[MODE_SWITCH] {sym}: {open_positions} posisi terbuka. Mengembalikan ke Auto TPSM.", flush=True)
+        modes["tpsm_auto"] = True
+        modes["auto_tpsb_enabled"] = False
+        if modes is SETUP:
+            persist_save()
 
-def auto_manage_trailing_stop(sym):
+def auto_manage_trailing_stop(sym, snap=None):
     """Secara otomatis mengaktifkan/menonaktifkan trailing stop berdasarkan jumlah posisi."""
-    open_positions = _get_open_count(sym)
+    open_positions = snap["open_count"] if snap else _get_open_count(sym)
     should_be_enabled = (open_positions >= 2)
-    is_enabled = SETUP.get("trailing_stop_enabled", False)
+    modes = symbol_modes(sym)
+    is_enabled = modes.get("trailing_stop_enabled", False)
 
     if should_be_enabled != is_enabled:
-        SETUP["trailing_stop_enabled"] = should_be_enabled
+        modes["trailing_stop_enabled"] = should_be_enabled
         status_text = "ON" if should_be_enabled else "OFF"
-        print(f"[AUTO_TS] {open_positions} posisi terbuka. Trailing Stop otomatis diatur ke {status_text}.", flush=True)
-        persist_save()
+        print(f"[AUTO_TS] {sym}: {open_positions} posisi terbuka. Trailing Stop otomatis diatur ke {status_text}.", flush=True)
+        if modes is SETUP:
+            persist_save()
 
-def check_and_reset_trade_direction_lock(sym):
+def check_and_reset_trade_direction_lock(sym, snap=None):
     """Reset lock dan state pemicu S/R jika tidak ada posisi terbuka."""
-    if _get_open_count(sym) == 0:
+    open_positions = snap["open_count"] if snap else _get_open_count(sym)
+    if open_positions == 0:
         if STATE.get("arah_posisi_terkunci") is not None:
             print("[CYCLE_RESET] Semua posisi ditutup. Mereset siklus trading.", flush=True)
             STATE["arah_posisi_terkunci"] = None
@@ -1298,51 +2325,22 @@ def auto_cross_trade(sym):
     if STATE.get("cooldown") or STATE.get("pending_open"):
         return
 
-    # 2. Fetch candle data
-    # We need at least 21 data points for a 20-period SMA, plus one previous point for comparison.
-    # Fetching 50 to be safe and allow for stable EMA calculation.
-    m1_candles = candles(sym, "M1", 50)
-    if len(m1_candles) < 21:
-        return # Not enough data
-
-    # 3. Helper functions for MAs
-    def _sma(data, period):
-        if len(data) < period:
-            return None
-        return sum(c['close'] for c in data[-period:]) / period
-
-    def _ema(data, period):
-        if len(data) < period:
-            return None
-        prices = [c['close'] for c in data]
-        multiplier = 2 / (period + 1)
-        # Start with SMA for the first EMA value
-        ema = sum(prices[:period]) / period
-        # Apply EMA formula for the rest of the data
-        for price in prices[period:]:
-            ema = (price - ema) * multiplier + ema
-        return ema
-
-    # 4. Calculate MAs for the last two candles
-    # Previous candle's MAs
-    ema9_prev = _ema(m1_candles[:-1], 9)
-    sma20_prev = _sma(m1_candles[:-1], 20)
-
-    # Current candle's MAs
-    ema9_curr = _ema(m1_candles, 9)
-    sma20_curr = _sma(m1_candles, 20)
+    # 2-3. MAs for the previous (last closed) and current (forming) candle,
+    # maintained incrementally per symbol/timeframe (see indicator())
+    ema9_prev, ema9_curr = indicator(sym, "M1", "ema", 9)
+    sma20_prev, sma20_curr = indicator(sym, "M1", "sma", 20)
 
     if not all([ema9_prev, sma20_prev, ema9_curr, sma20_curr]):
         return # Could not calculate all MAs
 
-    # 5. Crossover detection logic
+    # 4. Crossover detection logic
     last_cross = STATE.get("last_cross_direction")
 
     # Golden Cross (Buy signal)
     if SETUP.get("cross_buy_enabled") and ema9_prev < sma20_prev and ema9_curr > sma20_curr:
         if last_cross != "UP":
             print("[Auto Cross] Golden Cross terdeteksi (EMA9 > SMA20).", flush=True)
-            if _click_by_func("auto_53_buy", "Auto Cross Buy"):
+            if _click_by_func("auto_53_buy", "Auto Cross Buy", sym):
                 STATE["last_cross_direction"] = "UP"
                 set_cooldown(10) # Add a small cooldown to prevent immediate re-triggering
     
@@ -1350,12 +2348,12 @@ def auto_cross_trade(sym):
     elif SETUP.get("cross_sell_enabled") and ema9_prev > sma20_prev and ema9_curr < sma20_curr:
         if last_cross != "DOWN":
             print("[Auto Cross] Death Cross terdeteksi (EMA9 < SMA20).", flush=True)
-            if _click_by_func("auto_53_sell", "Auto Cross Sell"):
+            if _click_by_func("auto_53_sell", "Auto Cross Sell", sym):
                 STATE["last_cross_direction"] = "DOWN"
                 set_cooldown(10) # Add a small cooldown to prevent immediate re-triggering
 
 # ========== M5 Candle Auto-Toggle Logic ==========
-def enforce_m5_direction_lock():
+def enforce_m5_direction_lock(sym=None):
     """
     Enforces the SR Buy/Sell state based on the M5 candle lock.
     This function will override any manual toggles if a lock is active.
@@ -1366,31 +2364,34 @@ def enforce_m5_direction_lock():
 
     should_be_buy = (locked_direction == "BUY")
     should_be_sell = (locked_direction == "SELL")
+    modes = symbol_modes(sym)
 
     needs_update = False
-    if SETUP.get("sr_buy_enabled") != should_be_buy:
-        SETUP["sr_buy_enabled"] = should_be_buy
+    if modes.get("sr_buy_enabled") != should_be_buy:
+        modes["sr_buy_enabled"] = should_be_buy
         needs_update = True
     
-    if SETUP.get("sr_sell_enabled") != should_be_sell:
-        SETUP["sr_sell_enabled"] = should_be_sell
+    if modes.get("sr_sell_enabled") != should_be_sell:
+        modes["sr_sell_enabled"] = should_be_sell
         needs_update = True
 
     if needs_update:
-        print(f"[M5 Lock] Menegakkan kunci arah: Buy: {should_be_buy}, Sell: {should_be_sell}", flush=True)
-        persist_save()
+        print(f"[M5 Lock] {sym or current_symbol()}: Menegakkan kunci arah: Buy: {should_be_buy}, Sell: {should_be_sell}", flush=True)
+        if modes is SETUP:
+            persist_save()
 
-def auto_toggle_sr_on_m5(sym):
+def auto_toggle_sr_on_m5(sym, snap=None):
     """
     Sets the M5 lock direction at the start of a new M5 candle if no positions are open.
     The enforcement is handled by enforce_m5_direction_lock().
     """
     # 1. Master condition: only run if no trades are open AND no lock is active.
-    if open_count(sym) > 0 or STATE.get("m5_locked_direction") is not None:
+    count = snap["open_count"] if snap else open_count(sym)
+    if count > 0 or STATE.get("m5_locked_direction") is not None:
         return
 
     # 2. Get the last 2 M5 candles.
-    m5_candles = candles(sym, "M5", 2)
+    m5_candles = candles_np(sym, "M5", 2)
     if len(m5_candles) < 2:
         return  # Not enough data
 
@@ -1399,7 +2400,8 @@ def auto_toggle_sr_on_m5(sym):
     prev_candle_1 = m5_candles[-2]
 
     # 4. Only run this logic ONCE per new candle.
-    if STATE.get('last_m5_toggle_ts') == current_candle['time']:
+    current_candle_ts = int(current_candle['time'])
+    if STATE.get('last_m5_toggle_ts') == current_candle_ts:
         return
     
     # 5. Determine color of the previous candle
@@ -1419,13 +2421,113 @@ def auto_toggle_sr_on_m5(sym):
         STATE["m5_locked_direction"] = new_direction
         print(f"[M5 Auto-Set] Arah trading dikunci ke '{new_direction}' berdasarkan candle M5.", flush=True)
         # Enforce will save if buy/sell enabled status changes
-        enforce_m5_direction_lock()
+        enforce_m5_direction_lock(sym)
     
     # 10. Mark this candle as processed
-    STATE['last_m5_toggle_ts'] = current_candle['time']
+    STATE['last_m5_toggle_ts'] = current_candle_ts
 
 # ========== Engine loop ========== 
+ENGINE_INTERVAL_SEC = 1.0
+ENGINE_LAG_TOLERANCE_SEC = 0.2  # Siklus mulai lebih telat dari ini -> dihitung overrun
+TICK_POLL_SEC = 0.02            # Interval watcher time_msc di mode "tick" saat pasar bergerak
+TICK_POLL_MAX_SEC = 0.25        # Batas back-off watcher saat time_msc tidak berubah (pasar sepi)
+TICK_PUBLISH_SEC = 0.25         # Publish status dari cabang tick paling sering sekali per interval ini
+
+# Mode "tick": watcher ringan memantau symbol_info_tick().time_msc dan membangunkan
+# engine_loop lewat TICK_EVENT; hanya stage yang bergantung harga dijalankan per tick,
+# stage lambat (toggle M5, manajemen mode) tetap ikut jadwal ENGINE_INTERVAL_SEC.
+TICK_EVENT = Event()
+TICK_LOCK = threading.Lock()
+TICK_STATE = {"time_msc": {}, "seen_at": {}, "dirty": set()} # per simbol; dirty = tick belum diproses
+
+def tick_watcher():
+    """Set TICK_EVENT whenever an engine symbol's tick time_msc moves (engine_mode == "tick").
+    The poll interval doubles up to TICK_POLL_MAX_SEC while no symbol ticks and drops
+    back to TICK_POLL_SEC on the next tick, so an idle market costs few IPC calls."""
+    io_priority(PRIO_ENGINE)
+    interval = TICK_POLL_SEC
+    while not stop_flag.is_set():
+        if SETUP.get("engine_mode") != "tick" or mt5 is None:
+            stop_flag.wait(0.5)
+            continue
+        moved = False
+        for sym in engine_symbols():
+            try:
+                t = mt5_call(mt5.symbol_info_tick, sym)
+            except Exception:
+                t = None
+            ms = getattr(t, "time_msc", 0) if t else 0
+            if ms and ms != TICK_STATE["time_msc"].get(sym):
+                TICK_STATE["time_msc"][sym] = ms
+                with TICK_LOCK:
+                    if sym not in TICK_STATE["dirty"]:
+                        TICK_STATE["seen_at"][sym] = time.perf_counter()
+                        TICK_STATE["dirty"].add(sym)
+                metric_inc("ticks_seen")
+                TICK_EVENT.set()
+                moved = True
+        interval = TICK_POLL_SEC if moved else min(TICK_POLL_MAX_SEC, interval * 2)
+        stop_flag.wait(interval)
+
+def _run_price_stages(sym, snap):
+    """Stages that react to price: entries, TP/trailing exits, executors, session.
+    Returns the (possibly refreshed) snapshot."""
+    # 1. Run all logics that can create 'tasks' (pending_open/pending_close)
+    _stage("sr_auto_trade", sr_auto_trade, sym, snap)
+    _stage("auto_cross_trade", auto_cross_trade, sym)
+    _stage("tp_rule_tick", tp_rule_tick, sym, snap)
+    _stage("trailing_stop_tick", trailing_stop_tick, sym, snap)
+    # 2. Run executors that process those 'tasks'
+    snap = snapshot_refresh(snap) # re-read only if trailing stop sent an order
+    _stage("retry_and_verify_open_tick", retry_and_verify_open_tick, sym, snap)
+    _stage("retry_and_verify_close_tick", retry_and_verify_close_tick, sym, snap)
+    # 3. Run other session logic
+    snap = snapshot_refresh(snap) # re-read only if an executor clicked
+    _stage("try_break_event", try_break_event, sym, snap)
+    _stage("session_tick", session_tick, sym, snap)
+    return snap
+
+def engine_cycle():
+    """One full engine pass: shared snapshot, mode and price stages for every engine
+    symbol, then publish. bench_engine.py times this same pass."""
+    primary = SETUP["symbol"]
+    syms = engine_symbols()
+    # One MT5 read per cycle (positions partitioned per symbol), shared by every stage below
+    snaps = _stage("market_snapshot", market_snapshots, syms)
+
+    for sym in syms:
+        snap = snaps[sym]
+        with symbol_context(sym):
+            # Stage mode menulis toggle milik simbol ini (symbol_modes)
+            # Set M5 lock direction if applicable
+            _stage("auto_toggle_sr_on_m5", auto_toggle_sr_on_m5, sym, snap)
+
+            # Enforce M5 direction lock if active
+            _stage("enforce_m5_direction_lock", enforce_m5_direction_lock, sym)
+
+            # Reset cycle states if applicable (including M5 lock)
+            _stage("check_and_reset_trade_direction_lock", check_and_reset_trade_direction_lock, sym, snap)
+
+            # Manage TPSM/TPSB mode based on live position count
+            _stage("manage_tpsm_tpsb_mode", manage_tpsm_tpsb_mode, sym, snap)
+            _stage("auto_manage_trailing_stop", auto_manage_trailing_stop, sym, snap)
+
+            snaps[sym] = _run_price_stages(sym, snap)
+
+    # 4. Publish the /api/status document for the UI
+    _stage("publish_status", publish_status, snapshot_refresh(snaps[primary]))
+    _stage("journal_capture", journal_capture)
+
+def _stage(name, fn, *args):
+    """Run one engine stage and record its duration under stage.<name>."""
+    t0 = time.perf_counter()
+    try:
+        return fn(*args)
+    finally:
+        metric_observe("stage." + name, time.perf_counter() - t0)
+
 def engine_loop():
+    io_priority(PRIO_ENGINE)
     next_tick = time.time()
     last_connect_check = 0
     while not stop_flag.is_set():
@@ -1434,49 +2536,65 @@ def engine_loop():
         # --- Connection Management (every 15s if offline) ---
         is_connected = False
         if mt5 and now - last_connect_check > 15:
-            with MTX:
-                try: is_connected = bool(mt5.terminal_info() and mt5.terminal_info().connected)
-                except Exception: is_connected = False
+            try:
+                ti = mt5_call(mt5.terminal_info)
+                is_connected = bool(ti and ti.connected)
+            except Exception: is_connected = False
             if not is_connected:
                 print("[ENGINE] Offline, attempting to reconnect...", flush=True)
                 mt5_restart()
             last_connect_check = now
 
         # --- Core Logic ---
+        tick_mode = SETUP.get("engine_mode") == "tick"
         try:
-            if now >= next_tick:
-                sym = SETUP["symbol"]
-
-                # Set M5 lock direction if applicable
-                auto_toggle_sr_on_m5(sym)
-                
-                # Enforce M5 direction lock if active
-                enforce_m5_direction_lock()
-                
-                # Reset cycle states if applicable (including M5 lock)
-                check_and_reset_trade_direction_lock(sym)
-                
-                # Manage TPSM/TPSB mode based on live position count
-                manage_tpsm_tpsb_mode(sym)
-                auto_manage_trailing_stop(sym)
-
-                # 1. Run all logics that can create 'tasks' (pending_open/pending_close)
-                sr_auto_trade(sym)
-                auto_cross_trade(sym)
-                auto_tpsb_tick(sym)
-                auto_tpsm_tick(sym)
-                trailing_stop_tick(sym)
-                # 2. Run executors that process those 'tasks'
-                retry_and_verify_open_tick(sym)
-                retry_and_verify_close_tick(sym)
-                # 3. Run other session logic
-                try_break_event(sym)
-                session_tick(sym)
-                next_tick = now + 1.0
+            if tick_mode and TICK_EVENT.is_set() and now < next_tick:
+                # Tick baru: hanya stage harga untuk simbol yang bergerak,
+                # stage lambat menunggu jadwal 1 detik
+                TICK_EVENT.clear()
+                with TICK_LOCK:
+                    dirty, TICK_STATE["dirty"] = TICK_STATE["dirty"], set()
+                primary_snap = None
+                for sym in engine_symbols():
+                    if sym not in dirty:
+                        continue
+                    t_cycle = time.perf_counter()
+                    with symbol_context(sym):
+                        snap = _stage("market_snapshot", market_snapshot, sym)
+                        snap = _run_price_stages(sym, snap)
+                    if sym == SETUP["symbol"]:
+                        primary_snap = snap
+                    metric_observe("engine.tick_cycle", time.perf_counter() - t_cycle)
+                    metric_observe("engine.tick_react", time.perf_counter() - TICK_STATE["seen_at"][sym])
+                    metric_inc("tick_cycles")
+                # Publish per tick dibatasi dan tanpa fetch histori/quotes (dipakai dari siklus
+                # penuh terakhir); siklus penuh tetap publish lengkap tiap ENGINE_INTERVAL_SEC
+                if primary_snap is not None and time.time() - STATUS_CACHE["ts"] >= TICK_PUBLISH_SEC:
+                    _stage("publish_status", publish_status, snapshot_refresh(primary_snap), True)
+                    _stage("journal_capture", journal_capture)
+            elif now >= next_tick:
+                TICK_EVENT.clear() # siklus penuh juga memproses tick terakhir
+                with TICK_LOCK:
+                    TICK_STATE["dirty"].clear()
+                t_cycle = time.perf_counter()
+                lag = now - next_tick
+                metric_observe("engine.lag", lag)
+                engine_cycle()
+                next_tick = now + ENGINE_INTERVAL_SEC
+
+                took = time.perf_counter() - t_cycle
+                metric_observe("engine.cycle", took)
+                metric_inc("engine_cycles")
+                if took > ENGINE_INTERVAL_SEC or lag > ENGINE_LAG_TOLERANCE_SEC:
+                    metric_inc("cycle_overruns")
         except Exception as e:
             print("[ENGINE]", e, flush=True)
             traceback.print_exc()
-        time.sleep(0.1) # Sleep longer to reduce CPU usage
+        if tick_mode:
+            # Tidur sampai ada tick baru atau jadwal siklus penuh berikutnya
+            TICK_EVENT.wait(max(0.0, min(0.1, next_tick - time.time())))
+        else:
+            time.sleep(0.1) # Sleep longer to reduce CPU usage
 
 
 # ========== UI/Static ========== 
@@ -1494,6 +2612,36 @@ def health():
     return (f"OK v{APP_VERSION}", 200, {"Content-Type": "text/plain; charset=utf-8"})
 
 # ========== API ========== 
+def _metrics_prometheus(summary):
+    """Render metrics_summary() in the Prometheus text exposition format."""
+    lines = []
+    families = {}
+    for name, h in summary["timers"].items():
+        group, _, label = name.partition(".")
+        families.setdefault(group, []).append((label or group, h))
+    for group, items in sorted(families.items()):
+        metric = f"indodam_{group}_seconds"
+        lines.append(f"# TYPE {metric} summary")
+        for label, h in items:
+            for q in ("p50", "p90", "p99"):
+                lines.append(f'{metric}{{name="{label}",quantile="0.{q[1:]}"}} {h[q]:.9f}')
+            lines.append(f'{metric}_sum{{name="{label}"}} {h["sum"]:.9f}')
+            lines.append(f'{metric}_count{{name="{label}"}} {h["count"]}')
+    for name, value in sorted(summary["counters"].items()):
+        lines.append(f"# TYPE indodam_{name}_total counter")
+        lines.append(f"indodam_{name}_total {value}")
+    lines.append("# TYPE indodam_uptime_seconds gauge")
+    lines.append(f"indodam_uptime_seconds {summary['uptime_sec']:.3f}")
+    return "\n".join(lines) + "\n"
+
+@app.route("/api/metrics", methods=["GET"])
+def api_metrics():
+    summary = metrics_summary()
+    fmt = request.args.get("format", "")
+    if fmt == "prometheus" or (not fmt and "text/plain" in request.headers.get("Accept", "")):
+        return (_metrics_prometheus(summary), 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+    return jsonify(summary)
+
 def _status_payload_offline():
     return {
         "online": False, "locked": STATE["locked"], "mode": "SIDE",
@@ -1527,132 +2675,411 @@ def _status_payload_offline():
         "currency": "USD" # Default currency
     }
 
-@app.route("/api/status", methods=["GET"])
-def api_status():
+# ========== Quote board ========== 
+# Satu symbols_get() untuk semua simbol watchlist per refresh (bid/ask ikut di SymbolInfo);
+# status hanya membaca tabel QUOTES tanpa menyentuh MT5.
+QUOTE_REFRESH_SEC = 1.0
+QUOTE_STALE_SEC = 10.0   # Tidak ada refresh sukses untuk simbol selama ini -> ditandai stale
+QUOTES = {
+    "table": {},          # simbol -> {"bid", "ask", "tick_time", "seen_at"}
+    "visible": set(),     # simbol yang sudah terlihat di Market Watch (tak perlu symbol_ensure lagi)
+    "refreshed_at": 0.0,
+}
+
+@timed("mt5.quotes")
+def quotes_refresh():
+    """Refresh every watched symbol from one batched symbols_get() call."""
+    if mt5 is None:
+        return
+    syms = list(SETUP.get("symbols") or [])
     try:
-        # --- Consume one-shot system message ---
-        system_message = STATE.get("last_system_message")
-        if system_message:
-            STATE["last_system_message"] = None # Consume the message
-
-        if mt5 is None:
-            return jsonify(_status_payload_offline())
-        with MTX:
-            ti = mt5.terminal_info()
-        # Perbaikan: cek connected harus eksplisit True, bukan default True
-        online = bool(ti) and bool(getattr(ti, "connected", False))
-        if not online:
-            # Jangan restart dari sini, biarkan background worker yang menangani.
-            return jsonify(_status_payload_offline())
+        infos = mt5_call(mt5.symbols_get, ",".join(syms)) if syms else ()
+    except Exception:
+        infos = None
+    if infos is None:
+        return
+    now = time.time()
+    table, visible = QUOTES["table"], QUOTES["visible"]
+    found = {si.name: si for si in infos}
+    for sym in syms:
+        si = found.get(sym)
+        if si is None:
+            continue
+        if not si.visible:
+            # Masukkan ke Market Watch; bid/ask baru terisi pada refresh berikutnya
+            visible.discard(sym)
+            try:
+                mt5_call(mt5.symbol_select, sym, True)
+            except Exception:
+                pass
+            continue
+        visible.add(sym)
+        # seen_at = refresh sukses terakhir; simbol yang sepi (harga tetap) tidak dianggap stale
+        table[sym] = {"bid": round(si.bid or 0.0, 2), "ask": round(si.ask or 0.0, 2),
+                      "tick_time": int(getattr(si, "time", 0) or 0), "seen_at": now}
+    for sym in list(table):
+        if sym not in found:
+            del table[sym]
+    QUOTES["refreshed_at"] = now
+
+def quotes_board():
+    """Quote rows for the status document (no MT5 access). age_sec counts from the
+    last successful refresh of the symbol; tick_time is the terminal's last quote time."""
+    now = time.time()
+    rows = []
+    for sym in SETUP.get("symbols") or []:
+        q = QUOTES["table"].get(sym)
+        if q:
+            age = now - q["seen_at"]
+            rows.append({"symbol": sym, "bid": q["bid"], "ask": q["ask"], "tick_time": q["tick_time"],
+                         "age_sec": round(age, 1), "stale": age >= QUOTE_STALE_SEC})
+    return rows
+
+def quote_worker():
+    while not stop_flag.is_set():
+        try:
+            quotes_refresh()
+        except Exception as e:
+            print("[QUOTES]", e, flush=True)
+        stop_flag.wait(QUOTE_REFRESH_SEC)
+
+def _status_payload_online(snap, history, daily_pl_total, quotes):
+    sym = snap["symbol"]
+    t  = snap["tick"]
+    ai = snap["account"]
+    digits = getattr(ai, 'currency_digits', 2) if ai else 2
+    eq = float(getattr(ai, 'equity', 0.0) or 0.0)
+    free = float(getattr(ai, 'margin_free', 0.0) or 0.0)
+
+    price = 0.0; tick_dir = 0
+    if t:
+        price = (t.last if t.last>0 else (t.bid or t.ask or 0.0))
+        diff  = (t.ask or 0.0) - (t.bid or 0.0)
+        tick_dir = 1 if diff>0 else (-1 if diff<0 else 0)
+
+    open_positions_data = []
+    for p in snap["positions"]:
+        status = None
+        if p.ticket in STATE["failed_close"]:
+            status = "Gagal Close!"
+        elif p.ticket in STATE["pending_close"]:
+            details = STATE["pending_close"].get(p.ticket)
+            retries = details["retries"]
+            # retries=0 is pre-first-attempt, retries=1 is first attempt
+            if retries <= 1: 
+                status = "Mencoba menutup..."
+            else:
+                status = f"Retry ({retries - 1}/{MAX_RETRIES})"
+
+        open_positions_data.append({
+            "ticket": p.ticket,
+            "side": ("BUY" if p.type == mt5.POSITION_TYPE_BUY else "SELL"),
+            "lot": p.volume,
+            "entry": p.price_open,
+            "pl": round(float(getattr(p, 'profit', 0.0) or 0.0), digits),
+            "open_exec": classify_open_exec(getattr(p, 'comment', '')),
+            "close_status": status
+        })
 
-        STATUS_FAILS["count"] = 0
-        sym = SETUP["symbol"]
-        symbol_ensure(sym)
+    pending_open_status = None
+    if STATE.get("pending_open"):
+        details = STATE["pending_open"]
+        retries = details["retries"]
+        if retries == 1:
+            pending_open_status = f"Membuka {details['side']}..."
+        elif retries > 1:
+            pending_open_status = f"Retry ({retries-1}/{MAX_RETRIES-1}) {details['side']}..."
 
-        t  = tick(sym)
-        ai = account_snapshot()
-        digits = getattr(ai, 'currency_digits', 2) if ai else 2
-        eq = float(getattr(ai, 'equity', 0.0) or 0.0)
-        free = float(getattr(ai, 'margin_free', 0.0) or 0.0)
-        oc = open_count(sym)
-        tl = total_lot(sym)
-        history, daily_pl_total = get_history_today()
-        pl = float_pl(sym)
-
-        price = 0.0; tick_dir = 0
-        if t:
-            price = (t.last if t.last>0 else (t.bid or t.ask or 0.0))
-            diff  = (t.ask or 0.0) - (t.bid or 0.0)
-            tick_dir = 1 if diff>0 else (-1 if diff<0 else 0)
-
-        quotes = []
-        for symq in SETUP["symbols"]:
-            if not symbol_ensure(symq): continue
-            tq = tick(symq)
-            if tq:
-                quotes.append({"symbol": symq, "bid": round(tq.bid or 0.0, 2), "ask": round(tq.ask or 0.0, 2)})
-        
-        open_positions_data = []
-        for p in positions(sym):
-            status = None
-            if p.ticket in STATE["failed_close"]:
-                status = "Gagal Close!"
-            elif p.ticket in STATE["pending_close"]:
-                details = STATE["pending_close"].get(p.ticket)
-                retries = details["retries"]
-                # retries=0 is pre-first-attempt, retries=1 is first attempt
-                if retries <= 1: 
-                    status = "Mencoba menutup..."
+    return {
+        "online": True, "locked": STATE["locked"], "mode": "SIDE",
+        "auto_mode": SETUP["auto_mode"], "symbol": sym,
+        "mt5_accounts": SETUP.get("mt5_accounts", []),
+        "active_mt5_login": SETUP.get("active_mt5_login"),
+        "symbols": SETUP.get("symbols", []),
+        "engine_symbols": engine_symbols(),
+        "price": round(price,2), "tick_dir": tick_dir,
+        "equity": round(eq, digits), "daily_pl": round(daily_pl_total, digits),
+        "daily_target": SETUP["daily_target"], "daily_min": SETUP["daily_min"],
+        "free_margin": round(free, digits),
+        "currency": getattr(ai, 'currency', 'USD'),
+        "tpsm_auto": SETUP["tpsm_auto"], "abe_auto": SETUP["abe_auto"],
+        "sr_buy_enabled": SETUP.get("sr_buy_enabled", False),
+        "sr_sell_enabled": SETUP.get("sr_sell_enabled", False),
+        "auto_tpsb_enabled": SETUP.get("auto_tpsb_enabled", False),
+        "trailing_stop_enabled": SETUP.get("trailing_stop_enabled", False),
+        "trailing_stop_value": SETUP.get("trailing_stop_value", 2000.0),
+        "cross_buy_enabled": SETUP.get("cross_buy_enabled", False),
+        "cross_sell_enabled": SETUP.get("cross_sell_enabled", False),
+        "click_xy": SETUP.get("click_xy", []),
+        "vSL": 0.0, "best_pl": STATE["session_peak_pl"], "adds_done": 0, "timer": STATE["timer"],
+        "total_lot": round(snap["total_lot"],2), "open_count": snap["open_count"], "float_pl": round(snap["float_pl"], digits),
+        "cooldown": STATE["cooldown"], "cooldown_remain": STATE["timer"],
+        "pending_open_status": pending_open_status,
+        "open_positions": open_positions_data,
+        "history_today": history,
+        "quotes": quotes,
+        "sr_buy_armed": SR_TRIGGER["buy"]["armed"], "sr_sell_armed": SR_TRIGGER["sell"]["armed"],
+        "sr_buy_last_ts": SR_TRIGGER["buy"]["last_ts"], "sr_sell_last_ts": SR_TRIGGER["sell"]["last_ts"],
+        "sr_last_ts": max(SR_TRIGGER["buy"]["last_ts"], SR_TRIGGER["sell"]["last_ts"]),
+        "sr_support": SR_STATE["support"], "sr_resistance": SR_STATE["resistance"],
+        "sr_top": SR_STATE["top"], "sr_bottom": SR_STATE["bottom"], "sr_mid": SR_STATE["mid"],
+    }
+
+# ---------- Status publisher ----------
+# Engine membangun dokumen /api/status sekali per siklus dan menyimpannya sebagai
+# bytes JSON siap kirim; request UI (berapapun tab yang terbuka) hanya menyalin.
+STATUS_CACHE = {"body": None, "ts": 0.0, "inputs": None,
+                # Versi naik hanya bila isi dokumen berubah. Dimulai dari epoch ms supaya
+                # tetap monoton setelah restart (client lama tidak salah cocok versi).
+                "raw": None, "version": int(time.time() * 1000), "deltas": {}}
+STATUS_DELTA_RING = 64              # Versi terakhir yang bisa dijadikan basis ?since=
+STATUS_VERSIONS = deque(maxlen=STATUS_DELTA_RING) # (version, doc)
+# publish_status dipanggil dari engine, request (boot/POST) dan worker: build -> versi ->
+# simpan body -> diff stream harus satu kesatuan supaya body selalu cocok dengan versinya
+STATUS_LOCK = threading.RLock()
+
+def _status_inputs(snap):
+    """MT5-derived inputs of the status document, or False when offline."""
+    if mt5 is None or not snap["online"]:
+        # Jangan restart dari sini, biarkan background worker yang menangani.
+        return False
+    STATUS_FAILS["count"] = 0
+    if snap["symbol"] not in QUOTES["visible"]:
+        symbol_ensure(snap["symbol"])
+    history, daily_pl_total = get_history_today()
+    return (snap, history, daily_pl_total, quotes_board())
+
+def publish_status(snap=None, tick_only=False):
+    """Build the status document and publish it as ready-to-send JSON bytes.
+    With snap=None the MT5 inputs of the previous build are reused (no terminal
+    round-trip), so setup changes show up immediately; MT5 is only read again
+    when nothing was published yet or the active symbol changed. tick_only keeps
+    the previous history/quotes inputs and only swaps in `snap` (tick branch).
+    """
+    with STATUS_LOCK:
+        try:
+            inputs = STATUS_CACHE["inputs"]
+            if snap is None and (inputs is None or (inputs and inputs[0]["symbol"] != SETUP["symbol"])):
+                snap = market_snapshot(SETUP["symbol"])
+            if snap is not None:
+                if tick_only and inputs and snap["online"] and inputs[0]["symbol"] == snap["symbol"]:
+                    inputs = STATUS_CACHE["inputs"] = (snap,) + inputs[1:]
                 else:
-                    status = f"Retry ({retries - 1}/{MAX_RETRIES})"
-
-            open_positions_data.append({
-                "ticket": p.ticket,
-                "side": ("BUY" if p.type == mt5.POSITION_TYPE_BUY else "SELL"),
-                "lot": p.volume,
-                "entry": p.price_open,
-                "pl": round(float(getattr(p, 'profit', 0.0) or 0.0), digits),
-                "open_exec": classify_open_exec(getattr(p, 'comment', '')),
-                "close_status": status
-            })
+                    inputs = STATUS_CACHE["inputs"] = _status_inputs(snap)
+            doc = _status_payload_online(*inputs) if inputs else _status_payload_offline()
+        except Exception as e:
+            # jangan 500 â€” selalu publish JSON aman
+            print("[STATUS] publish EXC:", e, flush=True)
+            traceback.print_exc()
+            STATUS_FAILS["count"] += 1
+            doc = _status_payload_offline()
+        # Pesan sistem ikut dokumen selama masih baru: SSE, polling penuh dan ?since melihat pesan yang sama
+        msg = STATE.get("last_system_message")
+        doc["last_system_message"] = msg if msg and time.time() - msg["ts"] < SYSTEM_MESSAGE_TTL_SEC else None
+        body = json.dumps(doc, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        if body != STATUS_CACHE["raw"]:
+            STATUS_CACHE["raw"] = body
+            STATUS_CACHE["version"] += 1
+            STATUS_CACHE["deltas"] = {}
+            STATUS_VERSIONS.append((STATUS_CACHE["version"], doc))
+        version = STATUS_CACHE["version"]
+        doc["version"] = version
+        STATUS_CACHE["body"] = body[:-1] + f',"version":{version}}}'.encode("utf-8")
+        STATUS_CACHE["ts"] = time.time()
+        try:
+            _stream_status(doc)
+        except Exception as e:
+            print("[STREAM] EXC:", e, flush=True)
 
-        pending_open_status = None
-        if STATE.get("pending_open"):
-            details = STATE["pending_open"]
-            retries = details["retries"]
-            if retries == 1:
-                pending_open_status = f"Membuka {details['side']}..."
-            elif retries > 1:
-                pending_open_status = f"Retry ({retries-1}/{MAX_RETRIES-1}) {details['side']}..."
+def status_delta(since):
+    """JSON body with only the fields that changed after version `since`.
+    New history rows come as "history_new" (newest first). Returns None when
+    `since` has dropped out of the ring and the client needs the full document.
+    """
+    with STATUS_LOCK:
+        versions = list(STATUS_VERSIONS)
+        deltas = STATUS_CACHE["deltas"]
+    if not versions:
+        return None
+    version, cur = versions[-1]
+    if since in deltas:
+        return deltas[since]
+    old = next((d for v, d in versions if v == since), None)
+    if old is None or old.keys() != cur.keys():
+        return None
+    delta = {"version": version, "since": since, "delta": True}
+    for k, val in cur.items():
+        if k != "history_today" and k != "version" and old[k] != val:
+            delta[k] = val
+    rows, prev_rows = cur.get("history_today", []), old.get("history_today", [])
+    if rows is not prev_rows and rows != prev_rows:
+        added = _history_delta(prev_rows, rows)
+        if added is None:
+            delta["history_today"] = rows
+        else:
+            delta["history_new"] = added
+    body = deltas[since] = json.dumps(delta, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return body
 
-        return jsonify({
-            "online": True, "locked": STATE["locked"], "mode": "SIDE",
-            "auto_mode": SETUP["auto_mode"], "symbol": sym,
-            "mt5_accounts": SETUP.get("mt5_accounts", []),
-            "active_mt5_login": SETUP.get("active_mt5_login"),
-            "symbols": SETUP.get("symbols", []),
-            "price": round(price,2), "tick_dir": tick_dir,
-            "equity": round(eq, digits), "daily_pl": round(daily_pl_total, digits),
-            "daily_target": SETUP["daily_target"], "daily_min": SETUP["daily_min"],
-            "free_margin": round(free, digits),
-            "currency": getattr(ai, 'currency', 'USD'),
-            "tpsm_auto": SETUP["tpsm_auto"], "abe_auto": SETUP["abe_auto"],
-            "sr_buy_enabled": SETUP.get("sr_buy_enabled", False),
-            "sr_sell_enabled": SETUP.get("sr_sell_enabled", False),
-            "auto_tpsb_enabled": SETUP.get("auto_tpsb_enabled", False),
-            "trailing_stop_enabled": SETUP.get("trailing_stop_enabled", False),
-            "trailing_stop_value": SETUP.get("trailing_stop_value", 2000.0),
-            "cross_buy_enabled": SETUP.get("cross_buy_enabled", False),
-            "cross_sell_enabled": SETUP.get("cross_sell_enabled", False),
-            "click_xy": SETUP.get("click_xy", []),
-            "vSL": 0.0, "best_pl": STATE["session_peak_pl"], "adds_done": 0, "timer": STATE["timer"],
-            "total_lot": round(tl,2), "open_count": oc, "float_pl": round(pl, digits),
-            "cooldown": STATE["cooldown"], "cooldown_remain": STATE["timer"],
-            "last_system_message": system_message, # Kirim pesan yang sudah di-consume
-            "pending_open_status": pending_open_status,
-            "open_positions": open_positions_data,
-            "history_today": history,
-            "quotes": quotes,
-            "sr_buy_armed": SR_TRIGGER["buy"]["armed"], "sr_sell_armed": SR_TRIGGER["sell"]["armed"],
-                    "sr_buy_last_ts": SR_TRIGGER["buy"]["last_ts"], "sr_sell_last_ts": SR_TRIGGER["sell"]["last_ts"],
-                    "sr_last_ts": max(SR_TRIGGER["buy"]["last_ts"], SR_TRIGGER["sell"]["last_ts"]),
-                    "sr_support": SR_STATE["support"], "sr_resistance": SR_STATE["resistance"],
-                    "sr_top": SR_STATE["top"], "sr_bottom": SR_STATE["bottom"], "sr_mid": SR_STATE["mid"],        })
-    except Exception as e:
-        # jangan 500 â€” selalu balas JSON aman
-        print("[/api/status] EXC:", e, flush=True)
-        traceback.print_exc()
-        STATUS_FAILS["count"] += 1
-        return jsonify(_status_payload_offline())
+@app.route("/api/status", methods=["GET"])
+def api_status():
+    if STATUS_CACHE["body"] is None:
+        publish_status() # engine belum sempat publish (baru boot)
+    with STATUS_LOCK:
+        version, full = STATUS_CACHE["version"], STATUS_CACHE["body"]
+    since = request.args.get("since", type=int)
+    if since is not None:
+        if since == version:
+            return Response(status=304)
+        body = status_delta(since)
+        if body is not None:
+            return Response(body, mimetype="application/json")
+    return Response(full, mimetype="application/json")
+
+# ========== Push channel (SSE) ========== 
+# /api/stream mengirim perubahan begitu status dipublish, menggantikan polling /api/status
+# dan /api/candles tiap detik. Event: status (dokumen penuh saat connect, lalu hanya
+# bagian lambat yang berubah, termasuk pesan sistem), tick, positions, history, quotes, bar.
+STREAM_QUEUE_MAX = 256       # Event antri per subscriber; penuh -> diputus, EventSource reconnect
+STREAM_KEEPALIVE_SEC = 15.0
+STREAM_TICK_KEYS = ("version", "price", "tick_dir", "equity", "free_margin", "float_pl", "daily_pl",
+                    "total_lot", "open_count", "timer", "cooldown_remain", "cooldown")
+STREAM_FAST_KEYS = STREAM_TICK_KEYS + ("open_positions", "history_today", "quotes")
+STREAM = {"subs": set(), "lock": threading.Lock(), "doc": None, "prev": {}}
+
+def _sse(event, data):
+    body = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+    return f"event: {event}\ndata: {body}\n\n".encode("utf-8")
+
+def stream_emit(event, data):
+    """Broadcast one event to every /api/stream subscriber."""
+    with STREAM["lock"]:
+        subs = list(STREAM["subs"])
+    if not subs:
+        return
+    payload = _sse(event, data)
+    for q in subs:
+        try:
+            q.put_nowait(payload)
+        except queue.Full:
+            # Subscriber terlalu lambat: putuskan, saat reconnect ia menerima status penuh
+            with STREAM["lock"]:
+                STREAM["subs"].discard(q)
+            with q.mutex:
+                q.queue.clear()
+            q.put_nowait(None)
+            metric_inc("stream_dropped")
+
+def _history_delta(prev, rows):
+    """Rows prepended to `prev` (history is newest first), or None if `rows` is not just `prev` grown."""
+    if not prev:
+        return list(rows)
+    for k, r in enumerate(rows):
+        if r == prev[0]:
+            return rows[:k] if rows[k:] == prev[:len(rows) - k] else None
+    return None
+
+def _stream_status(doc):
+    """Diff a freshly published status doc against the previous one and push the changed parts."""
+    prev = STREAM["prev"]
+    STREAM["doc"] = doc
+    parts = {
+        "status": {k: v for k, v in doc.items() if k not in STREAM_FAST_KEYS},
+        "tick": {k: doc.get(k) for k in STREAM_TICK_KEYS},
+        "positions": {"open_positions": doc.get("open_positions", [])},
+        "history": doc.get("history_today", []),
+        "quotes": doc.get("quotes", []),
+    }
+    STREAM["prev"] = parts
+    if not STREAM["subs"] or not prev:
+        return
+    for name in ("status", "tick", "positions", "quotes"):
+        if parts[name] != prev.get(name):
+            stream_emit(name, parts[name])
+    rows, old = parts["history"], prev.get("history", [])
+    if rows is not old and rows != old:
+        added = _history_delta(old, rows)
+        stream_emit("history", {"rows": added, "reset": False} if added is not None else {"rows": rows, "reset": True})
+    _stream_bars(doc.get("symbol"))
+
+def _stream_bars(sym):
+    """Push the forming bar of every timeframe the dashboard has loaded for `sym`.
+    Read from the candle buffers as last refreshed (engine, /api/candles): no MT5 I/O here."""
+    if not sym or np is None:
+        return
+    last = STREAM["prev"].setdefault("bars", {})
+    for (bsym, tf), buf in list(CANDLE_BUFFERS.items()):
+        if bsym != sym:
+            continue
+        rates = buf["data"] # array immutable, ditukar utuh saat refresh
+        if len(rates) == 0:
+            continue
+        r = rates[-1]
+        bar = {"time": int(r['time']), "open": float(r['open']), "high": float(r['high']),
+               "low": float(r['low']), "close": float(r['close'])}
+        if last.get((sym, tf)) != bar:
+            last[(sym, tf)] = bar
+            stream_emit("bar", {"symbol": sym, "tf": tf, "bar": bar})
+
+@app.route("/api/stream", methods=["GET"])
+def api_stream():
+    if STATUS_CACHE["body"] is None:
+        publish_status()
+    q = queue.Queue(maxsize=STREAM_QUEUE_MAX)
+    with STATUS_LOCK, STREAM["lock"]: # dokumen awal + langganan atomik terhadap publish
+        STREAM["subs"].add(q)
+        first = STREAM["doc"]
+    def gen():
+        try:
+            yield b"retry: 2000\n\n"
+            if first is not None:
+                yield _sse("status", first)
+            while not stop_flag.is_set():
+                try:
+                    payload = q.get(timeout=STREAM_KEEPALIVE_SEC)
+                except queue.Empty:
+                    yield b": keepalive\n\n"
+                    continue
+                if payload is None:
+                    return
+                yield payload
+        finally:
+            with STREAM["lock"]:
+                STREAM["subs"].discard(q)
+    return Response(gen(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.before_request
+def _ui_io_priority():
+    # Baca MT5 dari request dashboard antri paling belakang; order tetap PRIO_TRADE
+    io_priority(PRIO_UI)
+
+@app.after_request
+def _republish_after_change(resp):
+    # Perubahan setup dari UI langsung terlihat di status tanpa menunggu siklus engine
+    # (controller tidak punya engine: worker sudah publish sendiri)
+    if request.method == "POST" and not CONTROLLER["on"]:
+        publish_status()
+    return resp
 
 @app.route("/api/candles", methods=["GET"])
 def api_candles():
     sym = request.args.get("symbol", SETUP["symbol"])
     tf  = request.args.get("tf", "M1")
     cnt = int(request.args.get("count", 120))
+    since = request.args.get("since", type=int)
     try:
-        data = candles(sym, tf, cnt)
-        return jsonify(data)
+        # Chart hanya memperbarui bar berjalan: If-None-Match cocok -> 304 tanpa membangun JSON.
+        # ETag dan body dari array yang sama (satu fetch), jadi selalu menggambarkan bar yang sama
+        rates = candles_np(sym, tf, cnt)
+        tag = candles_etag(sym, tf, cnt, since, rates)
+        if request.if_none_match.contains(tag):
+            resp = Response(status=304)
+        else:
+            resp = jsonify(candles(sym, tf, cnt, since, rates))
+        resp.set_etag(tag)
+        resp.headers["Cache-Control"] = "no-cache"
+        return resp
     except Exception as e:
         print("[/api/candles] EXC:", e, flush=True)
         return jsonify([])
@@ -1662,6 +3089,13 @@ def api_symbol_select():
     sym = (request.get_json(force=True) or {}).get("symbol") or SETUP["symbol"]
     if sym not in SETUP["symbols"]:
         return jsonify({"ok": False, "msg": "symbol not allowed"}), 400
+    prev = SETUP["symbol"]
+    if sym != prev:
+        # Toggle mode ikut simbolnya: simbol lama simpan salinan, simbol baru membawa miliknya ke SETUP
+        own = sym_state(sym)["modes"]
+        sym_state(prev)["modes"] = {k: SETUP.get(k) for k in SYMBOL_MODE_KEYS}
+        if own:
+            SETUP.update(own)
     SETUP["symbol"] = sym
     persist_save()
     symbol_ensure(sym)
@@ -1727,6 +3161,41 @@ def api_trailingstop_toggle():
     persist_save()
     return jsonify({"ok": True, "trailing_stop_enabled": SETUP.get("trailing_stop_enabled"), "trailing_stop_value": SETUP.get("trailing_stop_value")})
 
+@app.route("/api/setup/engine", methods=["GET", "POST"])
+def api_setup_engine():
+    if request.method == "POST":
+        mode = str((request.get_json(force=True) or {}).get("mode", "")).lower()
+        if mode not in ("poll", "tick"):
+            return jsonify({"ok": False, "msg": "mode must be 'poll' or 'tick'"}), 400
+        SETUP["engine_mode"] = mode
+        persist_save()
+    return jsonify({"ok": True, "engine_mode": SETUP.get("engine_mode", "poll"),
+                    "tick_poll_sec": TICK_POLL_SEC, "tick_poll_max_sec": TICK_POLL_MAX_SEC,
+                    "tick_publish_sec": TICK_PUBLISH_SEC, "interval_sec": ENGINE_INTERVAL_SEC})
+
+@app.route("/api/engine/symbols", methods=["GET", "POST"])
+def api_engine_symbols():
+    if request.method == "POST":
+        symbols = (request.get_json(force=True) or {}).get("symbols")
+        if not isinstance(symbols, list):
+            return jsonify({"ok": False, "msg": "Invalid payload, expected a list of symbols."}), 400
+        wanted = [str(s).strip() for s in symbols if str(s).strip()]
+        # Simbol tambahan: nama hasil resolve yang disimpan, simbol utama tidak diubah
+        resolved = (symbol_resolve(s) for s in dict.fromkeys(wanted))
+        SETUP["engine_symbols"] = list(dict.fromkeys(s for s in resolved if s))
+        persist_save()
+    state = {}
+    for sym in engine_symbols():
+        st = sym_state(sym)["state"]
+        state[sym] = {
+            "session_active": st["session_active"], "cooldown": st["cooldown"], "timer": st["timer"],
+            "arah_posisi_terkunci": st["arah_posisi_terkunci"], "m5_locked_direction": st["m5_locked_direction"],
+            "pending_open": bool(st["pending_open"]), "pending_close": len(st["pending_close"]),
+            "sr": dict(sym_state(sym)["sr_state"]), "clicks": _symbol_uses_clicks(sym),
+            "modes": {k: symbol_modes(sym).get(k) for k in SYMBOL_MODE_KEYS},
+        }
+    return jsonify({"ok": True, "engine_symbols": engine_symbols(), "state": state})
+
 @app.route("/api/strategy/crossbuy", methods=["POST"])
 def api_crossbuy_toggle():
     SETUP["cross_buy_enabled"] = bool((request.get_json(force=True) or {}).get("on"))
@@ -1744,10 +3213,11 @@ def api_buy():
     lot = float((request.get_json(force=True) or {}).get("lot", 0.01))
     if SETUP.get("auto_mode"):
         return jsonify({"ok": False, "msg": "manual-disabled-in-auto"})
-    STATE["locked"] = True
-    ok, msg = order_send_with_fallback(SETUP["symbol"], "BUY", lot, reason="MANUAL BUY")
-    STATE["locked"] = False
-    begin_session_if_needed(SETUP["symbol"])
+    with io_priority(PRIO_TRADE): # seluruh jalur order (cek simbol, tick, kirim) di depan baca dashboard
+        STATE["locked"] = True
+        ok, msg = order_send_with_fallback(SETUP["symbol"], "BUY", lot, reason="MANUAL BUY")
+        STATE["locked"] = False
+        begin_session_if_needed(SETUP["symbol"])
     return jsonify({"ok": ok, "msg": msg})
 
 @app.route("/api/action/sell", methods=["POST"])
@@ -1755,20 +3225,22 @@ def api_sell():
     lot = float((request.get_json(force=True) or {}).get("lot", 0.01))
     if SETUP.get("auto_mode"):
         return jsonify({"ok": False, "msg": "manual-disabled-in-auto"})
-    STATE["locked"] = True
-    ok, msg = order_send_with_fallback(SETUP["symbol"], "SELL", lot, reason="MANUAL SELL")
-    STATE["locked"] = False
-    begin_session_if_needed(SETUP["symbol"])
+    with io_priority(PRIO_TRADE): # seluruh jalur order (cek simbol, tick, kirim) di depan baca dashboard
+        STATE["locked"] = True
+        ok, msg = order_send_with_fallback(SETUP["symbol"], "SELL", lot, reason="MANUAL SELL")
+        STATE["locked"] = False
+        begin_session_if_needed(SETUP["symbol"])
     return jsonify({"ok": ok, "msg": msg})
 
 @app.route("/api/action/add", methods=["POST"])
 def api_add():
     lot = float((request.get_json(force=True) or {}).get("lot", 0.01))
     side = "BUY" if SETUP["tpsm_auto"] else ("SELL" if SETUP["tpsb_auto"] else "BUY")
-    STATE["locked"] = True
-    ok, msg = order_send_with_fallback(SETUP["symbol"], side, lot)
-    STATE["locked"] = False
-    begin_session_if_needed(SETUP["symbol"])
+    with io_priority(PRIO_TRADE):
+        STATE["locked"] = True
+        ok, msg = order_send_with_fallback(SETUP["symbol"], side, lot)
+        STATE["locked"] = False
+        begin_session_if_needed(SETUP["symbol"])
     return jsonify({"ok": ok, "msg": msg})
 
 @app.route("/api/action/close", methods=["POST"])
@@ -1792,6 +3264,8 @@ def api_click_xy():
     except (ValueError, TypeError):
         return jsonify({"ok": False, "msg": "Coordinates must be integers"}), 400
 
+    if ACCOUNT_WORKER["login"] is not None:
+        return jsonify({"ok": False, "msg": "Klik manual tidak tersedia di mode worker (order lewat API)"}), 400
     try:
         print(f"[MANUAL_CLICK] Clicking at ({x},{y})", flush=True)
         _win_leftclick(x, y)
@@ -1815,6 +3289,15 @@ def api_be():
             return jsonify({"ok": False, "msg": "Gagal: Setup 'auto_bep' tidak ditemukan."})
     return jsonify({"ok": False, "msg": "Belum memenuhi syarat BE."})
 
+def _diag_read():
+    try: ti = mt5.terminal_info()
+    except Exception as e: ti = f"EXC {e}"
+    try: ai = mt5.account_info()
+    except Exception as e: ai = f"EXC {e}"
+    try: le = mt5.last_error()
+    except Exception as e: le = f"EXC {e}"
+    return ti, ai, le
+
 @app.route("/api/diag", methods=["GET"])
 def api_diag():
     if mt5 is None:
@@ -1833,13 +3316,7 @@ def api_diag():
                 "MT5_SYMBOL": CFG("MT5_SYMBOL"),
             }
         })
-    with MTX:
-        try: ti = mt5.terminal_info()
-        except Exception as e: ti = f"EXC {e}"
-        try: ai = mt5.account_info()
-        except Exception as e: ai = f"EXC {e}"
-        try: le = mt5.last_error()
-        except Exception as e: le = f"EXC {e}"
+    ti, ai, le = mt5_call(_diag_read)
     # Structured fields (best-effort)
     term = {
         "connected": bool(getattr(ti, 'connected', False)) if not isinstance(ti, str) else False,
@@ -1869,6 +3346,20 @@ def api_diag():
         }
     })
 
+@app.route("/api/diag/lock", methods=["GET"])
+def api_diag_lock():
+    """MTX contention profile: worst holders/waiters per call site and per thread."""
+    top = request.args.get("top", 15, type=int)
+    report = MTX.report(top)
+    summary = metrics_summary()["timers"]
+    report["mt5_call_latency"] = {k: v for k, v in summary.items() if k.startswith("mt5.")}
+    report["io"] = {"actor": MT5_IO["thread"] is not None, "queue_depth": MT5_IO["queue"].qsize(),
+                    "pending_reads": len(MT5_IO["pending"]),
+                    "queue_wait": {k: v for k, v in summary.items() if k.startswith("io.")}}
+    if request.args.get("reset"):
+        MTX.reset()
+    return jsonify(report)
+
 # ----------- Setup XY API ----------- 
 @app.route("/api/setup/xy", methods=["POST"])
 def api_setup_xy_save():
@@ -1937,6 +3428,8 @@ def api_setup_accounts_save():
                     valid_accounts.append(acc)
         SETUP["mt5_accounts"] = valid_accounts
         persist_save()
+        if CONTROLLER["on"]:
+            workers_start() # akun baru langsung dapat worker
         return jsonify({"ok": True, "saved": len(valid_accounts)})
     return jsonify({"ok": False, "msg": "Invalid payload"}), 400
 
@@ -1949,6 +3442,9 @@ def api_setup_accounts_select():
     
     SETUP["active_mt5_login"] = str(login)
     persist_save()
+    if CONTROLLER["on"]:
+        # Tiap akun sudah punya worker: cukup ganti worker yang ditampilkan dashboard
+        return jsonify({"ok": True, "msg": f"Dashboard menampilkan akun {login}."})
     
     # Memicu koneksi ulang dengan akun baru di thread terpisah
     Thread(target=mt5_restart, daemon=True).start()
@@ -1971,15 +3467,483 @@ def api_setup_symbols():
         return jsonify({"ok": True, "saved": unique_symbols})
     return jsonify({"ok": False, "msg": "Invalid payload, expected a list of symbols."}, 400)
 
+# ========== Multi-account workers ========== 
+# MetaTrader5 hanya bisa terhubung ke satu terminal per proses. Mode worker (MT5_WORKERS=1)
+# menjalankan satu proses engine per akun di SETUP["mt5_accounts"], masing-masing dengan
+# terminal sendiri (acc["path"], instalasi portable terpisah) dan file setup_<login>.json;
+# proses Flask menjadi controller yang mengumpulkan status worker lewat Pipe.
+WORKER_REPLY_TIMEOUT_SEC = 2.0
+WORKER_PROXY_TIMEOUT_SEC = 10.0 # order/close manual bisa retry beberapa detik di worker
+WORKERS = {}   # login -> {"proc", "conn", "lock", "copy_conn", "copy_lock", "copy_seq", "alias", "started", "seq"}
+# Endpoint yang dilayani controller sendiri; /api/ lain diteruskan ke worker akun terpilih
+CONTROLLER_ROUTES = ("/api/workers", "/api/copier", "/api/setup/accounts")
+CONTROLLER = {"on": False}
+
+def _worker_persist_file(login):
+    return os.path.join(os.path.dirname(PERSIST_FILE), f"setup_{login}.json")
+
+def _worker_handle(msg):
+    cmd = msg.get("cmd")
+    if cmd == "status":
+        if STATUS_CACHE["body"] is None:
+            publish_status()
+        return {"ok": True, "body": STATUS_CACHE["body"]}
+    if cmd == "metrics":
+        return {"ok": True, "metrics": metrics_summary()}
+    if cmd == "http":
+        # Request dashboard yang diteruskan controller, dijalankan lewat route Flask yang sama
+        with app.test_client() as client:
+            r = client.open(msg["path"], method=msg["method"], query_string=msg["query"],
+                            data=msg["body"], headers=msg["headers"])
+        return {"ok": True, "status": r.status_code, "body": r.get_data(),
+                "headers": {k: r.headers[k] for k in ("Content-Type", "ETag", "Cache-Control") if k in r.headers}}
+    if cmd == "setup":
+        for k, v in (msg.get("data") or {}).items():
+            if k in SETUP and k not in ("mt5_accounts", "active_mt5_login"):
+                if isinstance(SETUP[k], dict) and isinstance(v, dict):
+                    SETUP[k].update(v)
+                else:
+                    SETUP[k] = v
+        persist_save()
+        publish_status()
+        return {"ok": True}
+    if cmd == "copier_watch":
+        COPIER_WATCH["on"] = bool(msg.get("on"))
+        if COPIER_WATCH["on"] and COPIER_WATCH["thread"] is None:
+            COPIER_WATCH["thread"] = Thread(target=copier_watch_loop, name="copier-watch", daemon=True)
+            COPIER_WATCH["thread"].start()
+        return {"ok": True}
+    if cmd == "copy":
+        with io_priority(PRIO_TRADE):
+            return copier_apply(msg["event"], msg.get("rule") or {})
+    if cmd == "order":
+        with io_priority(PRIO_TRADE):
+            if msg.get("close"):
+                ok, res = close_single_position(int(msg["close"]), reason="MANUAL CLOSE")
+            else:
+                ok, res = order_send_with_fallback(msg.get("symbol") or SETUP["symbol"], msg.get("side", "BUY"),
+                                                   float(msg.get("lot", 0.01)), reason="MANUAL " + msg.get("side", "BUY"))
+        return {"ok": ok, "msg": res}
+    if cmd == "stop":
+        stop_flag.set()
+        return {"ok": True}
+    return {"ok": False, "msg": f"unknown-cmd:{cmd}"}
+
+# ---------- Trade copier: sisi worker ----------
+# Master: copier_watch_loop mem-poll posisi dan mengirim event open/close ke controller
+# lewat pipe event. Follower: copier_apply membuka/menutup posisi bertanda "CPY#<tiket master>".
+COPIER_POLL_SEC = 0.05
+COPIER_EQUITY_REFRESH_SEC = 5.0
+COPIER_WATCH = {"on": False, "thread": None, "events": None}
+
+def copier_watch_loop():
+    """Master side: diff positions every COPIER_POLL_SEC and emit open/close events."""
+    io_priority(PRIO_ENGINE) # poll baca saja: tidak boleh menyalip order_send sungguhan
+    known, equity, equity_ts = None, 0.0, 0.0
+    while not stop_flag.is_set():
+        if not COPIER_WATCH["on"] or mt5 is None or COPIER_WATCH["events"] is None:
+            known = None
+            stop_flag.wait(0.2)
+            continue
+        try:
+            current = {p.ticket: p for p in (mt5_call(mt5.positions_get) or [])}
+        except Exception:
+            stop_flag.wait(COPIER_POLL_SEC)
+            continue
+        now = time.time()
+        if now - equity_ts >= COPIER_EQUITY_REFRESH_SEC:
+            ai = account_snapshot()
+            equity, equity_ts = float(getattr(ai, "equity", 0.0) or 0.0), now
+        if known is None:
+            known = current # baseline: posisi yang sudah ada tidak disalin
+        events = []
+        for ticket, p in current.items():
+            if ticket not in known:
+                events.append({"type": "open", "ticket": int(ticket), "symbol": p.symbol,
+                               "side": "BUY" if p.type == mt5.POSITION_TYPE_BUY else "SELL",
+                               "volume": float(p.volume), "price": float(p.price_open),
+                               "master_equity": equity, "detected": now})
+        for ticket, p in known.items():
+            if ticket not in current:
+                events.append({"type": "close", "ticket": int(ticket), "symbol": p.symbol, "detected": now})
+        known = current
+        for ev in events:
+            try:
+                COPIER_WATCH["events"].send(ev)
+            except (EOFError, OSError):
+                COPIER_WATCH["on"] = False # controller mati
+        stop_flag.wait(COPIER_POLL_SEC)
+
+def _copier_lot(sym, ev, rule):
+    """Scale the master volume by the follower rule and snap it to the symbol's volume step."""
+    mode, value = rule.get("mode", "multiplier"), float(rule.get("value", 1.0))
+    if mode == "fixed":
+        lot = value
+    elif mode == "equity" and ev.get("master_equity"):
+        ai = account_snapshot()
+        lot = ev["volume"] * value * float(getattr(ai, "equity", 0.0) or 0.0) / ev["master_equity"]
+    else:
+        lot = ev["volume"] * value
+    try:
+        si = mt5_call(mt5.symbol_info, sym, prio=PRIO_TRADE)
+    except Exception:
+        si = None
+    step = float(getattr(si, "volume_step", 0.01) or 0.01)
+    vmin = float(getattr(si, "volume_min", step) or step)
+    vmax = float(getattr(si, "volume_max", 0.0) or 0.0)
+    lot = max(vmin, round(round(lot / step) * step, 8))
+    return min(lot, vmax) if vmax > 0 else lot
+
+def copier_apply(ev, rule):
+    """Follower side: replicate one master event; idempotent through the CPY#<ticket> comment."""
+    mapped = (rule.get("symbol_map") or {}).get(ev["symbol"], ev["symbol"])
+    # Nama broker follower bisa berbeda (XAUUSD -> XAUUSDc); resolve sekali, SETUP follower tidak diubah
+    sym = symbol_resolve(mapped)
+    if sym is None:
+        return {"ok": False, "msg": f"symbol-not-visible:{mapped}", "filled_at": time.time()}
+    tag = f"CPY#{ev['ticket']}"
+    if ev["type"] == "open":
+        if any(getattr(p, "comment", "") == tag for p in positions(sym)):
+            return {"ok": True, "msg": "already-copied", "filled_at": time.time()}
+        lot = _copier_lot(sym, ev, rule)
+        ok, msg = order_send_with_fallback(sym, ev["side"], lot, reason=tag)
+        return {"ok": ok, "msg": msg, "lot": lot, "filled_at": time.time()}
+    mine = [p for p in positions(sym) if getattr(p, "comment", "") == tag]
+    if not mine:
+        return {"ok": False, "msg": "no-copied-position", "filled_at": time.time()}
+    results = [close_single_position(p.ticket, reason="COPY CLOSE") for p in mine]
+    return {"ok": all(ok for ok, _ in results), "msg": ";".join(str(m) for _, m in results),
+            "filled_at": time.time()}
+
+def _worker_serve(conn):
+    """Answer controller requests arriving on `conn` until it closes or stop is set."""
+    while not stop_flag.is_set():
+        try:
+            msg = conn.recv()
+        except (EOFError, OSError):
+            break # controller mati
+        try:
+            reply = _worker_handle(msg)
+        except Exception as e:
+            reply = {"ok": False, "msg": str(e)}
+        reply["id"] = msg.get("id")
+        try:
+            conn.send(reply)
+        except (EOFError, OSError):
+            break
+
+def account_worker_main(acc, setup, conn, persist_file, events=None, copy_conn=None):
+    """Entry point of one account worker process: run the engine for `acc` and
+    answer controller requests arriving on `conn` until told to stop. Copier
+    commands come on their own `copy_conn` so they never queue behind dashboard
+    requests; copier events (master only) go out on the one-way `events` pipe."""
+    global PERSIST_FILE
+    COPIER_WATCH["events"] = events
+    login = str(acc.get("login"))
+    ACCOUNT_WORKER["login"] = login
+    if acc.get("path"):
+        os.environ["MT5_PATH"] = acc["path"]
+    PERSIST_FILE = persist_file
+    if os.path.exists(PERSIST_FILE):
+        persist_load()
+    else:
+        SETUP.update(setup) # akun baru: mulai dari setup controller
+    SETUP["mt5_accounts"] = [acc]
+    SETUP["active_mt5_login"] = login
+    persist_save()
+    boot()
+    if copy_conn is not None:
+        Thread(target=_worker_serve, args=(copy_conn,), name="copier-serve", daemon=True).start()
+    _worker_serve(conn)
+    stop_flag.set()
+    persist_flush(only_dirty=True) # proses anak multiprocessing tidak menjalankan atexit
+
+def workers_start():
+    """Spawn one worker per configured account that is not already running."""
+    ctx = multiprocessing.get_context("spawn") # sama seperti Windows, tanpa mewarisi state MT5
+    base = {k: v for k, v in SETUP.items() if k not in ("mt5_accounts", "active_mt5_login")}
+    for acc in SETUP.get("mt5_accounts", []):
+        login = str(acc.get("login"))
+        w = WORKERS.get(login)
+        if w and w["proc"].is_alive():
+            continue
+        parent, child = ctx.Pipe()
+        copy_parent, copy_child = ctx.Pipe()
+        ev_recv, ev_send = ctx.Pipe(duplex=False)
+        proc = ctx.Process(target=account_worker_main, name=f"worker-{login}", daemon=True,
+                           args=(acc, base, child, _worker_persist_file(login), ev_send, copy_child))
+        proc.start()
+        WORKERS[login] = {"proc": proc, "conn": parent, "events": ev_recv, "lock": threading.Lock(),
+                          "copy_conn": copy_parent, "copy_lock": threading.Lock(), "copy_seq": 0,
+                          "alias": acc.get("alias", login), "started": time.time(), "seq": 0,
+                          "copier_on": False}
+        print(f"[WORKER] started {login} pid={proc.pid}", flush=True)
+    if COPIER["thread"] is None:
+        COPIER["thread"] = Thread(target=_copier_relay, name="copier-relay", daemon=True)
+        COPIER["thread"].start()
+
+def worker_request(login, msg, timeout=WORKER_REPLY_TIMEOUT_SEC, channel=""):
+    """Send one command to a worker and wait for its reply; None if dead or too slow.
+    channel="copy" uses the copier's own pipe instead of the dashboard one."""
+    w = WORKERS.get(str(login))
+    if w is None or not w["proc"].is_alive():
+        return None
+    key = (channel + "_") if channel else ""
+    conn = w[key + "conn"]
+    with w[key + "lock"]:
+        w[key + "seq"] += 1
+        msg = dict(msg, id=w[key + "seq"])
+        deadline = time.time() + timeout
+        try:
+            conn.send(msg)
+            while conn.poll(max(0.0, deadline - time.time())):
+                reply = conn.recv()
+                if reply.get("id") == msg["id"]:
+                    return reply
+                # balasan telat dari request sebelumnya yang sudah timeout -> buang
+        except (EOFError, OSError) as e:
+            print(f"[WORKER] {login} pipe EXC: {e}", flush=True)
+    return None
+
+def workers_stop():
+    for login, w in list(WORKERS.items()):
+        if w["proc"].is_alive():
+            worker_request(login, {"cmd": "stop"}, timeout=1.0)
+            w["proc"].join(3)
+            if w["proc"].is_alive():
+                w["proc"].terminate()
+        WORKERS.pop(login, None)
+
+atexit.register(workers_stop)
+
+def _dashboard_login():
+    """Worker a dashboard request is for: ?login=, else the selected account, else the first worker."""
+    login = request.args.get("login")
+    if login:
+        return str(login)
+    active = str(SETUP.get("active_mt5_login") or "")
+    return active if active in WORKERS else next(iter(sorted(WORKERS)), None)
+
+def _with_accounts(body, login):
+    """Full status documents from a worker list only its own account; show the controller's list."""
+    doc = json.loads(body)
+    if doc.get("delta"):
+        return body
+    doc["mt5_accounts"] = SETUP.get("mt5_accounts", [])
+    doc["active_mt5_login"] = login
+    return json.dumps(doc, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+@app.before_request
+def _route_to_worker():
+    # Controller tidak punya engine/terminal sendiri: endpoint dashboard (status, candles,
+    # toggle, aksi) dijalankan oleh worker akun yang dipilih
+    if not CONTROLLER["on"] or not request.path.startswith("/api/") or request.path.startswith(CONTROLLER_ROUTES):
+        return None
+    if request.path == "/api/stream":
+        return Response(status=204) # SSE tidak diteruskan lewat pipe; 204 -> UI kembali polling
+    login = _dashboard_login()
+    if login is None:
+        return jsonify({"ok": False, "msg": "Belum ada worker akun yang berjalan"}), 503
+    reply = worker_request(login, {
+        "cmd": "http", "method": request.method, "path": request.path,
+        "query": request.query_string.decode("latin-1"), "body": request.get_data(),
+        "headers": {k: request.headers[k] for k in ("Content-Type", "If-None-Match") if k in request.headers},
+    }, timeout=WORKER_PROXY_TIMEOUT_SEC)
+    if not reply or not reply.get("ok"):
+        return jsonify({"ok": False, "msg": f"worker {login} tidak merespon"}), 503
+    body = reply["body"]
+    if request.path == "/api/status" and reply["status"] == 200:
+        body = _with_accounts(body, login)
+    return Response(body, status=reply["status"], headers=reply["headers"])
+
+# ---------- Trade copier: sisi controller ----------
+# Relay menerima event dari worker master dan menyerahkannya ke satu jalur (thread tunggal)
+# per follower tanpa menunggu: follower dilayani paralel, urutan open/close per follower
+# tetap terjaga. Perintah copy lewat pipe copier tiap worker, tidak antri di belakang
+# request dashboard. Latency deteksi-master -> fill-follower dicatat per follower.
+COPIER_REPLY_TIMEOUT_SEC = 5.0
+COPIER = {"thread": None, "lanes": {}, "events": deque(maxlen=100)}
+
+def _copier_lane(login):
+    lane = COPIER["lanes"].get(login)
+    if lane is None:
+        lane = COPIER["lanes"][login] = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"copier-{login}")
+    return lane
+
+def _copier_result(ev, login, r):
+    latency = (r["filled_at"] - ev["detected"]) if r and r.get("filled_at") else None
+    if r and r.get("ok") and latency is not None:
+        metric_observe("copier.latency", latency)
+        metric_observe(f"copier.{login}", latency)
+    else:
+        metric_inc("copier_failures")
+    return {"ok": bool(r and r.get("ok")), "msg": r.get("msg") if r else "timeout",
+            "lot": r.get("lot") if r else None,
+            "latency_ms": round(latency * 1000, 1) if latency is not None else None}
+
+def _copier_report(ev, results):
+    print(f"[COPIER] {ev['type']} #{ev['ticket']} {ev['symbol']} -> " +
+          ", ".join(f"{k}:{'OK' if v['ok'] else v['msg']}" for k, v in results.items()), flush=True)
+    COPIER["events"].appendleft(dict(ev, relay_ms=round((ev["relayed"] - ev["detected"]) * 1000, 1),
+                                     followers=results))
+
+def _copier_fanout(master, ev):
+    """Queue `ev` on every follower's lane; the event is reported once the last one finished."""
+    followers = {str(k): v for k, v in (SETUP["copier"].get("followers") or {}).items()
+                 if str(k) != master and str(k) in WORKERS}
+    if not followers:
+        return
+    results, lock = {}, threading.Lock()
+    def send(login, rule):
+        try:
+            r = worker_request(login, {"cmd": "copy", "event": ev, "rule": rule},
+                               COPIER_REPLY_TIMEOUT_SEC, channel="copy")
+            res = _copier_result(ev, login, r)
+        except Exception as e:
+            res = {"ok": False, "msg": str(e), "lot": None, "latency_ms": None}
+        with lock:
+            results[login] = res
+            done = len(results) == len(followers)
+        if done:
+            _copier_report(ev, results)
+    for login, rule in followers.items():
+        _copier_lane(login).submit(send, login, rule)
+
+def _copier_relay():
+    while not stop_flag.is_set():
+        cfg = SETUP["copier"]
+        master = str(cfg.get("master") or "")
+        w = WORKERS.get(master)
+        for login, other in list(WORKERS.items()):
+            if other.get("copier_on") and (login != master or not cfg.get("enabled")):
+                worker_request(login, {"cmd": "copier_watch", "on": False}, channel="copy")
+                other["copier_on"] = False
+        if not cfg.get("enabled") or w is None or not w["proc"].is_alive():
+            stop_flag.wait(0.5)
+            continue
+        if not w["copier_on"]:
+            r = worker_request(master, {"cmd": "copier_watch", "on": True}, channel="copy")
+            w["copier_on"] = bool(r and r.get("ok"))
+        try:
+            if not w["events"].poll(0.5):
+                continue
+            ev = w["events"].recv()
+        except (EOFError, OSError):
+            w["copier_on"] = False
+            stop_flag.wait(0.5)
+            continue
+        ev["relayed"] = time.time()
+        try:
+            _copier_fanout(master, ev)
+        except Exception as e:
+            print("[COPIER] fanout EXC:", e, flush=True)
+            traceback.print_exc()
+
+@app.route("/api/copier", methods=["GET", "POST"])
+def api_copier():
+    cfg = SETUP["copier"]
+    if request.method == "POST":
+        data = request.get_json(force=True) or {}
+        if "enabled" in data:
+            cfg["enabled"] = bool(data["enabled"])
+        if "master" in data:
+            cfg["master"] = str(data["master"])
+        if isinstance(data.get("followers"), dict):
+            rules = {}
+            for login, rule in data["followers"].items():
+                rule = rule if isinstance(rule, dict) else {}
+                if rule.get("mode", "multiplier") not in ("multiplier", "fixed", "equity"):
+                    return jsonify({"ok": False, "msg": f"mode tidak dikenal untuk {login}"}), 400
+                rules[str(login)] = {"mode": rule.get("mode", "multiplier"), "value": float(rule.get("value", 1.0)),
+                                     "symbol_map": rule.get("symbol_map") or {}}
+            cfg["followers"] = rules
+        persist_save()
+    timers = metrics_summary()["timers"]
+    master = WORKERS.get(str(cfg.get("master")))
+    return jsonify({
+        "ok": True, "config": cfg,
+        "relay_running": COPIER["thread"] is not None,
+        "master_watching": bool(master and master.get("copier_on")),
+        "latency": {k: v for k, v in timers.items() if k.startswith("copier.")},
+        "events": list(COPIER["events"]),
+    })
+
+@app.route("/api/workers", methods=["GET"])
+def api_workers():
+    rows = []
+    totals = {"equity": 0.0, "float_pl": 0.0, "daily_pl": 0.0, "open_count": 0}
+    for login, w in list(WORKERS.items()):
+        reply = worker_request(login, {"cmd": "status"})
+        status = json.loads(reply["body"]) if reply and reply.get("ok") else None
+        summary = None
+        if status:
+            summary = {k: status.get(k) for k in ("online", "symbol", "equity", "daily_pl", "float_pl",
+                                                  "open_count", "auto_mode", "cooldown", "currency")}
+            for k in totals:
+                totals[k] += status.get(k) or 0
+        rows.append({"login": login, "alias": w["alias"], "pid": w["proc"].pid, "alive": w["proc"].is_alive(),
+                     "uptime_sec": time.time() - w["started"], "status": summary})
+    return jsonify({"ok": True, "workers": rows, "totals": totals})
+
+@app.route("/api/workers/<login>/status", methods=["GET"])
+def api_worker_status(login):
+    reply = worker_request(login, {"cmd": "status"})
+    if not reply:
+        return jsonify({"ok": False, "msg": f"worker {login} tidak merespon"}), 503
+    return Response(reply["body"], mimetype="application/json")
+
+@app.route("/api/workers/<login>/metrics", methods=["GET"])
+def api_worker_metrics(login):
+    reply = worker_request(login, {"cmd": "metrics"})
+    if not reply:
+        return jsonify({"ok": False, "msg": f"worker {login} tidak merespon"}), 503
+    return jsonify(reply["metrics"])
+
+@app.route("/api/workers/<login>/setup", methods=["POST"])
+def api_worker_setup(login):
+    reply = worker_request(login, {"cmd": "setup", "data": request.get_json(force=True) or {}})
+    if not reply:
+        return jsonify({"ok": False, "msg": f"worker {login} tidak merespon"}), 503
+    return jsonify(reply)
+
+@app.route("/api/workers/<login>/order", methods=["POST"])
+def api_worker_order(login):
+    data = request.get_json(force=True) or {}
+    if not data.get("close") and data.get("side") not in ("BUY", "SELL"):
+        return jsonify({"ok": False, "msg": "side must be BUY|SELL, or pass close=<ticket>"}), 400
+    reply = worker_request(login, dict(data, cmd="order"))
+    if not reply:
+        return jsonify({"ok": False, "msg": f"worker {login} tidak merespon"}), 503
+    return jsonify(reply)
+
+@app.route("/api/workers/<action>", methods=["POST"])
+def api_workers_action(action):
+    if action == "start":
+        workers_start()
+    elif action == "stop":
+        workers_stop()
+    else:
+        return jsonify({"ok": False, "msg": "action must be start|stop"}), 400
+    return jsonify({"ok": True, "workers": sorted(WORKERS)})
+
 # ========== Boot ========== 
 def boot():
+    persist_start()
+    mt5_io_start()
     ok = mt5_init()
     print(f"[MT5] initialized = {ok} | symbol: {SETUP['symbol']}", flush=True)
     symbol_ensure(SETUP["symbol"])
+    journal_start() # warm restart: state engine dari journal, sebelum engine_loop jalan
     Thread(target=cooldown_worker, daemon=True).start()
     Thread(target=engine_loop, daemon=True).start()
+    Thread(target=tick_watcher, name="tick-watcher", daemon=True).start()
+    Thread(target=quote_worker, name="quotes", daemon=True).start()
 
 if __name__ == "__main__":
-    boot()
+    if os.environ.get("MT5_WORKERS") == "1":
+        CONTROLLER["on"] = True
+        workers_start() # controller: satu proses engine per akun, lihat /api/workers
+    else:
+        boot()
     app.run(host="0.0.0.0", port=5000, debug=False)
 
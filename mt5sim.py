@@ -0,0 +1,403 @@
+# mt5sim.py — Simulated MetaTrader5 terminal (pure Python + NumPy)
+# Drop-in untuk modul MetaTrader5 di host tanpa terminal (Linux build box, benchmark).
+# Dipilih dari control.py dengan env MT5_BACKEND=sim.
+#
+# Env:
+#   MT5_SIM_LATENCY_MS  latency per panggilan API (default 0)
+#   MT5_SIM_SEED        seed RNG untuk price path sintetis (default 7)
+#   MT5_SIM_SPEED       detik simulasi per detik wall-clock (default 1.0)
+#   MT5_SIM_STEP_MS     resolusi price path / interval tick (default 1000)
+#   MT5_SIM_HISTORY_SEC panjang history yang disiapkan sebelum "sekarang" (default 86400)
+#   MT5_SIM_FEED        recorded path: "file.csv" (untuk MT5_SYMBOL) atau "SYM=file.csv,SYM2=file2.csv"
+#                       CSV: time,bid[,ask] (epoch detik), baris header diabaikan
+#   MT5_SIM_SYMBOLS     simbol tambahan "NAME:price[:contract_size]" dipisah koma
+#   MT5_SIM_BALANCE     saldo awal akun (default 10000)
+
+import os, time, fnmatch
+from collections import namedtuple
+from datetime import datetime
+from threading import RLock
+
+import numpy as np
+
+# ========== Konstanta (nilai sama dengan modul MetaTrader5) ==========
+TIMEFRAME_M1, TIMEFRAME_M5, TIMEFRAME_M15, TIMEFRAME_M30 = 1, 5, 15, 30
+TIMEFRAME_H1, TIMEFRAME_H4, TIMEFRAME_D1 = 16385, 16388, 16408
+_TF_SEC = {1: 60, 5: 300, 15: 900, 30: 1800, 16385: 3600, 16388: 14400, 16408: 86400}
+
+ORDER_TYPE_BUY, ORDER_TYPE_SELL = 0, 1
+POSITION_TYPE_BUY, POSITION_TYPE_SELL = 0, 1
+DEAL_TYPE_BUY, DEAL_TYPE_SELL = 0, 1
+DEAL_ENTRY_IN, DEAL_ENTRY_OUT = 0, 1
+ORDER_FILLING_FOK, ORDER_FILLING_IOC, ORDER_FILLING_RETURN = 0, 1, 2
+TRADE_ACTION_DEAL = 1
+TRADE_RETCODE_PLACED = 10008
+TRADE_RETCODE_DONE = 10009
+TRADE_RETCODE_INVALID = 10013
+TRADE_RETCODE_INVALID_VOLUME = 10014
+TRADE_RETCODE_NO_MONEY = 10019
+TRADE_RETCODE_POSITION_CLOSED = 10036
+
+RATES_DTYPE = np.dtype([('time', '<i8'), ('open', '<f8'), ('high', '<f8'), ('low', '<f8'),
+                        ('close', '<f8'), ('tick_volume', '<u8'), ('spread', '<i4'), ('real_volume', '<u8')])
+
+Tick = namedtuple("Tick", "time bid ask last volume time_msc flags volume_real")
+SymbolInfo = namedtuple("SymbolInfo", "name visible select filling_mode digits point spread "
+                        "trade_contract_size volume_min volume_step bid ask last time")
+TradePosition = namedtuple("TradePosition", "ticket time time_msc type magic identifier volume "
+                           "price_open price_current sl tp swap profit symbol comment")
+TradeDeal = namedtuple("TradeDeal", "ticket order time time_msc type entry magic position_id "
+                       "volume price commission swap profit fee symbol comment")
+OrderSendResult = namedtuple("OrderSendResult", "retcode deal order volume price bid ask comment request_id request")
+TerminalInfo = namedtuple("TerminalInfo", "connected trade_allowed name company path data_path build ping_last")
+AccountInfo = namedtuple("AccountInfo", "login server name currency currency_digits leverage balance "
+                         "equity profit margin margin_free trade_allowed")
+
+def _env(k, default):
+    v = os.environ.get(k)
+    return type(default)(v) if v not in (None, "") else default
+
+# ========== Katalog simbol ==========
+# name -> (harga awal, contract size, digits, volatilitas per detik)
+_CATALOG = {
+    "XAUUSDc": (2400.0, 100.0, 3, 0.00006), "XAUUSDm": (2400.0, 100.0, 3, 0.00006),
+    "BTCUSDc": (60000.0, 1.0, 2, 0.00012),  "BTCUSDm": (60000.0, 1.0, 2, 0.00012),
+    "ETHUSDc": (3000.0, 1.0, 2, 0.00015),   "ETHUSDm": (3000.0, 1.0, 2, 0.00015),
+    "XAGUSDc": (30.0, 5000.0, 3, 0.00008),  "XAGUSDm": (30.0, 5000.0, 3, 0.00008),
+    "EURUSDc": (1.08, 100000.0, 5, 0.00002), "EURUSDm": (1.08, 100000.0, 5, 0.00002),
+    "GBPUSDc": (1.27, 100000.0, 5, 0.00002), "GBPUSDm": (1.27, 100000.0, 5, 0.00002),
+    "USDJPYc": (150.0, 100000.0, 3, 0.00002), "USDJPYm": (150.0, 100000.0, 3, 0.00002),
+    "AUDUSDc": (0.66, 100000.0, 5, 0.00002), "AUDUSDm": (0.66, 100000.0, 5, 0.00002),
+    "USOILc": (78.0, 1000.0, 3, 0.00008),    "USOILm": (78.0, 1000.0, 3, 0.00008),
+    "US30c": (39000.0, 1.0, 1, 0.00005),     "US30m": (39000.0, 1.0, 1, 0.00005),
+}
+for _item in filter(None, os.environ.get("MT5_SIM_SYMBOLS", "").split(",")):
+    _parts = _item.strip().split(":")
+    _CATALOG[_parts[0]] = (float(_parts[1]), float(_parts[2]) if len(_parts) > 2 else 1.0, 3, 0.00006)
+
+# ========== State terminal ==========
+_LOCK = RLock()
+_S = {
+    "initialized": False, "connected": False, "login": 0, "server": "Sim-Server",
+    "latency": _env("MT5_SIM_LATENCY_MS", 0.0) / 1000.0,
+    "speed": _env("MT5_SIM_SPEED", 1.0),
+    "step": _env("MT5_SIM_STEP_MS", 1000.0) / 1000.0,
+    "history_sec": _env("MT5_SIM_HISTORY_SEC", 86400),
+    "t0_wall": time.time(), "t0_mono": time.monotonic(), "offset": 0.0,
+    "balance": _env("MT5_SIM_BALANCE", 10000.0),
+    "visible": set(),
+    "paths": {},        # sym -> {"origin": epoch, "mid": ndarray, "spread": float, "vol", "recorded"}
+    "positions": {},    # ticket -> dict
+    "deals": [],        # list of TradeDeal
+    "next_ticket": 100000,
+    "last_error": (1, "Success"),
+}
+_RNG = np.random.default_rng(_env("MT5_SIM_SEED", 7))
+
+def _lat():
+    if _S["latency"] > 0:
+        time.sleep(_S["latency"])
+
+def _now():
+    """Simulated epoch seconds (float)."""
+    return _S["t0_wall"] + (time.monotonic() - _S["t0_mono"]) * _S["speed"] + _S["offset"]
+
+def _ticket():
+    _S["next_ticket"] += 1
+    return _S["next_ticket"]
+
+def _load_feed(path):
+    rows = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            cols = line.strip().split(",")
+            try:
+                t, bid = float(cols[0]), float(cols[1])
+            except (ValueError, IndexError):
+                continue # header / baris rusak
+            ask = float(cols[2]) if len(cols) > 2 and cols[2] else bid
+            rows.append((t, bid, ask))
+    if not rows:
+        raise ValueError(f"feed kosong: {path}")
+    arr = np.array(rows)
+    return arr[:, 0], (arr[:, 1] + arr[:, 2]) / 2.0, float(np.median(arr[:, 2] - arr[:, 1]))
+
+def _feeds():
+    spec = os.environ.get("MT5_SIM_FEED", "")
+    out = {}
+    for item in filter(None, spec.split(",")):
+        sym, _, path = item.rpartition("=")
+        out[sym or os.environ.get("MT5_SYMBOL", "XAUUSDc")] = path
+    return out
+
+def _path(sym):
+    """Per-symbol mid price path on a fixed step grid, extended lazily up to now."""
+    p = _S["paths"].get(sym)
+    if p is None:
+        price, contract, digits, vol = _CATALOG[sym]
+        step = _S["step"]
+        feed = _feeds().get(sym)
+        if feed:
+            ts, mids, spread = _load_feed(feed)
+            # Replay: "sekarang" dipetakan ke titik warm-up di dalam rekaman
+            warm = min(_S["history_sec"], (ts[-1] - ts[0]) / 2.0)
+            grid = np.arange(ts[0], ts[-1] + step, step)
+            p = {"origin": _now() - warm, "mid": np.interp(grid, ts, mids), "spread": spread,
+                 "vol": vol, "recorded": True}
+        else:
+            n = int(_S["history_sec"] / step) + 1
+            rets = _RNG.normal(0.0, vol * np.sqrt(step), n)
+            p = {"origin": _now() - (n - 1) * step, "mid": price * np.exp(np.cumsum(rets)),
+                 "spread": price * 0.00005, "vol": vol, "recorded": False}
+        _S["paths"][sym] = p
+    need = int((_now() - p["origin"]) / _S["step"]) + 1
+    have = len(p["mid"])
+    if need > have:
+        # Sintetis: perpanjang random walk; rekaman yang habis juga dilanjutkan dari harga terakhir
+        chunk = max(need - have, 3600)
+        rets = _RNG.normal(0.0, p["vol"] * np.sqrt(_S["step"]), chunk)
+        p["mid"] = np.concatenate([p["mid"], p["mid"][-1] * np.exp(np.cumsum(rets))])
+    return p, need - 1
+
+def _quote(sym):
+    p, i = _path(sym)
+    mid = float(p["mid"][i])
+    half = p["spread"] / 2.0
+    digits = _CATALOG[sym][2]
+    t = p["origin"] + i * _S["step"]
+    return round(mid - half, digits), round(mid + half, digits), t
+
+def _symbol_info(sym):
+    price, contract, digits, vol = _CATALOG[sym]
+    bid, ask, t = _quote(sym)
+    point = 10.0 ** -digits
+    return SymbolInfo(sym, sym in _S["visible"], sym in _S["visible"], 2, digits, point,
+                      int(round((ask - bid) / point)), contract, 0.01, 0.01, bid, ask, bid, int(t))
+
+# ========== Terminal / akun ==========
+def initialize(path=None, **kwargs):
+    _lat()
+    with _LOCK:
+        _S["initialized"] = _S["connected"] = True
+        if kwargs.get("login"):
+            _S["login"] = int(kwargs["login"])
+        return True
+
+def login(login, password=None, server=None, timeout=None):
+    _lat()
+    with _LOCK:
+        if not _S["initialized"]:
+            _S["last_error"] = (-10004, "No IPC connection")
+            return False
+        _S["login"], _S["server"] = int(login), str(server or _S["server"])
+        return True
+
+def shutdown():
+    with _LOCK:
+        _S["initialized"] = _S["connected"] = False
+        return True
+
+def last_error():
+    return _S["last_error"]
+
+def terminal_info():
+    _lat()
+    with _LOCK:
+        if not _S["initialized"]:
+            return None
+        return TerminalInfo(_S["connected"], True, "MetaTrader 5 (sim)", "Sim Ltd.",
+                            os.path.dirname(os.path.abspath(__file__)), "", 4000, 1000)
+
+def _floating():
+    total, margin = 0.0, 0.0
+    for pos in _S["positions"].values():
+        total += _position_tuple(pos).profit
+        contract = _CATALOG[pos["symbol"]][1]
+        margin += pos["volume"] * contract * pos["price_open"] / 100.0 # leverage 1:100
+    return total, margin
+
+def account_info():
+    _lat()
+    with _LOCK:
+        if not _S["initialized"] or not _S["login"]:
+            return None
+        profit, margin = _floating()
+        equity = _S["balance"] + profit
+        return AccountInfo(_S["login"], _S["server"], "Sim", "USD", 2, 100, round(_S["balance"], 2),
+                           round(equity, 2), round(profit, 2), round(margin, 2), round(equity - margin, 2), True)
+
+# ========== Simbol & harga ==========
+def symbol_info(symbol):
+    _lat()
+    with _LOCK:
+        if symbol not in _CATALOG:
+            return None
+        return _symbol_info(symbol)
+
+def symbol_select(symbol, enable=True):
+    _lat()
+    with _LOCK:
+        if symbol not in _CATALOG:
+            return False
+        (_S["visible"].add if enable else _S["visible"].discard)(symbol)
+        return True
+
+def symbols_get(group=None):
+    """group: comma separated wildcard patterns, '!' prefix excludes (as in MT5)."""
+    _lat()
+    with _LOCK:
+        names = list(_CATALOG)
+        if group:
+            pats = [g.strip() for g in group.split(",") if g.strip()]
+            inc = [g for g in pats if not g.startswith("!")]
+            exc = [g[1:] for g in pats if g.startswith("!")]
+            names = [n for n in names if any(fnmatch.fnmatchcase(n, g) for g in inc)
+                     and not any(fnmatch.fnmatchcase(n, g) for g in exc)]
+        return tuple(_symbol_info(n) for n in names)
+
+def symbol_info_tick(symbol):
+    _lat()
+    with _LOCK:
+        if symbol not in _CATALOG:
+            return None
+        bid, ask, t = _quote(symbol)
+        return Tick(int(t), bid, ask, 0.0, 0, int(t * 1000), 6, 0.0)
+
+def copy_rates_from_pos(symbol, timeframe, start_pos, count):
+    _lat()
+    with _LOCK:
+        if symbol not in _CATALOG or timeframe not in _TF_SEC or count <= 0:
+            return None
+        p, i_now = _path(symbol)
+        step, tf = _S["step"], _TF_SEC[timeframe]
+        t_now = p["origin"] + i_now * step
+        bar_last = (int(t_now) // tf - start_pos) * tf
+        bar_first = bar_last - (count - 1) * tf
+        i0 = max(0, int(np.ceil((bar_first - p["origin"]) / step)))
+        i1 = min(i_now, int((bar_last + tf - p["origin"]) / step - 1e-9))
+        if i1 < i0:
+            return np.empty(0, dtype=RATES_DTYPE)
+        mids = p["mid"][i0:i1 + 1]
+        times = (p["origin"] + np.arange(i0, i1 + 1) * step).astype(np.int64) // tf * tf
+        starts = np.flatnonzero(np.r_[True, times[1:] != times[:-1]])
+        out = np.zeros(len(starts), dtype=RATES_DTYPE)
+        out['time'] = times[starts]
+        out['open'] = mids[starts]
+        out['high'] = np.maximum.reduceat(mids, starts)
+        out['low'] = np.minimum.reduceat(mids, starts)
+        out['close'] = mids[np.r_[starts[1:] - 1, len(mids) - 1]]
+        out['tick_volume'] = np.diff(np.r_[starts, len(mids)])
+        out['spread'] = int(round(p["spread"] / 10.0 ** -_CATALOG[symbol][2]))
+        return out[-count:]
+
+# ========== Posisi, order, history ==========
+def _position_tuple(pos):
+    bid, ask, _ = _quote(pos["symbol"])
+    contract = _CATALOG[pos["symbol"]][1]
+    if pos["type"] == POSITION_TYPE_BUY:
+        cur, profit = bid, (bid - pos["price_open"]) * pos["volume"] * contract
+    else:
+        cur, profit = ask, (pos["price_open"] - ask) * pos["volume"] * contract
+    return TradePosition(pos["ticket"], int(pos["time"]), int(pos["time"] * 1000), pos["type"], pos["magic"],
+                         pos["ticket"], pos["volume"], pos["price_open"], cur, 0.0, 0.0, 0.0,
+                         round(profit, 2), pos["symbol"], pos["comment"])
+
+def positions_get(symbol=None, group=None, ticket=None):
+    _lat()
+    with _LOCK:
+        out = []
+        for pos in _S["positions"].values():
+            if symbol is not None and pos["symbol"] != symbol: continue
+            if ticket is not None and pos["ticket"] != ticket: continue
+            if group is not None and not fnmatch.fnmatchcase(pos["symbol"], group): continue
+            out.append(_position_tuple(pos))
+        return tuple(out)
+
+def positions_total():
+    with _LOCK:
+        return len(_S["positions"])
+
+def _deal(order, now, dtype, entry, magic, position_id, volume, price, profit, symbol, comment):
+    d = TradeDeal(_ticket(), order, int(now), int(now * 1000), dtype, entry, magic, position_id,
+                  volume, price, 0.0, 0.0, round(profit, 2), 0.0, symbol, comment)
+    _S["deals"].append(d)
+    return d
+
+def order_send(request):
+    _lat()
+    with _LOCK:
+        req = dict(request or {})
+        sym = req.get("symbol")
+        vol = float(req.get("volume") or 0.0)
+        otype = req.get("type")
+        def _res(code, comment, deal=0, order=0, price=0.0):
+            return OrderSendResult(code, deal, order, vol, price, 0.0, 0.0, comment, 0, req)
+        if not _S["connected"]:
+            return None
+        if req.get("action") != TRADE_ACTION_DEAL or sym not in _CATALOG or otype not in (0, 1):
+            return _res(TRADE_RETCODE_INVALID, "Invalid request")
+        if vol <= 0:
+            return _res(TRADE_RETCODE_INVALID_VOLUME, "Invalid volume")
+        bid, ask, _ = _quote(sym)
+        price = ask if otype == ORDER_TYPE_BUY else bid
+        now = _now()
+        order = _ticket()
+        contract = _CATALOG[sym][1]
+        magic, comment = int(req.get("magic") or 0), str(req.get("comment") or "")[:31]
+        pos_ticket = req.get("position")
+        if pos_ticket:
+            pos = _S["positions"].get(int(pos_ticket))
+            if pos is None:
+                return _res(TRADE_RETCODE_POSITION_CLOSED, "Position doesn't exist")
+            vol = min(vol, pos["volume"])
+            sign = 1.0 if pos["type"] == POSITION_TYPE_BUY else -1.0
+            profit = (price - pos["price_open"]) * vol * contract * sign
+            d = _deal(order, now, otype, DEAL_ENTRY_OUT, magic, pos["ticket"], vol, price, profit, sym, comment)
+            _S["balance"] += profit
+            pos["volume"] = round(pos["volume"] - vol, 8)
+            if pos["volume"] <= 0:
+                del _S["positions"][pos["ticket"]]
+        else:
+            _, margin = _floating()
+            if (vol * contract * price / 100.0) > (_S["balance"] - margin) * 10:
+                return _res(TRADE_RETCODE_NO_MONEY, "No money")
+            ticket = order
+            _S["positions"][ticket] = {"ticket": ticket, "time": now, "type": otype, "magic": magic,
+                                       "volume": vol, "price_open": price, "symbol": sym, "comment": comment}
+            d = _deal(order, now, otype, DEAL_ENTRY_IN, magic, ticket, vol, price, 0.0, sym, comment)
+        return _res(TRADE_RETCODE_DONE, "Request executed", d.ticket, order, price)
+
+def _ts(v):
+    return v.timestamp() if isinstance(v, datetime) else float(v)
+
+def history_deals_get(date_from=None, date_to=None, group=None, ticket=None, position=None):
+    _lat()
+    with _LOCK:
+        if position is not None:
+            return tuple(d for d in _S["deals"] if d.position_id == position)
+        if ticket is not None:
+            return tuple(d for d in _S["deals"] if d.ticket == ticket)
+        lo, hi = _ts(date_from), _ts(date_to)
+        return tuple(d for d in _S["deals"] if lo <= d.time <= hi
+                     and (group is None or fnmatch.fnmatchcase(d.symbol, group)))
+
+# ========== Kontrol simulasi (bukan bagian API MetaTrader5) ==========
+def sim_set_latency(ms):
+    _S["latency"] = max(0.0, float(ms)) / 1000.0
+
+def sim_advance(seconds):
+    """Move the simulated clock forward without waiting."""
+    with _LOCK:
+        _S["offset"] += float(seconds)
+
+def sim_add_symbol(name, price, contract_size=1.0, digits=3, vol=0.00006):
+    with _LOCK:
+        _CATALOG[name] = (float(price), float(contract_size), int(digits), float(vol))
+
+def sim_reset(balance=None):
+    """Drop all positions and deals (price paths are kept)."""
+    with _LOCK:
+        _S["positions"].clear()
+        _S["deals"].clear()
+        if balance is not None:
+            _S["balance"] = float(balance)
@@ -0,0 +1,284 @@
+# sweep.py — Sweep parameter strategi SR bounce secara paralel di atas backtest offline
+# Setiap kombinasi setting dievaluasi dengan backtest.simulate (aturan sr_auto_trade +
+# exit TPSM/TPSB, trailing stop dan session_tick) memakai semua core lewat process pool.
+# Histori M1 dan jalur harganya dimuat sekali di proses induk lalu dibagi ke worker lewat
+# shared memory (tidak dipickle per task). Kombinasi diurutkan per (lookback, near_pct)
+# supaya zona SR yang sama dihitung sekali per worker. Hasil diranking per --rank.
+#
+# Parameter (--param KEY=v1,v2,... atau KEY=awal:akhir:step, akhir ikut):
+#   lookback, near_pct, trailing, tp, sl          tp/sl = target yang sama di semua baris
+#   tpsm.<n>.pos / tpsm.<n>.neg, tpsb.<n>.pos / tpsb.<n>.neg   baris ke-n (mulai 1) click_xy
+#   session.profit_target, session.loss_limit, session.max_duration_sec
+# Parameter yang tidak di-sweep memakai nilai SETUP (setup.json).
+#
+# Contoh:
+#   python sweep.py --csv XAUUSD_M1.csv -p lookback=10:40:5 -p near_pct=5,10,15 -p tp=0.03:0.1:0.01
+#   python sweep.py --symbol XAUUSDc --bars 200000 -p session.max_duration_sec=300,540,900 -p trailing=0,1,2
+#   python sweep.py --csv XAUUSD_M1.csv -p tpsb.1.pos=0.02:0.2:0.02 -p sl=-0.3:-0.05:0.05 --samples 200 --out sweep.csv
+
+import os, csv, json, math, time, random, argparse
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import control
+import backtest
+
+INT_PARAMS = ("lookback", "session.max_duration_sec")
+ROW_FUNCS = {"tpsm": 0, "tpsb": 1}
+RANK_KEYS = ("net_profit", "profit_factor", "win_rate", "max_drawdown", "trades")
+LOWER_IS_BETTER = ("max_drawdown",)
+
+# State per proses worker (diisi _attach)
+WORKER = {"shm": [], "rates": None, "path": None, "base": None, "sim": None, "zones_key": None, "zones": None}
+
+def parse_param(text):
+    """'key=v1,v2' or 'key=start:stop:step' (stop inclusive) -> (key, [values])."""
+    key, sep, spec = text.partition("=")
+    key = key.strip()
+    if not sep or not spec:
+        raise ValueError(f"expected KEY=VALUES, got {text!r}")
+    if not _valid_key(key):
+        raise ValueError(f"unknown parameter {key!r}")
+    if ":" in spec:
+        start, stop, step = (float(x) for x in spec.split(":"))
+        if step <= 0:
+            raise ValueError(f"{key}: step must be > 0")
+        count = int(math.floor((stop - start) / step + 1e-9)) + 1
+        values = [round(start + i * step, 10) for i in range(max(0, count))]
+    else:
+        values = [float(x) for x in spec.split(",") if x.strip()]
+    if key in INT_PARAMS:
+        values = [int(round(v)) for v in values]
+    values = list(dict.fromkeys(values))
+    if not values:
+        raise ValueError(f"{key}: no values")
+    return key, values
+
+def _valid_key(key):
+    if key in ("lookback", "near_pct", "trailing", "tp", "sl"):
+        return True
+    parts = key.split(".")
+    if parts[0] == "session":
+        return len(parts) == 2 and parts[1] in ("profit_target", "loss_limit", "max_duration_sec")
+    return (len(parts) == 3 and parts[0] in ROW_FUNCS and parts[1].isdigit()
+            and int(parts[1]) >= 1 and parts[2] in ("pos", "neg"))
+
+def base_config(setup, use_session=True):
+    """Simulation settings taken from SETUP; every sweep config overrides a subset of them."""
+    tpsm_rows, tpsb_rows = backtest.exit_rows(setup)
+    session = setup["session"]
+    return {
+        "lookback": int(setup["sr"]["candle_lookback"]),
+        "near_pct": float(setup["sr"]["near_pct"]),
+        "rows": [tpsm_rows, tpsb_rows],
+        "session": {k: session[k] for k in ("profit_target", "loss_limit", "max_duration_sec")} if use_session else None,
+        "trailing": float(setup.get("trailing_stop_value", 0.0)),
+    }
+
+def resolve(base, params):
+    """Apply one config's overrides to `base`; returns simulate() keyword arguments."""
+    rows = [list(r) for r in base["rows"]]
+    session = dict(base["session"]) if base["session"] else None
+    out = {"lookback": base["lookback"], "near_pct": base["near_pct"], "trailing": base["trailing"]}
+    # tp/sl dulu (semua baris), baru override per baris
+    for key in sorted(params, key=lambda k: k not in ("tp", "sl")):
+        value = params[key]
+        if key in out:
+            out[key] = value
+        elif key in ("tp", "sl"):
+            for func_rows in rows:
+                if not func_rows:
+                    func_rows.extend([(0.0, 0.0)] * backtest.MAX_POSITIONS)
+                func_rows[:] = [(neg, value) if key == "tp" else (value, pos) for neg, pos in func_rows]
+        elif key.startswith("session."):
+            if session is None:
+                raise ValueError(f"{key} swept with session simulation disabled")
+            session[key.split(".", 1)[1]] = value
+        else:
+            func, idx, side = key.split(".")
+            func_rows = rows[ROW_FUNCS[func]]
+            idx = int(idx) - 1
+            while len(func_rows) <= idx:
+                func_rows.append((0.0, 0.0))
+            neg, pos = func_rows[idx]
+            func_rows[idx] = (neg, value) if side == "pos" else (value, pos)
+    out["tpsm_rows"], out["tpsb_rows"] = rows
+    out["session"] = session
+    return out
+
+def build_configs(grid, samples=None, seed=None):
+    """Cartesian product of `grid` ({key: [values]}), or `samples` random distinct points
+    of it; sorted by (lookback, near_pct) so consecutive configs reuse the SR zones."""
+    keys = list(grid)
+    sizes = [len(grid[k]) for k in keys]
+    total = math.prod(sizes)
+    if samples and samples < total:
+        picks = random.Random(seed).sample(range(total), samples)
+    else:
+        picks = range(total)
+    configs = []
+    for flat in picks:
+        cfg = {}
+        # indeks datar -> satu nilai per parameter (mixed radix), grid tidak perlu dibentuk penuh
+        for key, size in zip(reversed(keys), reversed(sizes)):
+            flat, i = divmod(flat, size)
+            cfg[key] = grid[key][i]
+        configs.append({k: cfg[k] for k in keys})
+    configs.sort(key=lambda c: (c.get("lookback", 0), c.get("near_pct", 0.0)))
+    return configs
+
+# ---------- Shared memory ----------
+def share(arrays):
+    """Copy each array into a new SharedMemory block; returns (blocks, specs for _attach)."""
+    blocks, specs = [], []
+    for arr in arrays:
+        shm = shared_memory.SharedMemory(create=True, size=max(1, arr.nbytes))
+        np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+        blocks.append(shm)
+        specs.append((shm.name, arr.shape, arr.dtype.descr if arr.dtype.names else arr.dtype.str))
+    return blocks, specs
+
+def _attach(specs, base, sim_kwargs):
+    """Process pool initializer: map the shared candles/path without copying them."""
+    arrays = []
+    for name, shape, dtype in specs:
+        shm = shared_memory.SharedMemory(name=name)
+        WORKER["shm"].append(shm) # referensi harus hidup selama array dipakai
+        arrays.append(np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf))
+    WORKER["rates"], WORKER["path"] = arrays
+    WORKER["base"], WORKER["sim"] = base, sim_kwargs
+    WORKER["zones_key"] = WORKER["zones"] = None
+
+def evaluate(params):
+    """Run one config in the worker; returns its backtest summary plus the params."""
+    kw = resolve(WORKER["base"], params)
+    rates, path = WORKER["rates"], WORKER["path"]
+    key = (kw["lookback"], kw["near_pct"])
+    if WORKER["zones_key"] != key:
+        WORKER["zones"] = backtest.sr_zones(rates, path, *key)
+        WORKER["zones_key"] = key
+    t0 = time.perf_counter()
+    trades = backtest.simulate(rates, kw["lookback"], kw["near_pct"], kw["tpsm_rows"], kw["tpsb_rows"],
+                               session=kw["session"], trailing=kw["trailing"],
+                               path=path, zones=WORKER["zones"], **WORKER["sim"])
+    summary = backtest.summarize(trades)
+    summary.update({"params": params, "seconds": round(time.perf_counter() - t0, 3)})
+    return summary
+
+# ---------- Report ----------
+def rank(results, key):
+    """Best first; a missing profit_factor (no losing trade) ranks above any finite one."""
+    def score(r):
+        v = r.get(key)
+        if v is None:
+            v = math.inf
+        return -v if key in LOWER_IS_BETTER else v
+    return sorted(results, key=score, reverse=True)
+
+def write_report(path, results):
+    if path.lower().endswith(".json"):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        return
+    if not results:
+        open(path, "w", encoding="utf-8").close()
+        return
+    fields = ["rank"] + list(results[0]["params"]) + [k for k in results[0] if k != "params"]
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        for i, r in enumerate(results, 1):
+            row = {k: v for k, v in r.items() if k != "params"}
+            row.update(r["params"], rank=i, exits=json.dumps(r["exits"]))
+            writer.writerow(row)
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Parallel parameter sweep of the SR bounce strategy over M1 history")
+    src = ap.add_mutually_exclusive_group()
+    src.add_argument("--csv", help="M1 history file (time,open,high,low,close)")
+    src.add_argument("--symbol", help="fetch history from the MT5 terminal (default: active symbol)")
+    ap.add_argument("--bars", type=int, default=100000, help="bars to fetch with --symbol")
+    ap.add_argument("-p", "--param", action="append", default=[], metavar="KEY=VALUES",
+                    help="swept parameter, repeatable (see header of sweep.py)")
+    ap.add_argument("--samples", type=int, default=None, help="evaluate N random points of the grid instead of all")
+    ap.add_argument("--seed", type=int, default=None)
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--rank", choices=RANK_KEYS, default="net_profit")
+    ap.add_argument("--min-trades", type=int, default=1, help="drop configs with fewer trades from the ranking")
+    ap.add_argument("--top", type=int, default=20)
+    ap.add_argument("--side", choices=("setup", "buy", "sell", "both"), default="setup")
+    ap.add_argument("--no-session", action="store_true", help="do not simulate session_tick")
+    ap.add_argument("--spread", type=float, default=0.0, help="ask - bid in price units")
+    ap.add_argument("--lot", type=float, default=control.SETUP.get("engine_lot", 0.01))
+    ap.add_argument("--contract", type=float, default=None, help="contract size (default: terminal or 100)")
+    ap.add_argument("--out", help="write the full ranking to .csv or .json")
+    args = ap.parse_args(argv)
+
+    grid = {}
+    for text in args.param:
+        try:
+            key, values = parse_param(text)
+        except ValueError as e:
+            ap.error(str(e))
+        grid[key] = values
+    if not grid:
+        ap.error("nothing to sweep: pass at least one --param KEY=VALUES")
+    setup = control.SETUP
+    base = base_config(setup, use_session=not args.no_session)
+    if args.no_session and any(k.startswith("session.") for k in grid):
+        ap.error("session.* parameters need session simulation (drop --no-session)")
+    configs = build_configs(grid, args.samples, args.seed)
+
+    contract = 100.0
+    if args.csv:
+        rates = backtest.load_csv(args.csv)
+    else:
+        rates, contract = backtest.fetch_mt5(args.symbol or setup["symbol"], args.bars)
+    if args.contract is not None:
+        contract = args.contract
+    sim_kwargs = {
+        "buy": setup.get("sr_buy_enabled", True) if args.side == "setup" else args.side in ("buy", "both"),
+        "sell": setup.get("sr_sell_enabled", False) if args.side == "setup" else args.side in ("sell", "both"),
+        "spread": args.spread, "lot": args.lot, "contract": contract,
+    }
+    path = backtest.price_path(rates)
+    workers = max(1, min(args.workers, len(configs)))
+    print(f"[SWEEP] {len(configs)} configs x {len(rates)} bars on {workers} worker(s)", flush=True)
+
+    t0 = time.perf_counter()
+    blocks, specs = share([rates, path])
+    results = []
+    try:
+        # Potongan berurutan per worker -> config dengan (lookback, near_pct) sama jatuh ke worker yang sama
+        chunk = max(1, len(configs) // (workers * 4))
+        step = max(1, len(configs) // 10)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_attach,
+                                 initargs=(specs, base, sim_kwargs)) as pool:
+            for i, summary in enumerate(pool.map(evaluate, configs, chunksize=chunk), 1):
+                results.append(summary)
+                if i % step == 0 or i == len(configs):
+                    print(f"[SWEEP] {i}/{len(configs)} done ({time.perf_counter() - t0:.1f} s)", flush=True)
+    finally:
+        for shm in blocks:
+            shm.close()
+            shm.unlink()
+    took = time.perf_counter() - t0
+
+    ranked = rank([r for r in results if r["trades"] >= args.min_trades], args.rank)
+    keys = list(grid)
+    print(f"\n== Top {min(args.top, len(ranked))} of {len(ranked)} by {args.rank} ==")
+    print(f"{'#':>3s} " + " ".join(f"{k:>14s}" for k in keys)
+          + f" {'trades':>7s} {'win%':>6s} {'net':>10s} {'pf':>6s} {'max_dd':>9s}")
+    for i, r in enumerate(ranked[:args.top], 1):
+        pf = "-" if r["profit_factor"] is None else f"{r['profit_factor']:.3f}"
+        print(f"{i:3d} " + " ".join(f"{r['params'][k]:>14g}" for k in keys)
+              + f" {r['trades']:7d} {r['win_rate']:6.2f} {r['net_profit']:10.2f} {pf:>6s} {r['max_drawdown']:9.2f}")
+    if args.out:
+        write_report(args.out, ranked)
+        print(f"\n[SWEEP] report -> {args.out}")
+    print(f"\n[SWEEP] {took:.2f} s ({len(configs) / max(took, 1e-9):.2f} configs/s)")
+
+if __name__ == "__main__":
+    main()